@@ -75,9 +75,13 @@ function KnowledgeBase() {
 
             if (response.ok) {
                 const data = await response.json()
-                setUploadStatus({ status: 'success', message: `Uploaded ${data.chunks_created || 0} chunks` })
-                setChunkPreview(data.preview || [])
-                fetchCollectionStats()
+                if (data.job_id) {
+                    await pollUploadJob(data.job_id, file.name)
+                } else {
+                    setUploadStatus({ status: 'success', message: `Uploaded ${data.chunks_created || 0} chunks` })
+                    setChunkPreview(data.preview || [])
+                    fetchCollectionStats()
+                }
             } else {
                 let errMsg = 'Upload failed'
                 try {
@@ -91,6 +95,30 @@ function KnowledgeBase() {
         }
     }
 
+    const pollUploadJob = async (jobId, filename) => {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000))
+            const response = await fetch(`/api/rag/jobs/${jobId}`)
+            if (!response.ok) {
+                setUploadStatus({ status: 'error', message: `Lost track of upload job (${response.status})` })
+                return
+            }
+            const job = await response.json()
+            const chunks = (job.created || 0) + (job.unchanged || 0)
+            if (job.status === 'completed') {
+                setUploadStatus({ status: 'success', message: `Uploaded ${chunks} chunks` })
+                setChunkPreview(job.preview || [])
+                fetchCollectionStats()
+                return
+            }
+            if (job.status === 'failed') {
+                setUploadStatus({ status: 'error', message: job.error || 'Upload failed' })
+                return
+            }
+            setUploadStatus({ status: 'uploading', message: `Processing ${filename}... ${chunks} chunks` })
+        }
+    }
+
     const handleTestQuery = async () => {
         if (!testQuery.trim()) return
 
@@ -13,7 +13,7 @@ from datetime import datetime
 from typing import Dict, Any, Optional, List
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Header, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Header, UploadFile, File, Form, Request
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
@@ -683,6 +683,30 @@ async def upload_document(
             raise HTTPException(status_code=500, detail=f"RAG service error: {str(e)}")
 
 
+@app.post("/rag/bulk-import")
+async def bulk_import_rag(request: Request, document_type: str = "ticket", field_map: Optional[str] = None):
+    """Proxy a streamed NDJSON bulk import to RAG service (returns a job id to poll)."""
+    rag_url = os.getenv("RAG_SERVICE_URL", "http://rag-service:8000")
+    headers = {name: request.headers[name] for name in ("content-type", "content-encoding") if name in request.headers}
+    params = {"document_type": document_type, **({"field_map": field_map} if field_map else {})}
+    
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        try:
+            response = await client.post(
+                f"{rag_url}/api/v1/bulk-import", params=params, headers=headers, content=request.stream()
+            )
+        except Exception as e:
+            logger.error(f"RAG bulk import failed: {e}")
+            log_activity("RAG-Import", f"Bulk import failed: {document_type}", level="error", details=str(e))
+            raise HTTPException(status_code=502, detail=f"RAG service error: {str(e)}")
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+    
+    result = response.json()
+    log_activity("RAG-Import", f"Bulk import of {document_type} queued", level="info", details=f"Job: {result.get('job_id')}")
+    return result
+
+
 @app.get("/rag/stats")
 async def get_rag_stats():
     """Proxy stats request to RAG service."""
@@ -697,6 +721,22 @@ async def get_rag_stats():
             return {"collections": {"idx:kb": 0, "idx:tickets": 0, "idx:sop": 0}}
 
 
+@app.get("/rag/jobs/{job_id}")
+async def get_rag_job(job_id: str):
+    """Proxy ingestion job status request to RAG service."""
+    rag_url = os.getenv("RAG_SERVICE_URL", "http://rag-service:8000")
+    
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        try:
+            response = await client.get(f"{rag_url}/api/v1/jobs/{job_id}")
+        except Exception as e:
+            logger.error(f"RAG job status failed: {e}")
+            raise HTTPException(status_code=502, detail=f"RAG service error: {str(e)}")
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+    return response.json()
+
+
 @app.post("/rag/search")
 async def search_rag(payload: Dict[str, Any]):
     """Proxy search request to RAG service."""
@@ -0,0 +1,265 @@
+"""
+Vector Index Benchmark
+======================
+Measures recall@k, query latency, QPS, build time and index memory for
+HNSW and FLAT index settings on synthetic corpora in a local Redis Stack.
+
+For each corpus size the vectors are written once under a scratch prefix
+and one index per build setting (FLAT, HNSW with each M / EF_CONSTRUCTION)
+is created over them. HNSW indexes are then queried at each EF_RUNTIME.
+Recall is measured against exact brute-force neighbours computed in NumPy.
+
+The synthetic vectors are clustered (Gaussian blobs around random
+centroids) rather than uniform, which is closer to real embedding
+distributions and makes the recall numbers meaningful.
+
+Never point this at the production Redis: it writes N hashes and builds
+several indexes. Everything is dropped afterwards unless --keep is given.
+
+Usage:
+    python benchmark_index.py --sizes 10000 100000 --dim 512
+    python benchmark_index.py --sizes 1000000 --m 16 32 --ef-runtime 10 50 100 --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+import numpy as np
+import redis
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import VectorCodec
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("aegis-rag.benchmark-index")
+
+PREFIX = "bench:index"
+
+
+def synthetic_corpus(size: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Unit-norm vectors drawn around `clusters` random centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size)
+    vectors = centroids[assignment] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    return vectors
+
+
+def synthetic_queries(corpus: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Perturbed copies of random corpus vectors"""
+    rng = np.random.default_rng(seed + 1)
+    picks = corpus[rng.integers(0, len(corpus), count)]
+    queries = picks + 0.3 * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(corpus.shape[1])
+    return queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int, block: int = 100_000) -> np.ndarray:
+    """Brute-force cosine top-k, scanning the corpus in blocks to bound memory"""
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(corpus), block):
+        scores = queries @ corpus[start:start + block].T
+        ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        top = np.argpartition(-scores, kth=k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return best_ids
+
+
+def load_corpus(client, prefix: str, corpus: np.ndarray, vector_type: str, batch_size: int = 1000):
+    """Write the corpus as hashes ({prefix}{i} -> embedding) with pipelined batches"""
+    for start in range(0, len(corpus), batch_size):
+        pipe = client.pipeline(transaction=False)
+        for i in range(start, min(start + batch_size, len(corpus))):
+            blob, _ = VectorCodec.encode(corpus[i], vector_type)
+            pipe.hset(f"{prefix}{i}", mapping={"embedding": blob, "doc_id": i})
+        pipe.execute()
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def ft_info(client, index_name: str) -> dict:
+    info = client.execute_command("FT.INFO", index_name)
+    return {_decode(info[i]): _decode(info[i + 1]) for i in range(0, len(info) - 1, 2)}
+
+
+def build_index(client, index_name: str, prefix: str, dim: int, vector_type: str, params: dict) -> float:
+    """Create an index and wait until the background indexing finishes; returns seconds"""
+    vector_args = ["TYPE", vector_type, "DIM", str(dim), "DISTANCE_METRIC", "COSINE"]
+    for name, value in params.items():
+        if name != "ALGORITHM":
+            vector_args += [name, str(value)]
+
+    start = time.perf_counter()
+    client.execute_command(
+        "FT.CREATE", index_name,
+        "ON", "HASH",
+        "PREFIX", "1", prefix,
+        "SCHEMA",
+        "doc_id", "NUMERIC",
+        "embedding", "VECTOR", params["ALGORITHM"], str(len(vector_args)), *vector_args
+    )
+    while float(ft_info(client, index_name).get("indexing", 0)):
+        time.sleep(0.5)
+    return time.perf_counter() - start
+
+
+def index_memory_mb(client, index_name: str) -> float:
+    return round(float(ft_info(client, index_name).get("vector_index_sz_mb", 0)), 1)
+
+
+def run_queries(client, index_name: str, queries: np.ndarray, truth: np.ndarray,
+                k: int, vector_type: str, ef_runtime: int = None) -> dict:
+    """Sequential KNN queries; recall@k against `truth` plus latency percentiles"""
+    ef_clause = f" EF_RUNTIME {ef_runtime}" if ef_runtime else ""
+    knn = f"*=>[KNN {k} @embedding $vec{ef_clause} AS score]"
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        blob, _ = VectorCodec.encode(query, vector_type)
+        start = time.perf_counter()
+        results = client.execute_command(
+            "FT.SEARCH", index_name, knn,
+            "PARAMS", "2", "vec", blob,
+            "SORTBY", "score",
+            "LIMIT", "0", str(k),
+            "RETURN", "1", "doc_id",
+            "DIALECT", "2"
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(fields[1]) for fields in results[2::2]}
+        recalls.append(len(found & set(expected.tolist())) / k)
+
+    latencies = np.asarray(latencies)
+    return {
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "qps": round(len(latencies) / (latencies.sum() / 1000), 1)
+    }
+
+
+def build_settings(args) -> list:
+    settings = [{"ALGORITHM": "FLAT"}] if "FLAT" in args.algorithms else []
+    if "HNSW" in args.algorithms:
+        settings += [
+            {"ALGORITHM": "HNSW", "M": m, "EF_CONSTRUCTION": efc}
+            for m in args.m for efc in args.ef_construction
+        ]
+    return settings
+
+
+def iter_key_batches(client, prefix: str, batch_size: int = 5000):
+    batch = []
+    for key in client.scan_iter(match=f"{prefix}*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def benchmark_size(client, size: int, args) -> list:
+    prefix = f"{PREFIX}:{size}:"
+    logger.info(f"Generating {size:,} x {args.dim} vectors...")
+    corpus = synthetic_corpus(size, args.dim, args.clusters, args.seed)
+    queries = synthetic_queries(corpus, args.queries, args.seed)
+    truth = exact_neighbours(corpus, queries, args.k)
+
+    logger.info(f"Writing {size:,} hashes under {prefix}...")
+    load_corpus(client, prefix, corpus, args.type)
+    del corpus
+
+    rows = []
+    index_names = []
+    try:
+        for params in build_settings(args):
+            tag = "-".join(f"{v}" for v in params.values()).lower()
+            index_name = f"idx:{PREFIX}:{size}:{tag}"
+            index_names.append(index_name)
+
+            logger.info(f"Building {index_name}...")
+            build_s = build_index(client, index_name, prefix, args.dim, args.type, params)
+            memory_mb = index_memory_mb(client, index_name)
+
+            for ef in (args.ef_runtime if params["ALGORITHM"] == "HNSW" else [None]):
+                rows.append({
+                    "docs": size,
+                    "algorithm": params["ALGORITHM"],
+                    "M": params.get("M", "-"),
+                    "EF_CONSTRUCTION": params.get("EF_CONSTRUCTION", "-"),
+                    "EF_RUNTIME": ef or "-",
+                    **run_queries(client, index_name, queries, truth, args.k, args.type, ef),
+                    "build_s": round(build_s, 1),
+                    "index_mb": memory_mb
+                })
+                logger.info(rows[-1])
+    finally:
+        if not args.keep:
+            for index_name in index_names:
+                try:
+                    client.execute_command("FT.DROPINDEX", index_name)
+                except redis.ResponseError:
+                    pass
+            for keys in iter_key_batches(client, prefix):
+                client.unlink(*keys)
+    return rows
+
+
+def print_table(rows: list, args):
+    print(f"\n## Vector index benchmark (dim={args.dim}, type={args.type}, "
+          f"{args.queries} queries, recall@{args.k} vs brute force)\n")
+    headers = list(rows[0].keys())
+    print("| " + " | ".join(headers) + " |")
+    print("|" + "|".join("---" for _ in headers) + "|")
+    for row in rows:
+        print("| " + " | ".join(str(row[h]) for h in headers) + " |")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HNSW vs FLAT index settings on synthetic vectors")
+    parser.add_argument("--redis-url", default=os.getenv("BENCH_REDIS_URL", "redis://localhost:6379"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--type", default="FLOAT32", choices=list(VectorCodec.TYPES))
+    parser.add_argument("--algorithms", nargs="+", default=["FLAT", "HNSW"], choices=["FLAT", "HNSW"])
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[200])
+    parser.add_argument("--ef-runtime", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep benchmark hashes and indexes")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a Markdown table")
+    args = parser.parse_args()
+
+    client = redis.from_url(args.redis_url, decode_responses=False)
+
+    rows = []
+    for size in args.sizes:
+        rows += benchmark_size(client, size, args)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, args)
+
+
+if __name__ == "__main__":
+    main()
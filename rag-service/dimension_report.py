@@ -0,0 +1,179 @@
+"""
+Embedding Dimension Report
+==========================
+Compares Titan V2 embedding dimensions (256 / 512 / 1024 by default) on a
+sample of real documents and reports, per dimension:
+
+- recall@k against the largest dimension (ground truth neighbours)
+- raw vector bytes and estimated HNSW index memory (per doc and projected)
+- average embedding latency and brute-force search latency per query
+
+Documents come from an existing collection in Redis (SCAN over its key
+prefix) or from a JSONL file with `content` (or `text`) fields.
+
+Usage:
+    python dimension_report.py --collection ticket --sample 2000 --queries 100
+    python dimension_report.py --file tickets.jsonl --dims 256 512 1024 --json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+
+import numpy as np
+import redis
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import Config, VectorDBManager, create_embedding_provider
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("aegis-rag.dimension-report")
+
+# HNSW keeps ~2*M neighbour links (8 bytes each) per vector on layer 0
+HNSW_M = 16
+HNSW_LINK_BYTES = 2 * HNSW_M * 8
+
+
+def load_from_redis(collection: str, provider, sample: int) -> list:
+    """Read up to `sample` document texts from a collection's hashes"""
+    client = redis.from_url(Config.REDIS_URL, decode_responses=False)
+    prefix = f"{provider.namespace}{VectorDBManager.COLLECTIONS[collection]['stem']}:"
+
+    texts = []
+    for key in client.scan_iter(match=f"{prefix}*", count=1000):
+        content = client.hget(key, "content")
+        if content:
+            texts.append(content.decode(errors="ignore"))
+        if len(texts) >= sample:
+            break
+    return texts
+
+
+def load_from_file(path: str, sample: int) -> list:
+    """Read up to `sample` document texts from a JSONL file"""
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            text = item.get("content") or item.get("text")
+            if text:
+                texts.append(text)
+            if len(texts) >= sample:
+                break
+    return texts
+
+
+def embed_all(provider, texts: list, dimension: int):
+    """Embed texts at one dimension; returns (unit-norm matrix, avg ms per text)"""
+    start = time.perf_counter()
+    batch = provider.embed_batch(texts, dimension)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if batch.errors:
+        raise RuntimeError(f"{batch.failed} embeddings failed at dim={dimension}: "
+                           f"{next(iter(batch.errors.values()))}")
+
+    matrix = np.asarray(batch.embeddings, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    return matrix, elapsed_ms / len(texts)
+
+
+def top_k(corpus: np.ndarray, query_ids: list, k: int):
+    """Brute-force cosine top-k (excluding the query doc itself); returns (ids, avg ms per query)"""
+    start = time.perf_counter()
+    scores = corpus[query_ids] @ corpus.T
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf
+    neighbours = np.argpartition(-scores, kth=min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return neighbours, elapsed_ms / len(query_ids)
+
+
+def build_report(texts: list, query_ids: list, dims: list, k: int, project_docs: int, provider) -> list:
+    baseline_dim = max(dims)
+    rows = []
+    truth = None
+
+    for dim in sorted(dims, reverse=True):
+        logger.info(f"Embedding {len(texts)} documents at dim={dim}...")
+        matrix, embed_ms = embed_all(provider, texts, dim)
+        neighbours, search_ms = top_k(matrix, query_ids, k)
+
+        if dim == baseline_dim:
+            truth = neighbours
+        recall = np.mean([
+            len(set(found) & set(expected)) / k for found, expected in zip(neighbours, truth)
+        ])
+
+        vector_bytes = dim * 4
+        rows.append({
+            "dimension": dim,
+            f"recall@{k}": round(float(recall), 4),
+            "vector_bytes": vector_bytes,
+            "index_bytes_per_doc": vector_bytes + HNSW_LINK_BYTES,
+            "projected_index_mb": round(project_docs * (vector_bytes + HNSW_LINK_BYTES) / 1024 ** 2, 1),
+            "avg_embed_ms": round(embed_ms, 2),
+            "avg_bruteforce_search_ms": round(search_ms, 3)
+        })
+
+    return sorted(rows, key=lambda r: r["dimension"])
+
+
+def print_table(rows: list, k: int, project_docs: int, sample: int):
+    print(f"\n## Embedding dimension report ({sample} docs, recall@{k} vs {rows[-1]['dimension']}-dim, "
+          f"projected for {project_docs:,} docs)\n")
+    headers = list(rows[0].keys())
+    print("| " + " | ".join(headers) + " |")
+    print("|" + "|".join("---" for _ in headers) + "|")
+    for row in rows:
+        print("| " + " | ".join(str(row[h]) for h in headers) + " |")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding dimensions: recall vs memory vs latency")
+    parser.add_argument("--collection", default="ticket", choices=list(VectorDBManager.COLLECTIONS))
+    parser.add_argument("--file", help="JSONL file with content/text fields (instead of Redis)")
+    parser.add_argument("--provider", default=None, help="Embedding provider (default: EMBEDDING_PROVIDER)")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--sample", type=int, default=2000, help="Documents to embed")
+    parser.add_argument("--queries", type=int, default=100, help="Documents reused as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--project-docs", type=int, default=1_000_000,
+                        help="Collection size used for projected index memory")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a Markdown table")
+    args = parser.parse_args()
+
+    provider = create_embedding_provider(args.provider)
+    for dim in args.dims:
+        provider.check_dimension(dim)
+
+    texts = load_from_file(args.file, args.sample) if args.file else \
+        load_from_redis(args.collection, provider, args.sample)
+    if len(texts) <= args.k:
+        logger.error(f"Need more than k={args.k} documents, found {len(texts)}")
+        sys.exit(1)
+
+    random.seed(args.seed)
+    query_ids = random.sample(range(len(texts)), min(args.queries, len(texts)))
+
+    rows = build_report(texts, query_ids, args.dims, args.k, args.project_docs, provider)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, args.k, args.project_docs, len(texts))
+
+
+if __name__ == "__main__":
+    main()
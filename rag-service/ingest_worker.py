@@ -0,0 +1,66 @@
+"""
+Ingest Worker
+=============
+Consumes the durable batch-ingest queue (Redis Stream `rag:ingest:stream`,
+consumer group `rag-ingest`) filled by /api/v1/batch-ingest.
+
+Each entry is acknowledged only after its documents are written; entries
+left pending by a worker that died are reclaimed by the others after
+INGEST_QUEUE_CLAIM_IDLE_MS. Embedding throughput scales with the number of
+consumers: run more workers (or --consumers per worker) and set
+INGEST_QUEUE_CONSUMERS=0 on the service if it shouldn't consume itself.
+
+Usage:
+    python ingest_worker.py
+    python ingest_worker.py --consumers 4
+"""
+
+import os
+import sys
+import signal
+import socket
+import argparse
+import logging
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import RAGService, IngestJobManager, IngestQueue
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("aegis-rag.ingest-worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consume the RAG batch-ingest queue")
+    parser.add_argument("--consumers", type=int, default=1, help="Consumer threads in this process")
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="Consumer name prefix (stable names let a restarted worker resume its entries)")
+    args = parser.parse_args()
+
+    rag_service = RAGService()
+    queue = IngestQueue(rag_service, IngestJobManager(rag_service.vector_db.redis))
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    threads = [
+        threading.Thread(target=queue.consume, args=(f"{args.name}-{n}", stop), name=f"consumer-{n}")
+        for n in range(args.consumers)
+    ]
+    for thread in threads:
+        thread.start()
+    logger.info(f"Consuming {IngestQueue.STREAM} with {args.consumers} consumers as {args.name}")
+
+    # Entries in progress are finished (or left pending for another worker)
+    for thread in threads:
+        thread.join()
+    logger.info("Ingest worker stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,14 +17,32 @@ Date: January 28, 2026
 import os
 import json
 import time
+import asyncio
+import functools
+import random
+import re
+import zlib
 import hashlib
+import threading
+import unicodedata
+import codecs
+import itertools
+import shutil
+import socket
+import tempfile
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterable, Iterator, BinaryIO, Callable
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import redis
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Form
+import numpy as np
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
@@ -47,9 +65,48 @@ class Config:
     AWS_REGION = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
     AWS_BEARER_TOKEN = os.getenv("AWS_BEARER_TOKEN_BEDROCK")
     
+    # Embedding provider: "titan" (Bedrock) or "hashing" (local CPU, no network)
+    EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "titan").lower()
+    LOCAL_EMBED_DIMENSION = int(os.getenv("LOCAL_EMBED_DIMENSION", "512"))
+    
     # Titan Embedding Model
     TITAN_MODEL_ID = os.getenv("AWS_TITAN_EMBEDDING_MODEL", "amazon.titan-embed-text-v2:0")
-    TITAN_EMBED_DIMENSION = 1024
+    TITAN_EMBED_DIMENSION = int(os.getenv("TITAN_EMBED_DIMENSION", "1024"))
+    
+    # Per-collection embedding dimension (Titan V2: 256, 512 or 1024).
+    # Unset uses the provider default; stored per index and validated.
+    EMBED_DIMENSIONS = {
+        "kb": int(os.getenv("EMBED_DIM_KB") or 0) or None,
+        "ticket": int(os.getenv("EMBED_DIM_TICKETS") or 0) or None,
+        "sop": int(os.getenv("EMBED_DIM_SOP") or 0) or None,
+        "recent": int(os.getenv("EMBED_DIM_RECENT") or 256)
+    }
+    
+    # Vector storage type per collection: FLOAT32 (default), FLOAT16, BFLOAT16
+    # or INT8 (scalar-quantized, needs Redis 8+). Applies to new indexes;
+    # convert existing ones with migrate_vectors.py.
+    VECTOR_TYPE = os.getenv("VECTOR_TYPE", "FLOAT32").upper()
+    VECTOR_TYPES = {
+        "kb": (os.getenv("VECTOR_TYPE_KB") or VECTOR_TYPE).upper(),
+        "ticket": (os.getenv("VECTOR_TYPE_TICKETS") or VECTOR_TYPE).upper(),
+        "sop": (os.getenv("VECTOR_TYPE_SOP") or VECTOR_TYPE).upper(),
+        "recent": (os.getenv("VECTOR_TYPE_RECENT") or VECTOR_TYPE).upper()
+    }
+    
+    # Vector index parameters per collection, merged over the defaults in
+    # VectorDBManager.COLLECTIONS (HNSW for kb/tickets, FLAT for SOPs), e.g.
+    # {"ticket": {"M": 32, "EF_CONSTRUCTION": 400, "EF_RUNTIME": 40}}
+    INDEX_PARAMS = json.loads(os.getenv("INDEX_PARAMS") or "{}")
+    
+    # Optional sharding by a metadata partition key: each listed value gets
+    # its own index and key prefix (idx:tickets.emea, tickets.emea:...),
+    # documents with any other value stay in the collection's base index, e.g.
+    # {"ticket": {"key": "region", "values": ["emea", "amer", "apac"]}}
+    SHARDS = json.loads(os.getenv("SHARDS") or "{}")
+    
+    # Storm Shield dedup: rolling index of recently seen incidents
+    # (/embed/incident writes, /search/similar reads)
+    RECENT_INCIDENT_TTL_SECONDS = int(os.getenv("RECENT_INCIDENT_TTL_SECONDS", "86400"))
     
     # Claude via Bedrock
     CLAUDE_MODEL = os.getenv("BEDROCK_CLAUDE_SONNET_MODEL", "anthropic.claude-3-5-sonnet-20241022-v2:0")
@@ -57,6 +114,79 @@ class Config:
     # ChromaDB Configuration
     CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "/data/chromadb")
     
+    # Redis Stack (vector store + shared caches)
+    REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+    
+    # Embedding Cache (in-process LRU + shared Redis tier)
+    EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+    EMBED_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_LOCAL_MAX_ENTRIES", "5000"))
+    EMBED_CACHE_TTL_SECONDS = int(os.getenv("EMBED_CACHE_TTL_SECONDS", "86400"))
+    EMBED_CACHE_REDIS_MAX_BYTES = int(os.getenv("EMBED_CACHE_REDIS_MAX_BYTES", str(256 * 1024 * 1024)))
+    
+    # Search result cache (in-process, invalidated by per-index generations)
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+    
+    # Batch Embedding (bulk ingest)
+    EMBED_BATCH_WORKERS = int(os.getenv("EMBED_BATCH_WORKERS", "8"))
+    
+    # Documents per pipelined MULTI/EXEC round trip in bulk writes
+    WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "200"))
+    EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+    EMBED_RETRY_BASE_DELAY = float(os.getenv("EMBED_RETRY_BASE_DELAY", "0.5"))
+    EMBED_RETRY_MAX_DELAY = float(os.getenv("EMBED_RETRY_MAX_DELAY", "8.0"))
+    
+    # Background re-embedding (reembed.py): Bedrock embeddings per second
+    # and documents per SCAN batch
+    REEMBED_RATE_LIMIT = float(os.getenv("REEMBED_RATE_LIMIT") or 20)
+    REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE") or 100)
+    # How often a process re-checks index layout (dimension, vector field,
+    # running re-embed jobs) changed by another process
+    LAYOUT_CHECK_INTERVAL = float(os.getenv("LAYOUT_CHECK_INTERVAL") or 1.0)
+    
+    # Streaming /upload: chunks embedded and written per window (bounds
+    # memory regardless of file size) and bytes read per text block
+    UPLOAD_WINDOW_CHUNKS = int(os.getenv("UPLOAD_WINDOW_CHUNKS") or 64)
+    UPLOAD_READ_BYTES = int(os.getenv("UPLOAD_READ_BYTES") or 65536)
+    
+    # Upload chunking (token estimates at CHARS_PER_TOKEN): chunk budget,
+    # overlap between consecutive chunks of a section, and the size a chunk
+    # must reach before a new section starts a new chunk. /upload's
+    # chunk_size and chunk_overlap override the first two per request.
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS") or 512)
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS") or 50)
+    CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS") or 64)
+    
+    # Ingestion jobs: concurrent upload jobs, queued + running uploads
+    # accepted before answering 429, and how long job status (uploads and
+    # queued batch ingests) is kept in Redis
+    INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS") or 2)
+    INGEST_JOB_MAX_PENDING = int(os.getenv("INGEST_JOB_MAX_PENDING") or 50)
+    INGEST_JOB_TTL_SECONDS = int(os.getenv("INGEST_JOB_TTL_SECONDS") or 86400)
+    
+    # Durable batch-ingest queue (Redis Stream): consumer threads in this
+    # service (0 when ingest_worker.py processes do the work), entries
+    # accepted before answering 429, idle time after which a dead
+    # consumer's entries are reclaimed, how often to look for them, and
+    # deliveries before an entry is given up as failed
+    INGEST_QUEUE_CONSUMERS = int(os.getenv("INGEST_QUEUE_CONSUMERS", "1"))
+    INGEST_QUEUE_MAX_ENTRIES = int(os.getenv("INGEST_QUEUE_MAX_ENTRIES") or 10000)
+    INGEST_QUEUE_CLAIM_IDLE_MS = int(os.getenv("INGEST_QUEUE_CLAIM_IDLE_MS") or 300000)
+    INGEST_QUEUE_CLAIM_INTERVAL = float(os.getenv("INGEST_QUEUE_CLAIM_INTERVAL") or 30)
+    INGEST_QUEUE_MAX_DELIVERIES = int(os.getenv("INGEST_QUEUE_MAX_DELIVERIES") or 5)
+    
+    # NDJSON bulk import (/api/v1/bulk-import): field maps per document
+    # type, merged over BulkFieldMap.DEFAULTS (ServiceNow export fields), e.g.
+    # {"ticket": {"metadata": {"category": "category", "priority": "priority"}}}
+    # and the longest record line accepted
+    BULK_IMPORT_FIELD_MAPS = json.loads(os.getenv("BULK_IMPORT_FIELD_MAPS") or "{}")
+    BULK_IMPORT_MAX_LINE_BYTES = int(os.getenv("BULK_IMPORT_MAX_LINE_BYTES") or 1048576)
+    
+    # Event-loop offloading for blocking boto3/redis calls
+    BLOCKING_IO_CONCURRENCY = int(os.getenv("BLOCKING_IO_CONCURRENCY", "32"))
+    LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+    
     # Collection Names
     COLLECTION_KB = "aegis_knowledge_base"
     COLLECTION_TICKETS = "aegis_ticket_history"
@@ -65,6 +195,44 @@ class Config:
     # Retrieval Configuration
     TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "5"))
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+    
+    # Per-collection top_k for /api/v1/analyze (defaults to TOP_K_RESULTS)
+    TOP_K_KB = int(os.getenv("TOP_K_KB", str(TOP_K_RESULTS)))
+    TOP_K_TICKETS = int(os.getenv("TOP_K_TICKETS", str(TOP_K_RESULTS)))
+    TOP_K_SOP = int(os.getenv("TOP_K_SOP", str(TOP_K_RESULTS)))
+    
+    # Max concurrent FT.SEARCH calls when fanning out over collections
+    SEARCH_FANOUT_WORKERS = int(os.getenv("SEARCH_FANOUT_WORKERS", "8"))
+    
+    # Length of the stored `summary` field returned by searches instead of content
+    SUMMARY_CHARS = int(os.getenv("SUMMARY_CHARS", "500"))
+    
+    # Collapse chunk hits of one uploaded document (same parent_id) into a
+    # single result, over-fetching to refill top_k with distinct documents
+    COLLAPSE_CHUNKS = os.getenv("COLLAPSE_CHUNKS", "true").lower() == "true"
+    COLLAPSE_OVERFETCH = int(os.getenv("COLLAPSE_OVERFETCH", "3"))
+    COLLAPSE_MAX_FETCH = int(os.getenv("COLLAPSE_MAX_FETCH", "100"))
+    # Append the summaries of matching neighbour chunks to the best chunk
+    COLLAPSE_MERGE_ADJACENT = os.getenv("COLLAPSE_MERGE_ADJACENT", "false").lower() == "true"
+    
+    # Hybrid retrieval (BM25 + KNN merged with reciprocal rank fusion).
+    # RETRIEVAL_MODE is used by /api/v1/analyze: "hybrid" or "vector".
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    # Candidates fetched per leg = top_k * factor
+    HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "3"))
+    
+    # Maximal marginal relevance: re-rank top_k * MMR_CANDIDATE_FACTOR
+    # candidates for relevance vs. redundancy (MMR_LAMBDA = 1 is pure
+    # relevance) and stop adding hits once MMR_TOKEN_BUDGET is spent
+    # (estimated at CHARS_PER_TOKEN; 0 = no budget). Off unless enabled,
+    # and only for MMR_COLLECTIONS unless a request asks for it.
+    MMR_ENABLED = os.getenv("MMR_ENABLED", "false").lower() == "true"
+    MMR_COLLECTIONS = [c.strip() for c in (os.getenv("MMR_COLLECTIONS") or "kb").split(",") if c.strip()]
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA") or 0.7)
+    MMR_CANDIDATE_FACTOR = int(os.getenv("MMR_CANDIDATE_FACTOR") or 4)
+    MMR_TOKEN_BUDGET = int(os.getenv("MMR_TOKEN_BUDGET") or 1500)
+    CHARS_PER_TOKEN = 4
 
 
 # =============================================================================
@@ -78,6 +246,7 @@ class TicketQuery(BaseModel):
     caller: Optional[str] = Field(None, description="Caller name")
     category: Optional[str] = Field(None, description="Current category if any")
     priority: Optional[str] = Field(None, description="Current priority if any")
+    partition: Optional[str] = Field(None, description="Shard (e.g. region) to search in sharded collections")
 
 
 class KBArticle(BaseModel):
@@ -129,6 +298,16 @@ class RAGResponse(BaseModel):
     processing_time_ms: int
 
 
+class SearchFilters(BaseModel):
+    """Metadata pre-filters applied before KNN (all optional, combined with AND)"""
+    categories: Optional[List[str]] = Field(None, description="Match any of these categories")
+    created_after: Optional[int] = Field(None, description="Unix seconds, inclusive")
+    created_before: Optional[int] = Field(None, description="Unix seconds, inclusive")
+    time_window_minutes: Optional[int] = Field(None, ge=1, description="Only documents ingested in the last N minutes")
+    exclude_ids: Optional[List[str]] = Field(None, description="doc_ids to leave out")
+    partitions: Optional[List[str]] = Field(None, description="Only search these shards (e.g. regions) of sharded collections")
+
+
 class DocumentIngest(BaseModel):
     """Document ingestion request"""
     document_type: str = Field(..., description="kb, ticket, or sop")
@@ -144,45 +323,576 @@ class IngestResponse(BaseModel):
     document_id: str
     collection: str
     embedding_id: str
+    unchanged: bool = False
+
+
+# =============================================================================
+# Blocking I/O Offloading
+# =============================================================================
+
+class BlockingIOExecutor:
+    """
+    Runs blocking boto3/redis calls off the event loop.
+    
+    Calls go to a dedicated thread pool and are admitted through a
+    semaphore, so at most `max_concurrency` run at once and the rest wait
+    on the event loop instead of blocking it.
+    """
+    
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+    
+    async def run(self, func, *args, **kwargs):
+        """Await `func(*args, **kwargs)` executed on the pool"""
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._pool, functools.partial(func, *args, **kwargs)
+                )
+            finally:
+                self._in_flight -= 1
+    
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self._in_flight, "max_concurrency": self.max_concurrency}
+
+
+# Embedding + vector store calls, and the (slower) Claude calls, get separate
+# limits so a burst of /api/v1/analyze can't starve /search
+blocking_io = BlockingIOExecutor("rag-io", Config.BLOCKING_IO_CONCURRENCY)
+llm_io = BlockingIOExecutor("rag-llm", Config.LLM_CONCURRENCY)
 
 
 # =============================================================================
-# AWS Bedrock Client (Titan Embeddings)
+# Embedding Providers (Titan via Bedrock, local feature hashing)
 # =============================================================================
 
-class TitanEmbeddings:
+class BatchEmbeddingResult:
+    """
+    Order-preserving result of a batch embedding run.
+    
+    embeddings[i] is the vector for texts[i], or None if that item failed;
+    errors maps the failed indexes to their error message.
+    """
+    
+    def __init__(self, size: int):
+        self.embeddings: List[Optional[List[float]]] = [None] * size
+        self.errors: Dict[int, str] = {}
+    
+    @property
+    def succeeded(self) -> int:
+        return len(self.embeddings) - len(self.errors)
+    
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+
+class EmbeddingProvider:
+    """
+    Base class for embedding backends.
+    
+    Subclasses set `provider_id`, `model_id` and `dimension` (the default
+    output size) and implement `embed`. `supported_dimensions` lists the
+    sizes `embed(..., dimension=)` accepts (None = any). The provider's
+    `namespace` is prepended to index names and key prefixes so vectors
+    from different models never share an index.
+    """
+    
+    provider_id: str = ""
+    model_id: str = ""
+    dimension: int = 0
+    supported_dimensions: Optional[tuple] = None
+    
+    @property
+    def namespace(self) -> str:
+        return f"{self.provider_id}:"
+    
+    def embed(self, text: str, dimension: int = None) -> List[float]:
+        raise NotImplementedError
+    
+    def embed_batch(self, texts: List[str], dimension: int = None) -> BatchEmbeddingResult:
+        """Generate embeddings for multiple texts (sequential by default)"""
+        result = BatchEmbeddingResult(len(texts))
+        for i, text in enumerate(texts):
+            try:
+                result.embeddings[i] = self.embed(text, dimension)
+            except Exception as e:
+                result.errors[i] = str(e)
+        return result
+    
+    async def aembed(self, text: str, dimension: int = None) -> List[float]:
+        """Async variant of embed (offloaded to the I/O executor)"""
+        return await blocking_io.run(self.embed, text, dimension)
+    
+    async def aembed_batch(self, texts: List[str], dimension: int = None) -> BatchEmbeddingResult:
+        """Async variant of embed_batch (offloaded to the I/O executor)"""
+        return await blocking_io.run(self.embed_batch, texts, dimension)
+    
+    def check_dimension(self, dimension: int):
+        """Raise ValueError if this provider can't produce `dimension`"""
+        if self.supported_dimensions and dimension not in self.supported_dimensions:
+            raise ValueError(
+                f"{self.model_id} does not support dimension {dimension} "
+                f"(supported: {list(self.supported_dimensions)})"
+            )
+
+
+class TitanEmbeddings(EmbeddingProvider):
     """Amazon Titan Text Embeddings V2 Client"""
     
+    provider_id = "titan"
+    supported_dimensions = (256, 512, 1024)
+    
+    # The model the original, un-prefixed indexes (idx:kb, kb:...) were built with
+    LEGACY_MODEL_ID = "amazon.titan-embed-text-v2:0"
+    
+    # Bedrock error codes worth retrying with backoff
+    RETRYABLE_ERRORS = {
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "ServiceUnavailableException",
+        "ModelNotReadyException"
+    }
+    
     def __init__(self):
         self.client = boto3.client(
             'bedrock-runtime',
-            region_name=Config.AWS_REGION
+            region_name=Config.AWS_REGION,
+            # One HTTP connection per batch worker
+            config=BotoConfig(max_pool_connections=max(10, Config.EMBED_BATCH_WORKERS))
         )
         self.model_id = Config.TITAN_MODEL_ID
+        self.dimension = Config.TITAN_EMBED_DIMENSION
+        self.check_dimension(self.dimension)
+        self._batch_pool = ThreadPoolExecutor(
+            max_workers=Config.EMBED_BATCH_WORKERS,
+            thread_name_prefix="titan-embed"
+        )
         logger.info(f"Initialized Titan Embeddings: {self.model_id}")
     
-    def embed(self, text: str) -> List[float]:
+    def embed(self, text: str, dimension: int = None) -> List[float]:
         """Generate embedding for a single text"""
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                contentType="application/json",
-                accept="application/json",
-                body=json.dumps({
-                    "inputText": text,
-                    "dimensions": Config.TITAN_EMBED_DIMENSION,
-                    "normalize": True
-                })
-            )
-            result = json.loads(response['body'].read())
-            return result['embedding']
+            return self._embed_with_retry(text, dimension or self.dimension)
         except Exception as e:
             logger.error(f"Titan embedding error: {e}")
             raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
     
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        return [self.embed(text) for text in texts]
+    @property
+    def namespace(self) -> str:
+        # Other Titan models get their own indexes and keys (idx:titan-amazon-titan-embed-g1-text-02:kb)
+        if self.model_id == self.LEGACY_MODEL_ID:
+            return ""
+        return f"titan-{re.sub(r'[^a-z0-9]+', '-', self.model_id.lower()).strip('-')}:"
+    
+    def embed_batch(self, texts: List[str], dimension: int = None) -> BatchEmbeddingResult:
+        """
+        Generate embeddings for multiple texts concurrently.
+        
+        Runs on a bounded worker pool (EMBED_BATCH_WORKERS), keeps input
+        order, and records per-item failures instead of aborting the batch.
+        """
+        result = BatchEmbeddingResult(len(texts))
+        futures = {
+            self._batch_pool.submit(self._embed_with_retry, text, dimension or self.dimension): i
+            for i, text in enumerate(texts)
+        }
+        for future, i in futures.items():
+            try:
+                result.embeddings[i] = future.result()
+            except Exception as e:
+                result.errors[i] = str(e)
+        
+        if result.errors:
+            logger.warning(f"Titan batch embedding: {result.failed}/{len(texts)} items failed")
+        return result
+    
+    def _embed_with_retry(self, text: str, dimension: int) -> List[float]:
+        """Invoke Titan, retrying throttling errors with exponential backoff"""
+        self.check_dimension(dimension)
+        attempt = 0
+        while True:
+            try:
+                return self._invoke(text, dimension)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code", "")
+                if code not in self.RETRYABLE_ERRORS or attempt >= Config.EMBED_MAX_RETRIES:
+                    raise
+                # Full jitter keeps parallel workers from retrying in lockstep
+                delay = min(
+                    Config.EMBED_RETRY_MAX_DELAY,
+                    Config.EMBED_RETRY_BASE_DELAY * (2 ** attempt)
+                )
+                time.sleep(random.uniform(0, delay))
+                attempt += 1
+    
+    def _invoke(self, text: str, dimension: int) -> List[float]:
+        """Single Bedrock invoke_model call"""
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps({
+                "inputText": text,
+                "dimensions": dimension,
+                "normalize": True
+            })
+        )
+        result = json.loads(response['body'].read())
+        return result['embedding']
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """
+    Deterministic feature-hashing embedder (local CPU, no network).
+    
+    Word unigrams and bigrams are hashed (CRC32) into `dimension` signed
+    buckets and L2-normalized. Near-identical texts land close together,
+    which is enough for Storm Shield dedup, offline runs and load tests,
+    but it has no semantic understanding - keep Titan for KB retrieval.
+    """
+    
+    provider_id = "hashing"
+    
+    _TOKEN_RE = re.compile(r"\w+")
+    
+    def __init__(self, dimension: int = None):
+        self.dimension = dimension or Config.LOCAL_EMBED_DIMENSION
+        self.model_id = "feature-hashing-v1"
+        logger.info(f"Initialized local hashing embeddings: dim={self.dimension}")
+    
+    def embed(self, text: str, dimension: int = None) -> List[float]:
+        dimension = dimension or self.dimension
+        tokens = self._TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        if not features:
+            features = [""]  # Empty text still needs a non-zero vector for COSINE
+        
+        hashes = np.fromiter(
+            (zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features)
+        )
+        # Low bits pick the bucket, the top bit picks the sign
+        buckets = hashes % dimension
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        
+        vector = np.zeros(dimension, dtype=np.float32)
+        np.add.at(vector, buckets, signs)
+        
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0  # All features cancelled out
+        return (vector / norm).tolist()
+
+
+EMBEDDING_PROVIDERS = {
+    "titan": TitanEmbeddings,
+    "hashing": HashingEmbeddings
+}
+
+
+def create_embedding_provider(name: str = None) -> EmbeddingProvider:
+    """Instantiate the embedding provider selected by Config.EMBEDDING_PROVIDER"""
+    name = (name or Config.EMBEDDING_PROVIDER).lower()
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(
+            f"Unknown EMBEDDING_PROVIDER: {name}. Must be one of {sorted(EMBEDDING_PROVIDERS)}"
+        )
+    return EMBEDDING_PROVIDERS[name]()
+
+
+# =============================================================================
+# Embedding Cache (in-process LRU + Redis)
+# =============================================================================
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache in front of an embedding client.
+    
+    - Tier 1: bounded in-process LRU (per uvicorn worker)
+    - Tier 2: shared Redis tier with TTL and a total byte budget
+    
+    Keys are a SHA-256 of the normalized text plus model id and dimension,
+    so alert storms repeating the same short description only pay for one
+    Bedrock call. Vectors are stored as packed FLOAT32 bytes in both tiers.
+    """
+    
+    KEY_PREFIX = "emb:cache:"
+    LRU_KEY = "emb:cache:lru"
+    BYTES_KEY = "emb:cache:bytes"
+    
+    def __init__(self, embeddings: EmbeddingProvider, redis_client=None):
+        self.embeddings = embeddings
+        self.provider_id = embeddings.provider_id
+        self.namespace = embeddings.namespace
+        self.model_id = embeddings.model_id
+        self.dimension = embeddings.dimension
+        self.supported_dimensions = embeddings.supported_dimensions
+        self.check_dimension = embeddings.check_dimension
+        self.redis = redis_client
+        self.local_max_entries = Config.EMBED_CACHE_LOCAL_MAX_ENTRIES
+        self.ttl = Config.EMBED_CACHE_TTL_SECONDS
+        self.redis_max_bytes = Config.EMBED_CACHE_REDIS_MAX_BYTES
+        
+        self._local: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "redis_errors": 0,
+            "evictions": 0,
+            "lookup_ms_total": 0.0,
+            "embed_ms_total": 0.0
+        }
+        logger.info(
+            f"Initialized embedding cache: local={self.local_max_entries} entries, "
+            f"redis={'on' if self.redis is not None else 'off'} "
+            f"(ttl={self.ttl}s, max={self.redis_max_bytes} bytes)"
+        )
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so trivially different inputs share a cache entry"""
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+    
+    def cache_key(self, text: str, dimension: int = None) -> str:
+        """Cache key: hash of normalized content + model id + dimension"""
+        dimension = dimension or self.dimension
+        digest = hashlib.sha256(
+            f"{self.model_id}|{dimension}|{self.normalize(text)}".encode()
+        ).hexdigest()
+        return f"{self.KEY_PREFIX}{dimension}:{digest}"
+    
+    def embed(self, text: str, dimension: int = None) -> List[float]:
+        """Return a cached embedding, computing and storing it on a miss"""
+        key = self.cache_key(text, dimension)
+        
+        lookup_start = time.perf_counter()
+        cached = self._get(key)
+        self._count("lookup_ms_total", (time.perf_counter() - lookup_start) * 1000)
+        if cached is not None:
+            return cached
+        
+        self._count("misses")
+        embed_start = time.perf_counter()
+        embedding = self.embeddings.embed(text, dimension)
+        self._count("embed_ms_total", (time.perf_counter() - embed_start) * 1000)
+        
+        self._put(key, embedding)
+        return embedding
+    
+    async def aembed(self, text: str, dimension: int = None) -> List[float]:
+        """Async variant of embed; local hits are served without a thread hop"""
+        packed = self._get_local(self.cache_key(text, dimension))
+        if packed is not None:
+            return self._unpack(packed)
+        return await blocking_io.run(self.embed, text, dimension)
+    
+    async def aembed_batch(self, texts: List[str], dimension: int = None) -> BatchEmbeddingResult:
+        """Async variant of embed_batch (offloaded to the I/O executor)"""
+        return await blocking_io.run(self.embed_batch, texts, dimension)
+    
+    def embed_batch(self, texts: List[str], dimension: int = None) -> BatchEmbeddingResult:
+        """
+        Generate embeddings for multiple texts through the cache.
+        
+        All keys are looked up in one Redis round trip; only cache misses
+        (deduplicated) are sent to the underlying batch engine. Results come
+        back in input order.
+        """
+        result = BatchEmbeddingResult(len(texts))
+        positions: Dict[str, List[int]] = {}
+        first_texts: Dict[str, str] = {}
+        for i, text in enumerate(texts):
+            key = self.cache_key(text, dimension)
+            positions.setdefault(key, []).append(i)
+            first_texts.setdefault(key, text)
+        
+        lookup_start = time.perf_counter()
+        cached = self._get_many(list(positions))
+        self._count("lookup_ms_total", (time.perf_counter() - lookup_start) * 1000)
+        
+        misses: Dict[str, List[int]] = {}
+        miss_texts: List[str] = []
+        for (key, indexes), embedding in zip(positions.items(), cached):
+            if embedding is not None:
+                for i in indexes:
+                    result.embeddings[i] = embedding
+            else:
+                misses[key] = indexes
+                miss_texts.append(first_texts[key])
+        
+        if not miss_texts:
+            return result
+        
+        self._count("misses", len(miss_texts))
+        embed_start = time.perf_counter()
+        batch = self.embeddings.embed_batch(miss_texts, dimension)
+        self._count("embed_ms_total", (time.perf_counter() - embed_start) * 1000)
+        
+        for j, (key, indexes) in enumerate(misses.items()):
+            embedding = batch.embeddings[j]
+            if embedding is not None:
+                self._put(key, embedding)
+            for i in indexes:
+                result.embeddings[i] = embedding
+                if j in batch.errors:
+                    result.errors[i] = batch.errors[j]
+        return result
+    
+    def _get_local(self, key: str) -> Optional[bytes]:
+        """Look up a key in the local tier only"""
+        with self._lock:
+            packed = self._local.get(key)
+            if packed is not None:
+                self._local.move_to_end(key)
+                self._counters["local_hits"] += 1
+        return packed
+    
+    def _get(self, key: str) -> Optional[List[float]]:
+        """Look up a key in the local tier, then the Redis tier"""
+        return self._get_many([key])[0]
+    
+    def _get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Look up keys in the local tier, then the rest in one Redis pipeline"""
+        found: List[Optional[bytes]] = [self._get_local(key) for key in keys]
+        remote = [i for i, packed in enumerate(found) if packed is None]
+        
+        if remote and self.redis is not None:
+            try:
+                now = time.time()
+                pipe = self.redis.pipeline(transaction=False)
+                for i in remote:
+                    pipe.getex(keys[i], ex=self.ttl)
+                    pipe.zadd(self.LRU_KEY, {keys[i]: now}, xx=True)
+                replies = pipe.execute()[::2]
+            except redis.RedisError as e:
+                self._count("redis_errors")
+                logger.debug(f"Embedding cache read failed: {e}")
+                replies = []
+            
+            for i, packed in zip(remote, replies):
+                if packed is not None:
+                    self._count("redis_hits")
+                    self._put_local(keys[i], packed)
+                    found[i] = packed
+        
+        return [self._unpack(packed) if packed is not None else None for packed in found]
+    
+    def _put(self, key: str, embedding: List[float]):
+        """Store an embedding in both tiers"""
+        packed = np.asarray(embedding, dtype=np.float32).tobytes()
+        self._put_local(key, packed)
+        
+        if self.redis is None:
+            return
+        
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(key, packed, ex=self.ttl, nx=True)
+            pipe.zadd(self.LRU_KEY, {key: time.time()})
+            _, added = pipe.execute()
+            if not added:
+                # Already counted: stored by another worker, or re-created
+                # after expiring while its LRU entry (and bytes) remained
+                return
+            
+            total_bytes = self.redis.incrby(self.BYTES_KEY, len(packed))
+            if total_bytes > self.redis_max_bytes:
+                self._evict()
+        except redis.RedisError as e:
+            self._count("redis_errors")
+            logger.debug(f"Embedding cache write failed: {e}")
+    
+    def _put_local(self, key: str, packed: bytes):
+        with self._lock:
+            self._local[key] = packed
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+    
+    def _evict(self):
+        """Drop expired and least recently used Redis entries until under budget"""
+        now = time.time()
+        
+        # Entries whose last access is older than the TTL have already expired
+        expired = self.redis.zrangebyscore(self.LRU_KEY, 0, now - self.ttl)
+        freed = self._drop(expired)
+        
+        total_bytes = int(self.redis.get(self.BYTES_KEY) or 0)
+        # Evict down to 90% of the budget so we don't evict on every write
+        target = int(self.redis_max_bytes * 0.9)
+        while total_bytes > target:
+            oldest = self.redis.zrange(self.LRU_KEY, 0, 99)
+            if not oldest:
+                # Accounting drifted (e.g. LRU set flushed) - reset it
+                self.redis.set(self.BYTES_KEY, 0)
+                break
+            total_bytes -= self._drop(oldest)
+        
+        if freed:
+            logger.debug(f"Embedding cache dropped {freed} bytes of expired entries")
+    
+    def _drop(self, keys: List[bytes]) -> int:
+        """Delete cache entries and release their bytes; returns bytes freed"""
+        if not keys:
+            return 0
+        # Entry size is derivable from the key (emb:cache:{dim}:{digest})
+        freed = sum(int(k.decode().split(":")[2]) * 4 for k in keys)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(*keys)
+        pipe.zrem(self.LRU_KEY, *keys)
+        pipe.decrby(self.BYTES_KEY, freed)
+        pipe.execute()
+        self._count("evictions", len(keys))
+        return freed
+    
+    @staticmethod
+    def _unpack(packed: bytes) -> List[float]:
+        return np.frombuffer(packed, dtype=np.float32).tolist()
+    
+    def _count(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/latency counters for /stats"""
+        with self._lock:
+            c = dict(self._counters)
+            local_size = len(self._local)
+        
+        hits = c["local_hits"] + c["redis_hits"]
+        lookups = hits + c["misses"]
+        
+        redis_bytes = None
+        if self.redis is not None:
+            try:
+                redis_bytes = int(self.redis.get(self.BYTES_KEY) or 0)
+            except redis.RedisError:
+                pass
+        
+        return {
+            "model": self.model_id,
+            "dimension": self.dimension,
+            "local_hits": c["local_hits"],
+            "redis_hits": c["redis_hits"],
+            "misses": c["misses"],
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": c["evictions"],
+            "redis_errors": c["redis_errors"],
+            "avg_lookup_ms": round(c["lookup_ms_total"] / lookups, 3) if lookups else 0.0,
+            "avg_miss_embed_ms": round(c["embed_ms_total"] / c["misses"], 2) if c["misses"] else 0.0,
+            "local_entries": local_size,
+            "local_max_entries": self.local_max_entries,
+            "redis_bytes": redis_bytes,
+            "redis_max_bytes": self.redis_max_bytes
+        }
 
 
 # =============================================================================
@@ -195,7 +905,8 @@ class ClaudeReasoning:
     def __init__(self):
         self.client = boto3.client(
             'bedrock-runtime',
-            region_name=Config.AWS_REGION
+            region_name=Config.AWS_REGION,
+            config=BotoConfig(max_pool_connections=max(10, Config.LLM_CONCURRENCY))
         )
         self.model_id = Config.CLAUDE_MODEL
         logger.info(f"Initialized Claude Reasoning via Bedrock: {self.model_id}")
@@ -278,6 +989,10 @@ Respond in JSON format matching the expected schema."""
             logger.error(f"Claude reasoning error: {e}")
             raise HTTPException(status_code=500, detail=f"Reasoning failed: {str(e)}")
     
+    async def aanalyze_ticket(self, **kwargs) -> Dict:
+        """Async variant of analyze_ticket (offloaded to the LLM executor)"""
+        return await llm_io.run(self.analyze_ticket, **kwargs)
+    
     def _build_context_prompt(
         self,
         ticket: TicketQuery,
@@ -340,6 +1055,172 @@ Respond with a JSON object containing:
         return prompt
 
 
+# =============================================================================
+# Vector Encoding (FLOAT32 / FLOAT16 / BFLOAT16 / INT8)
+# =============================================================================
+
+class VectorCodec:
+    """
+    Vectorized (NumPy) encoding of embeddings into Redis vector blobs.
+    
+    - FLOAT32:  4 bytes/dim, exact
+    - FLOAT16:  2 bytes/dim, IEEE half precision
+    - BFLOAT16: 2 bytes/dim, float32 exponent range, 8-bit mantissa
+    - INT8:     1 byte/dim, symmetric scalar quantization; the per-vector
+                scale is stored alongside (cosine ranking doesn't need it,
+                but decoding back to float32 does)
+    """
+    
+    TYPES = ("FLOAT32", "FLOAT16", "BFLOAT16", "INT8")
+    BYTES_PER_DIM = {"FLOAT32": 4, "FLOAT16": 2, "BFLOAT16": 2, "INT8": 1}
+    
+    @classmethod
+    def check_type(cls, vector_type: str):
+        if vector_type not in cls.TYPES:
+            raise ValueError(f"Unsupported vector type: {vector_type}. Must be one of {list(cls.TYPES)}")
+    
+    @staticmethod
+    def encode(embedding, vector_type: str = "FLOAT32"):
+        """Encode one vector; returns (blob, scale) where scale is None unless INT8"""
+        v = np.asarray(embedding, dtype=np.float32)
+        
+        if vector_type == "FLOAT32":
+            return v.tobytes(), None
+        if vector_type == "FLOAT16":
+            return v.astype(np.float16).tobytes(), None
+        if vector_type == "BFLOAT16":
+            # Round-to-nearest-even on the upper 16 bits of the float32
+            bits = v.view(np.uint32)
+            rounded = (bits + 0x7FFF + ((bits >> 16) & 1)) >> 16
+            return rounded.astype(np.uint16).tobytes(), None
+        if vector_type == "INT8":
+            max_abs = float(np.abs(v).max()) if v.size else 0.0
+            scale = max_abs / 127.0 if max_abs > 0 else 1.0
+            return np.clip(np.rint(v / scale), -127, 127).astype(np.int8).tobytes(), scale
+        raise ValueError(f"Unsupported vector type: {vector_type}")
+    
+    @staticmethod
+    def decode(blob: bytes, vector_type: str = "FLOAT32", scale: float = None) -> np.ndarray:
+        """Decode a stored blob back to a float32 array"""
+        if vector_type == "FLOAT32":
+            return np.frombuffer(blob, dtype=np.float32)
+        if vector_type == "FLOAT16":
+            return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        if vector_type == "BFLOAT16":
+            return (np.frombuffer(blob, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32)
+        if vector_type == "INT8":
+            return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * (scale or 1.0)
+        raise ValueError(f"Unsupported vector type: {vector_type}")
+
+
+# =============================================================================
+# Search Result Cache (in-process LRU, per-index generation invalidation)
+# =============================================================================
+
+class SearchResultCache:
+    """
+    Byte-capped in-process LRU of search results.
+    
+    Every index has a generation counter in Redis (`rag:gen:{index}`) that
+    each write to the index increments in the same transaction. Cache keys
+    include the generation read just before the search, so after an ingest
+    every replica misses and recomputes - results are never served stale.
+    Entries also expire after RESULT_CACHE_TTL_SECONDS to bound the effect
+    of documents that leave an index by TTL rather than by a write.
+    
+    Keys hash the encoded query vector with everything else that shapes the
+    result (index, k, filters, mode, EF_RUNTIME, projection and, for
+    hybrid search, the query text). Results are stored as JSON, which both
+    sizes them for the byte budget and hands callers a fresh copy.
+    """
+    
+    GENERATION_PREFIX = "rag:gen:"
+    
+    def __init__(self, redis_client, max_bytes: int = None, ttl_seconds: int = None):
+        self.redis = redis_client
+        self.max_bytes = max_bytes or Config.RESULT_CACHE_MAX_BYTES
+        self.ttl = ttl_seconds or Config.RESULT_CACHE_TTL_SECONDS
+        
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "generation_errors": 0}
+    
+    @classmethod
+    def generation_key(cls, index_name: str) -> str:
+        return f"{cls.GENERATION_PREFIX}{index_name}"
+    
+    def generation(self, index_name: str) -> Optional[int]:
+        """Current generation of an index (None if Redis can't be read: don't cache)"""
+        try:
+            return int(self.redis.get(self.generation_key(index_name)) or 0)
+        except redis.RedisError:
+            with self._lock:
+                self._counters["generation_errors"] += 1
+            return None
+    
+    @staticmethod
+    def key(generation: int, index_name: str, query_bytes: bytes, **params) -> str:
+        digest = hashlib.sha256(query_bytes)
+        digest.update(json.dumps([generation, index_name, params], sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[List[Dict]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < now:
+                self._drop(key)
+                self._counters["expired"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            payload = entry[0]
+        return json.loads(payload)
+    
+    def put(self, key: str, results: List[Dict]):
+        payload = json.dumps(results)
+        size = len(payload)
+        if size > self.max_bytes // 10:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (payload, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+    
+    def _drop(self, key: str):
+        payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and memory for /stats"""
+        with self._lock:
+            c = dict(self._counters)
+            entries, size = len(self._entries), self._bytes
+        
+        lookups = c["hits"] + c["misses"]
+        return {
+            "hits": c["hits"],
+            "misses": c["misses"],
+            "hit_ratio": round(c["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evictions": c["evictions"],
+            "expired": c["expired"],
+            "generation_errors": c["generation_errors"],
+            "ttl_seconds": self.ttl
+        }
+
+
 # =============================================================================
 # Vector Database Manager
 # =============================================================================
@@ -347,341 +1228,3716 @@ Respond with a JSON object containing:
 class VectorDBManager:
     """Redis Stack Vector Database Manager (Enterprise-grade replacement for ChromaDB)"""
     
-    def __init__(self, embeddings: TitanEmbeddings):
+    # Logical collections: index/key-prefix stem, description, document TTL,
+    # default vector index parameters (overridable via Config.INDEX_PARAMS)
+    # and the fields search results return
+    COLLECTIONS = {
+        "kb": {
+            "stem": "kb", "description": "Knowledge Base Articles", "ttl": None,
+            "index": {"ALGORITHM": "HNSW", "M": 16, "EF_CONSTRUCTION": 200, "EF_RUNTIME": 10},
+            "return": ("doc_id", "title", "category", "kb_number", "parent_id", "chunk_index", "summary")
+        },
+        "ticket": {
+            "stem": "tickets", "description": "Historical Tickets", "ttl": 86400 * 90,
+            "index": {"ALGORITHM": "HNSW", "M": 24, "EF_CONSTRUCTION": 300, "EF_RUNTIME": 20},
+            "return": (
+                "doc_id", "title", "category", "incident_number", "resolution", "resolution_code",
+                "parent_id", "chunk_index", "summary"
+            )
+        },
+        "sop": {
+            # Small collection: exact brute force beats graph traversal
+            "stem": "sop", "description": "Standard Operating Procedures", "ttl": None,
+            "index": {"ALGORITHM": "FLAT"},
+            "return": ("doc_id", "title", "category", "parent_id", "chunk_index", "summary")
+        },
+        "recent": {
+            # Storm Shield dedup window: small, short-lived, exact search
+            "stem": "recent", "description": "Recent Incidents (dedup)",
+            "ttl": Config.RECENT_INCIDENT_TTL_SECONDS,
+            "index": {"ALGORITHM": "FLAT"},
+            "return": ("doc_id",)
+        }
+    }
+    
+    # Vector index parameters accepted per algorithm
+    INDEX_PARAM_NAMES = {
+        "HNSW": ("M", "EF_CONSTRUCTION", "EF_RUNTIME", "EPSILON"),
+        "FLAT": ("BLOCK_SIZE", "INITIAL_CAP")
+    }
+    
+    # Indexes created before parameters were configurable used bare HNSW defaults
+    LEGACY_INDEX_PARAMS = {"ALGORITHM": "HNSW", "M": 16, "EF_CONSTRUCTION": 200, "EF_RUNTIME": 10}
+    
+    # Accepted collection names -> logical collection
+    COLLECTION_ALIASES = {
+        Config.COLLECTION_KB: "kb",
+        Config.COLLECTION_TICKETS: "ticket",
+        Config.COLLECTION_SOP: "sop",
+        "kb": "kb",
+        "ticket": "ticket",
+        "sop": "sop",
+        "kb_articles": "kb",
+        "incidents": "ticket",
+        "recent": "recent"
+    }
+    
+    # Per-index metadata hash (dimension, provider, model)
+    INDEX_META_PREFIX = "rag:index:"
+    
+    # Bumped whenever dimensions / vector fields change or a re-embed job or
+    # vector type migration starts, so every process reloads them (see
+    # refresh_layout)
+    LAYOUT_KEY = "rag:layout"
+    
+    # Re-embed job state per collection (ReembedJob)
+    REEMBED_PREFIX = "rag:reembed:"
+    
+    # Vector type migration state per collection (migrate_vector_type)
+    MIGRATE_PREFIX = "rag:migrate:"
+    
+    # Set a vector only if the document still exists, so a document
+    # deleted mid-batch isn't recreated as a vector-only hash
+    SET_IF_EXISTS = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return redis.call('HSET', KEYS[1], unpack(ARGV))
+    end
+    return 0
+    """
+    
+    # Per source document: content fingerprint and the keys of its chunks
+    SOURCE_PREFIX = "rag:src:"
+    
+    # Metadata stored on each document hash (and covered by the fingerprint)
+    STORED_METADATA_FIELDS = (
+        "title", "category", "kb_number", "sys_id", "parent_id", "chunk_index",
+        "incident_number", "resolution", "resolution_code"
+    )
+    
+    # Resolution section of ticket content ("Description:\n...\n\nResolution:\n...")
+    RESOLUTION_SECTION = re.compile(r"Resolution:\s*(.*)", re.DOTALL)
+    
+    # Characters that must be backslash-escaped inside a TAG query
+    TAG_SPECIAL_CHARS = re.compile(r"([,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\ ])")
+    
+    # Hybrid search: full-text words, and identifier-like tokens (KB0012345, INC-1.2)
+    TEXT_WORD = re.compile(r"\w+")
+    TEXT_TERM = re.compile(r"\w[\w.\-]*")
+    MAX_TEXT_TERMS = 24
+    
+    # Page size of the doc_id lookup for sources stored before chunk lists
+    LEGACY_LOOKUP_PAGE = 1000
+    
+    # Shard names become part of index names and key prefixes
+    SHARD_NAME = re.compile(r"^[a-z0-9_\-]+$")
+    
+    # Stored vector fields, RETURNed when results are re-ranked client-side
+    VECTOR_FIELDS = ("embedding", "embedding_type", "embedding_scale")
+    
+    # Indexes created before metadata existed were always Titan V2 @ 1024
+    LEGACY_DIMENSION = 1024
+    
+    def __init__(self, embeddings):
+        # EmbeddingProvider or EmbeddingCache (same embed/embed_batch interface)
         self.embeddings = embeddings
-        self.vector_dim = 1024  # Titan V2 embedding dimension
+        
+        # Vector dimension / storage type per logical collection
+        # (resolved from index metadata in _ensure_indices)
+        self.dimensions: Dict[str, int] = {}
+        self.vector_types: Dict[str, str] = {}
+        self.index_params: Dict[str, Dict[str, Any]] = {}
+        # Hash field holding each collection's vector ("embedding", or
+        # "embedding_v2"... after a re-embed) and running re-embed targets
+        self.vector_fields: Dict[str, str] = {}
+        self.reembed_targets: Dict[str, Dict[str, Any]] = {}
+        self._layout_version = None
+        self._layout_checked = 0.0
+        
+        # Logical collection -> (partition key, shard names)
+        self.shard_specs = self._shard_specs()
+        
+        # Indexes and keys are namespaced per embedding provider so vectors
+        # from different models never mix (Titan keeps the original names)
+        self.namespace = embeddings.namespace
         
         # Initialize Redis connection
-        redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
-        self.redis = redis.from_url(redis_url, decode_responses=False)
+        self.redis = redis.from_url(Config.REDIS_URL, decode_responses=False)
         
         # Collection name to index name mapping
         self.collections = {
-            Config.COLLECTION_KB: "idx:kb",
-            Config.COLLECTION_TICKETS: "idx:tickets", 
-            Config.COLLECTION_SOP: "idx:sop",
-            "kb": "idx:kb",
-            "ticket": "idx:tickets",
-            "sop": "idx:sop",
-            "kb_articles": "idx:kb",
-            "incidents": "idx:tickets"
+            alias: self._index_name(name) for alias, name in self.COLLECTION_ALIASES.items()
         }
         
+        self.result_cache = SearchResultCache(self.redis) if Config.RESULT_CACHE_ENABLED else None
+        
+        # Shared pool for concurrent multi-collection searches
+        self._search_pool = ThreadPoolExecutor(
+            max_workers=Config.SEARCH_FANOUT_WORKERS,
+            thread_name_prefix="rag-search"
+        )
+        
         # Initialize vector indices
         self._ensure_indices()
         
-        logger.info(f"Initialized Redis VectorDB with indices: {list(set(self.collections.values()))}")
+        logger.info(
+            f"Initialized Redis VectorDB ({embeddings.provider_id}, dims={self.dimensions}) "
+            f"with indices: {list(set(self.collections.values()))}"
+        )
     
-    def _ensure_indices(self):
-        """Create vector indices if they don't exist"""
-        index_configs = [
-            ("idx:kb", "kb:", "Knowledge Base Articles"),
-            ("idx:tickets", "tickets:", "Historical Tickets"),
-            ("idx:sop", "sop:", "Standard Operating Procedures")
-        ]
-        
-        for index_name, prefix, description in index_configs:
-            try:
-                # Check if index exists
-                self.redis.execute_command("FT.INFO", index_name)
-                logger.debug(f"Index {index_name} already exists")
-            except redis.ResponseError:
-                # Create index with vector field
-                try:
-                    self.redis.execute_command(
-                        "FT.CREATE", index_name,
-                        "ON", "HASH",
-                        "PREFIX", "1", prefix,
-                        "SCHEMA",
-                        "content", "TEXT",
-                        "doc_id", "TAG",
-                        "title", "TEXT",
-                        "category", "TAG",
-                        "created_at", "NUMERIC",
-                        "embedding", "VECTOR", "HNSW", "6",
-                        "TYPE", "FLOAT32",
-                        "DIM", str(self.vector_dim),
-                        "DISTANCE_METRIC", "COSINE"
-                    )
-                    logger.info(f"Created vector index: {index_name}")
-                except redis.ResponseError as e:
-                    logger.warning(f"Could not create index {index_name}: {e}")
+    def _index_name(self, collection: str, shard: Optional[str] = None) -> str:
+        """Physical index name for a logical collection (or one of its shards)"""
+        return f"idx:{self.namespace}{self._stem(collection, shard)}"
     
-    def add_document(
+    def _key_prefix(self, collection: str, shard: Optional[str] = None) -> str:
+        """Hash key prefix for a logical collection (or one of its shards)"""
+        return f"{self.namespace}{self._stem(collection, shard)}:"
+    
+    def _stem(self, collection: str, shard: Optional[str] = None) -> str:
+        # "tickets" / "tickets.emea": prefixes end in ":", so they never overlap
+        stem = self.COLLECTIONS[collection]["stem"]
+        return f"{stem}.{shard}" if shard else stem
+    
+    def _source_key(self, collection: str, source_id: str) -> str:
+        """Fingerprint/chunk-list hash for a source document (shared by all shards)"""
+        return f"{self.SOURCE_PREFIX}{self._index_name(collection)}:{source_id}"
+    
+    def _document_key(self, collection: str, doc_id: str, shard: Optional[str] = None) -> str:
+        """Deterministic hash key for a document, so re-ingesting replaces it"""
+        return f"{self._key_prefix(collection, shard)}{self.embedding_id(doc_id)}"
+    
+    @classmethod
+    def _shard_specs(cls) -> Dict[str, tuple]:
+        """Validated Config.SHARDS: collection -> (partition key, shard names)"""
+        specs = {}
+        for name, spec in Config.SHARDS.items():
+            collection = cls.COLLECTION_ALIASES.get(name)
+            if collection is None or collection == "recent":
+                raise ValueError(f"Cannot shard collection: {name}")
+            key = spec.get("key")
+            shards = [str(v).strip().lower() for v in spec.get("values", [])]
+            if not key or not shards:
+                raise ValueError(f"Shard spec for {name} needs a partition key and values")
+            invalid = [v for v in shards if not cls.SHARD_NAME.match(v)]
+            if invalid:
+                raise ValueError(f"Invalid shard names for {name}: {invalid}")
+            specs[collection] = (key, list(OrderedDict.fromkeys(shards)))
+        return specs
+    
+    def shards(self, collection: str) -> List[str]:
+        """Shard names of a collection ([] when it isn't sharded)"""
+        return self.shard_specs.get(collection, (None, []))[1]
+    
+    def shard_for(self, collection: str, metadata: Dict[str, Any]) -> Optional[str]:
+        """Shard a document is routed to by its partition key; None = base index"""
+        if collection not in self.shard_specs:
+            return None
+        key, shards = self.shard_specs[collection]
+        value = str(metadata.get(key) or "").strip().lower()
+        return value if value in shards else None
+    
+    def _index_names(self, collection: str) -> List[str]:
+        """Base index plus every shard index of a collection"""
+        return [self._index_name(collection, shard) for shard in (None, *self.shards(collection))]
+    
+    @staticmethod
+    def embedding_id(doc_id: str) -> str:
+        return hashlib.md5(doc_id.encode()).hexdigest()
+    
+    @classmethod
+    def escape_tag(cls, value: str) -> str:
+        """Escape a value for use inside a TAG query ({...})"""
+        return cls.TAG_SPECIAL_CHARS.sub(r"\\\1", str(value))
+    
+    def filter_query(self, filters: Optional[SearchFilters]) -> str:
+        """
+        Compile filters into the pre-filter half of a hybrid KNN query.
+        
+        Uses the indexed category TAG, created_at NUMERIC and doc_id TAG
+        fields, so RediSearch narrows the candidate set before the vector
+        comparison instead of after it. Returns "*" when nothing is filtered.
+        """
+        if filters is None:
+            return "*"
+        
+        clauses = []
+        if filters.categories:
+            clauses.append("@category:{" + "|".join(self.escape_tag(c) for c in filters.categories) + "}")
+        
+        created_after = filters.created_after
+        if filters.time_window_minutes:
+            window_start = int(time.time()) - filters.time_window_minutes * 60
+            created_after = max(created_after or window_start, window_start)
+        if created_after is not None or filters.created_before is not None:
+            low = created_after if created_after is not None else "-inf"
+            high = filters.created_before if filters.created_before is not None else "+inf"
+            clauses.append(f"@created_at:[{low} {high}]")
+        
+        if filters.exclude_ids:
+            clauses.append("-@doc_id:{" + "|".join(self.escape_tag(d) for d in filters.exclude_ids) + "}")
+        
+        return f"({' '.join(clauses)})" if clauses else "*"
+    
+    @staticmethod
+    def source_id(doc_id: str, metadata: Dict[str, Any]) -> str:
+        """Chunks of one upload share their parent_id; other documents are their own source"""
+        return metadata.get("parent_id") or doc_id
+    
+    def fingerprint(self, collection_name: str, chunks: List[tuple], schema: Optional[str] = None) -> str:
+        """
+        Content fingerprint of a source document.
+        
+        Covers every chunk's doc_id, text and stored metadata plus the
+        embedding model and index schema, so a new model or dimension is
+        never mistaken for unchanged content.
+        
+        Args:
+            collection_name: Target collection
+            chunks: (doc_id, content, metadata) for all chunks of the source
+            schema: "model:dim:type" to fingerprint against (default: current)
+        """
+        collection = self.COLLECTION_ALIASES.get(collection_name, "kb")
+        digest = hashlib.sha256((schema or self.fingerprint_schema(collection)).encode())
+        sharded = collection in self.shard_specs
+        for doc_id, content, metadata in sorted(chunks, key=lambda c: c[0]):
+            stored = [str(metadata.get(f) or "") for f in self.STORED_METADATA_FIELDS]
+            if sharded:
+                # A new partition value moves the document to another shard
+                stored.append(self.shard_for(collection, metadata) or "")
+            digest.update(json.dumps([doc_id, content, stored]).encode())
+        return digest.hexdigest()
+    
+    def fingerprint_schema(self, collection: str) -> str:
+        """Embedding model, dimension and vector type covered by fingerprints"""
+        return f"{self.embeddings.model_id}:{self.dimensions[collection]}:{self.vector_types[collection]}"
+    
+    def unchanged_sources(self, fingerprints: Dict[tuple, str]) -> set:
+        """
+        Sources whose stored fingerprint matches (one pipelined round trip).
+        
+        Args:
+            fingerprints: (collection_name, source_id) -> fingerprint
+        """
+        sources = list(fingerprints)
+        pipe = self.redis.pipeline(transaction=False)
+        for collection_name, source_id in sources:
+            collection = self.COLLECTION_ALIASES.get(collection_name, "kb")
+            pipe.hget(self._source_key(collection, source_id), "fp")
+        
+        return {
+            source for source, stored in zip(sources, pipe.execute())
+            if stored is not None and stored.decode() == fingerprints[source]
+        }
+    
+    def _ensure_indices(self):
+        """
+        Create vector indices if they don't exist.
+        
+        Each index records its vector dimension, storage type and algorithm
+        parameters in `rag:index:{index}`. For an existing index the stored
+        values win over the configured ones (changing them needs a re-embed,
+        migration or rebuild), so searches never send vectors of the wrong
+        size or type.
+        """
+        self._layout_version = self.redis.get(self.LAYOUT_KEY)
+        self._layout_checked = time.monotonic()
+        
+        for name, spec in self.COLLECTIONS.items():
+            index_name = self._index_name(name)
+            meta_key = f"{self.INDEX_META_PREFIX}{index_name}"
+            self.vector_fields[name] = (self.redis.hget(meta_key, "vector_field") or b"embedding").decode()
+            
+            configured_dim = Config.EMBED_DIMENSIONS.get(name) or self.embeddings.dimension
+            self.embeddings.check_dimension(configured_dim)
+            configured_type = Config.VECTOR_TYPES.get(name, "FLOAT32")
+            VectorCodec.check_type(configured_type)
+            configured_params = self._configured_index_params(name)
+            
+            try:
+                # Check if index exists
+                self.redis.execute_command("FT.INFO", index_name)
+            except redis.ResponseError:
+                # Create index with vector field
+                self.dimensions[name] = configured_dim
+                self.vector_types[name] = configured_type
+                self.index_params[name] = configured_params
+                try:
+                    self._create_index(name)
+                    logger.info(
+                        f"Created vector index: {index_name} ({spec['description']}, "
+                        f"dim={configured_dim}, type={configured_type}, params={configured_params})"
+                    )
+                except redis.ResponseError as e:
+                    logger.warning(f"Could not create index {index_name}: {e}")
+            else:
+                logger.debug(f"Index {index_name} already exists")
+                
+                meta = self.redis.hgetall(meta_key)
+                if b"dim" not in meta:
+                    legacy_dim = self.LEGACY_DIMENSION if not self.namespace else self.embeddings.dimension
+                    self.dimensions[name] = legacy_dim
+                    self.vector_types[name] = "FLOAT32"
+                    self.index_params[name] = dict(self.LEGACY_INDEX_PARAMS)
+                    self._write_index_meta(name)
+                else:
+                    self.dimensions[name] = int(meta[b"dim"])
+                    self.vector_types[name] = meta.get(b"type", b"FLOAT32").decode()
+                    self.index_params[name] = json.loads(
+                        meta.get(b"index_params") or json.dumps(self.LEGACY_INDEX_PARAMS)
+                    )
+                
+                configured = (configured_dim, configured_type, configured_params)
+                stored = (self.dimensions[name], self.vector_types[name], self.index_params[name])
+                if stored != configured:
+                    logger.warning(
+                        f"Index {index_name} was built with dim={stored[0]} type={stored[1]} "
+                        f"params={stored[2]} but dim={configured[0]} type={configured[1]} "
+                        f"params={configured[2]} is configured; keeping the stored schema until "
+                        f"the collection is re-embedded, migrated or rebuilt"
+                    )
+                
+                if b"derived_fields" not in meta:
+                    try:
+                        updated = self.backfill_derived_fields(name)
+                        self.redis.hset(meta_key, "derived_fields", 1)
+                        logger.info(f"Backfilled summary fields on {updated} documents in {index_name}")
+                    except redis.ResponseError as e:
+                        # Retried on the next start; the stored schema above still applies
+                        logger.warning(f"Could not backfill summary fields in {index_name}: {e}")
+            
+            for shard in self.shards(name):
+                self._ensure_shard_index(name, shard)
+        
+        self._load_reembed_targets()
+    
+    def refresh_layout(self, force: bool = False):
+        """
+        Reload dimensions, vector types and fields, and running re-embed
+        jobs when another process changed them (reembed.py). Costs one GET,
+        at most every LAYOUT_CHECK_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if not force and now - self._layout_checked < Config.LAYOUT_CHECK_INTERVAL:
+            return
+        self._layout_checked = now
+        try:
+            version = self.redis.get(self.LAYOUT_KEY)
+            if version == self._layout_version:
+                return
+            pipe = self.redis.pipeline(transaction=False)
+            for name in self.COLLECTIONS:
+                pipe.hgetall(f"{self.INDEX_META_PREFIX}{self._index_name(name)}")
+            for name, meta in zip(self.COLLECTIONS, pipe.execute()):
+                if b"dim" in meta:
+                    self.dimensions[name] = int(meta[b"dim"])
+                    self.vector_types[name] = meta.get(b"type", b"FLOAT32").decode()
+                    self.vector_fields[name] = meta.get(b"vector_field", b"embedding").decode()
+            self._load_reembed_targets()
+            self._layout_version = version
+            logger.info(f"Reloaded index layout: dims={self.dimensions}, re-embedding={list(self.reembed_targets)}")
+        except redis.RedisError as e:
+            logger.warning(f"Could not refresh index layout: {e}")
+    
+    def _load_reembed_targets(self):
+        """
+        Collections with a re-embed job or vector type migration that hasn't
+        cut over yet (their writes go to both vectors)
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for name in self.COLLECTIONS:
+            pipe.hmget(self._reembed_key(name), "status", "dim", "field")
+            pipe.hmget(self._migrate_key(name), "status", "field", "type")
+        replies = iter(pipe.execute())
+        targets = {}
+        for name in self.COLLECTIONS:
+            (status, dim, field), (migration, migration_field, vector_type) = next(replies), next(replies)
+            if status in (b"running", b"ready"):
+                targets[name] = {"dim": int(dim), "field": field.decode()}
+            elif migration == b"running":
+                # Same vector, stored again in the target encoding
+                targets[name] = {
+                    "dim": self.dimensions[name],
+                    "field": migration_field.decode(),
+                    "type": vector_type.decode()
+                }
+        self.reembed_targets = targets
+    
+    def _reembed_key(self, collection: str) -> str:
+        return f"{self.REEMBED_PREFIX}{self._index_name(collection)}"
+    
+    def _migrate_key(self, collection: str) -> str:
+        return f"{self.MIGRATE_PREFIX}{self._index_name(collection)}"
+    
+    def _next_vector_field(self, collection: str) -> str:
+        """Hash field for a collection's next vector (embedding -> embedding_v2 -> embedding_v3 ...)"""
+        current = self.vector_fields[collection]
+        return f"embedding_v{int(current.rsplit('_v', 1)[1]) + 1 if '_v' in current else 2}"
+    
+    @staticmethod
+    def vector_hash_fields(vector_field: str, embedding, vector_type: str) -> Dict[str, Any]:
+        """Encoded vector, its storage type and (INT8) scale under `vector_field`"""
+        blob, scale = VectorCodec.encode(embedding, vector_type)
+        fields = {vector_field: blob, f"{vector_field}_type": vector_type}
+        if scale is not None:
+            fields[f"{vector_field}_scale"] = repr(scale)
+        return fields
+    
+    def _ensure_shard_index(self, collection: str, shard: str):
+        """Create a shard index with its collection's schema if it doesn't exist"""
+        index_name = self._index_name(collection, shard)
+        try:
+            self.redis.execute_command("FT.INFO", index_name)
+            meta = self.redis.hgetall(f"{self.INDEX_META_PREFIX}{index_name}")
+            stored = (int(meta.get(b"dim", 0)), meta.get(b"type", b"FLOAT32").decode())
+            expected = (self.dimensions[collection], self.vector_types[collection])
+            if stored != expected:
+                logger.warning(
+                    f"Shard index {index_name} has dim={stored[0]} type={stored[1]} but its "
+                    f"collection uses dim={expected[0]} type={expected[1]}; rebuild the shard"
+                )
+        except redis.ResponseError:
+            try:
+                self._create_index(collection, shard)
+                logger.info(f"Created shard index: {index_name}")
+            except redis.ResponseError as e:
+                logger.warning(f"Could not create index {index_name}: {e}")
+    
+    def _configured_index_params(self, collection: str, overrides: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Default index parameters for a collection merged with Config.INDEX_PARAMS (and `overrides`)"""
+        params = {
+            **self.COLLECTIONS[collection]["index"],
+            **{k.upper(): v for k, v in Config.INDEX_PARAMS.get(collection, {}).items()},
+            **{k.upper(): v for k, v in (overrides or {}).items()}
+        }
+        params["ALGORITHM"] = params.get("ALGORITHM", "HNSW").upper()
+        
+        allowed = self.INDEX_PARAM_NAMES.get(params["ALGORITHM"])
+        if allowed is None:
+            raise ValueError(f"Unsupported index algorithm for {collection}: {params['ALGORITHM']}")
+        unknown = set(params) - set(allowed) - {"ALGORITHM"}
+        if unknown:
+            raise ValueError(f"Unsupported {params['ALGORITHM']} parameters for {collection}: {sorted(unknown)}")
+        return params
+    
+    def _create_index(self, collection: str, shard: Optional[str] = None) -> str:
+        """
+        Create a new version of the collection's (or a shard's) index with
+        its current schema and parameters, and point the logical index name
+        (an FT alias) at it. Returns the physical index name.
+        """
+        index_name = self._index_name(collection, shard)
+        version = self._index_version(collection, shard) + 1
+        physical = f"{index_name}@v{version}"
+        
+        self._ft_create(physical, collection, shard, self.index_params[collection])
+        self.redis.execute_command("FT.ALIASUPDATE", index_name, physical)
+        self._write_index_meta(collection, shard, physical=physical, version=version)
+        self.redis.incr(SearchResultCache.generation_key(index_name))
+        return physical
+    
+    def _ft_create(
+        self,
+        physical: str,
+        collection: str,
+        shard: Optional[str],
+        params: Dict[str, Any],
+        dim: Optional[int] = None,
+        vector_field: Optional[str] = None,
+        vector_type: Optional[str] = None
+    ):
+        """
+        FT.CREATE one physical index over the collection's (or a shard's) key
+        prefix. The vector is always queried as @embedding, whichever hash
+        field holds it.
+        """
+        vector_field = vector_field or self.vector_fields[collection]
+        vector_attr = ["embedding"] if vector_field == "embedding" else [vector_field, "AS", "embedding"]
+        vector_args = [
+            "TYPE", vector_type or self.vector_types[collection],
+            "DIM", str(dim or self.dimensions[collection]),
+            "DISTANCE_METRIC", "COSINE"
+        ]
+        for param in self.INDEX_PARAM_NAMES[params["ALGORITHM"]]:
+            if param in params:
+                vector_args += [param, str(params[param])]
+        
+        self.redis.execute_command(
+            "FT.CREATE", physical,
+            "ON", "HASH",
+            "PREFIX", "1", self._key_prefix(collection, shard),
+            "SCHEMA",
+            "content", "TEXT",
+            "doc_id", "TAG",
+            "title", "TEXT",
+            "category", "TAG",
+            "created_at", "NUMERIC",
+            *vector_attr, "VECTOR", params["ALGORITHM"], str(len(vector_args)), *vector_args
+        )
+    
+    def _physical_index(self, collection: str, shard: Optional[str] = None) -> str:
+        """
+        Physical index behind a logical index name. Indexes created before
+        aliasing carry the logical name themselves.
+        """
+        index_name = self._index_name(collection, shard)
+        physical = self.redis.hget(f"{self.INDEX_META_PREFIX}{index_name}", "physical")
+        return physical.decode() if physical else index_name
+    
+    def _index_version(self, collection: str, shard: Optional[str] = None) -> int:
+        version = self.redis.hget(f"{self.INDEX_META_PREFIX}{self._index_name(collection, shard)}", "version")
+        return int(version) if version else 0
+    
+    def rebuild_index(
+        self,
+        collection: str,
+        shard: Optional[str] = None,
+        params: Dict[str, Any] = None,
+        timeout: float = 3600,
+        keep_old: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Rebuild an index without downtime.
+        
+        Creates the next version of the physical index (configured
+        parameters merged with `params`) over the same key prefix, waits
+        until RediSearch has indexed the existing documents, checks the new
+        index holds at least as many documents as the serving one, then
+        swaps the alias with FT.ALIASUPDATE. Searches keep using the old
+        index until the swap, and writes in the meantime land in both. The
+        old index is dropped afterwards (documents are kept) unless
+        `keep_old`.
+        
+        Returns:
+            Logical, old and new index names with their document counts
+        
+        Raises:
+            RuntimeError: The new index came up short (it is dropped again)
+            TimeoutError: Indexing didn't finish within `timeout` seconds
+        """
+        index_name = self._index_name(collection, shard)
+        old = self._physical_index(collection, shard)
+        params = self._configured_index_params(collection, params)
+        version = self._index_version(collection, shard) + 1
+        physical = f"{index_name}@v{version}"
+        
+        self._ft_create(physical, collection, shard, params)
+        logger.info(f"Building {physical} ({params}) while {old} keeps serving {index_name}")
+        try:
+            self._wait_for_indexing(physical, timeout)
+            old_docs, new_docs = self._num_docs(old), self._num_docs(physical)
+            if new_docs < old_docs:
+                raise RuntimeError(f"{physical} indexed {new_docs} documents but {old} has {old_docs}")
+        except Exception:
+            self.redis.execute_command("FT.DROPINDEX", physical)
+            raise
+        
+        pipe = self.redis.pipeline(transaction=True)
+        if old == index_name:
+            # Pre-alias index: free its name for the alias in the same transaction
+            pipe.execute_command("FT.DROPINDEX", old)
+            pipe.execute_command("FT.ALIASADD", index_name, physical)
+        else:
+            pipe.execute_command("FT.ALIASUPDATE", index_name, physical)
+        pipe.incr(SearchResultCache.generation_key(index_name))
+        pipe.execute()
+        
+        self.index_params[collection] = params
+        self._write_index_meta(collection, shard, physical=physical, version=version)
+        if old != index_name and not keep_old:
+            self.redis.execute_command("FT.DROPINDEX", old)
+        
+        logger.info(f"{index_name} now serves {physical} ({new_docs} documents, was {old} with {old_docs})")
+        return {"index": index_name, "old": old, "new": physical, "old_docs": old_docs, "new_docs": new_docs}
+    
+    def rebuild_collection(self, collection: str, **kwargs) -> List[Dict[str, Any]]:
+        """rebuild_index for the collection's base index and each of its shards"""
+        return [self.rebuild_index(collection, shard, **kwargs) for shard in (None, *self.shards(collection))]
+    
+    def _wait_for_indexing(self, index_name: str, timeout: float, poll_interval: float = 1.0):
+        """Block until a new index has finished its background scan of existing keys"""
+        deadline = time.time() + timeout
+        while True:
+            info = self._ft_info(index_name)
+            if not int(info.get("indexing", 0)):
+                return
+            if time.time() > deadline:
+                raise TimeoutError(
+                    f"{index_name} still indexing after {timeout}s "
+                    f"({float(info.get('percent_indexed', 0)):.0%} done)"
+                )
+            time.sleep(poll_interval)
+    
+    def migrate_vector_type(
+        self,
+        collection: str,
+        target_type: str,
+        batch_size: int = 500,
+        timeout: float = 3600
+    ) -> Dict[str, int]:
+        """
+        Re-encode a collection's stored vectors to `target_type` without
+        downtime.
+        
+        The converted vectors go to a new hash field (embedding_v2, ...)
+        indexed with the target TYPE by the next version of each of the
+        collection's indexes, while the current indexes keep serving and
+        ingest writes both fields. Once every document is converted and
+        indexed, the aliases swap in one transaction, then the old indexes
+        and vector field are dropped. State lives in `rag:migrate:{index}`,
+        so an interrupted run resumes when repeated: documents that already
+        have the new field are skipped.
+        
+        Returns:
+            Counts of migrated and skipped documents
+        
+        Raises:
+            ValueError: A re-embed of the collection is in progress, or a
+                migration to another type is
+            RuntimeError: A new index came up short (the old ones keep
+                serving; run the migration again)
+            TimeoutError: Indexing didn't finish within `timeout` seconds
+        """
+        VectorCodec.check_type(target_type)
+        status = self.redis.hget(self._reembed_key(collection), "status")
+        if status in (b"running", b"ready"):
+            raise ValueError(
+                f"A re-embed of {collection} is {status.decode()}; finish it (cutover) before migrating vectors"
+            )
+        
+        key = self._migrate_key(collection)
+        state = {k.decode(): v.decode() for k, v in self.redis.hgetall(key).items()}
+        if state.get("status") == "cutover":
+            # Interrupted after the swap: only the cleanup is left
+            self._finish_type_migration(collection, state)
+            state = {}
+        if state.get("status") == "running":
+            if state["type"] != target_type:
+                raise ValueError(f"A migration of {collection} to {state['type']} is in progress; run it to the end first")
+            logger.info(f"Resuming migration of {collection} to {target_type} in field {state['field']}")
+        elif self.vector_types[collection] == target_type:
+            logger.info(f"{collection} already stores {target_type} vectors")
+            return {"migrated": 0, "skipped": 0}
+        else:
+            state = self._start_type_migration(collection, target_type)
+        
+        old_field, field = state["old_field"], state["field"]
+        set_if_exists = self.redis.register_script(self.SET_IF_EXISTS)
+        migrated = skipped = 0
+        prefixes = [self._key_prefix(collection, shard) for shard in (None, *self.shards(collection))]
+        for keys in (batch for prefix in prefixes for batch in self._scan_keys(prefix, batch_size)):
+            read = self.redis.pipeline(transaction=False)
+            for doc_key in keys:
+                read.hmget(doc_key, old_field, f"{old_field}_type", f"{old_field}_scale", field)
+            
+            write = self.redis.pipeline(transaction=False)
+            for doc_key, (blob, stored_type, scale, converted) in zip(keys, read.execute()):
+                if blob is None or converted is not None:
+                    skipped += 1
+                    continue
+                vector = VectorCodec.decode(blob, stored_type.decode() if stored_type else "FLOAT32", float(scale) if scale else None)
+                fields = self.vector_hash_fields(field, vector, target_type)
+                set_if_exists(keys=[doc_key], args=[x for item in fields.items() for x in item], client=write)
+                migrated += 1
+            write.execute()
+        
+        indexes = {shard or None: physical for shard, physical in json.loads(state["indexes"]).items()}
+        old = {shard: self._physical_index(collection, shard) for shard in indexes}
+        for shard, physical in indexes.items():
+            self._wait_for_indexing(physical, timeout)
+            old_docs, new_docs = self._num_docs(old[shard]), self._num_docs(physical)
+            if new_docs < old_docs:
+                raise RuntimeError(f"{physical} indexed {new_docs} documents but {old[shard]} has {old_docs}")
+        
+        pipe = self.redis.pipeline(transaction=True)
+        for shard, physical in indexes.items():
+            index_name = self._index_name(collection, shard)
+            if old[shard] == index_name:
+                # Pre-alias index: free its name for the alias in the same transaction
+                pipe.execute_command("FT.DROPINDEX", index_name)
+                pipe.execute_command("FT.ALIASADD", index_name, physical)
+            else:
+                pipe.execute_command("FT.ALIASUPDATE", index_name, physical)
+            pipe.hset(f"{self.INDEX_META_PREFIX}{index_name}", mapping={
+                "physical": physical,
+                "version": int(physical.rsplit("@v", 1)[1]),
+                "type": target_type,
+                "vector_field": field
+            })
+            pipe.incr(SearchResultCache.generation_key(index_name))
+        pipe.hset(key, mapping={
+            "status": "cutover",
+            "old_indexes": json.dumps({shard or "": physical for shard, physical in old.items()})
+        })
+        pipe.incr(self.LAYOUT_KEY)
+        pipe.execute()
+        self.refresh_layout(force=True)
+        logger.info(f"{collection} now serves {target_type} vectors from {field}")
+        
+        self._finish_type_migration(collection, {k.decode(): v.decode() for k, v in self.redis.hgetall(key).items()})
+        logger.info(f"Migrated {self._index_name(collection)} to {target_type}: {migrated} re-encoded, {skipped} skipped")
+        return {"migrated": migrated, "skipped": skipped}
+    
+    def _start_type_migration(self, collection: str, target_type: str) -> Dict[str, str]:
+        """Create the target indexes and turn on dual-writes of the re-encoded vector"""
+        field = self._next_vector_field(collection)
+        indexes = {}
+        for shard in (None, *self.shards(collection)):
+            physical = f"{self._index_name(collection, shard)}@v{self._index_version(collection, shard) + 1}"
+            try:
+                # Left over from an aborted start
+                self.redis.execute_command("FT.DROPINDEX", physical)
+            except redis.ResponseError:
+                pass
+            self._ft_create(
+                physical, collection, shard, self.index_params[collection],
+                vector_field=field, vector_type=target_type
+            )
+            indexes[shard or ""] = physical
+        
+        state = {
+            "status": "running",
+            "type": target_type,
+            "field": field,
+            "old_field": self.vector_fields[collection],
+            "indexes": json.dumps(indexes),
+            "prefixes": json.dumps([self._key_prefix(collection, shard) for shard in (None, *self.shards(collection))]),
+            "started_at": str(int(time.time()))
+        }
+        self.redis.delete(self._migrate_key(collection))
+        self.redis.hset(self._migrate_key(collection), mapping=state)
+        self.redis.incr(self.LAYOUT_KEY)
+        
+        # Let every process pick up the migration (and start dual-writing)
+        # before the scan, so no update slips in behind it
+        time.sleep(2 * Config.LAYOUT_CHECK_INTERVAL)
+        logger.info(f"Started migration of {collection} to {target_type} in field {field} ({indexes})")
+        return state
+    
+    def _finish_type_migration(self, collection: str, state: Dict[str, str]):
+        """Drop the indexes and vector field that served before the swap"""
+        for shard, physical in json.loads(state["old_indexes"]).items():
+            if physical != self._index_name(collection, shard or None):
+                try:
+                    self.redis.execute_command("FT.DROPINDEX", physical)
+                except redis.ResponseError:
+                    pass
+        self._drop_vector_field(state["old_field"], json.loads(state["prefixes"]))
+        self.redis.hset(self._migrate_key(collection), mapping={"status": "done", "finished_at": int(time.time())})
+    
+    def _drop_vector_field(self, field: str, prefixes: List[str]):
+        """Delete a vector that no index reads anymore from every document"""
+        for prefix in prefixes:
+            for keys in self._scan_keys(prefix):
+                pipe = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hdel(key, field, f"{field}_type", f"{field}_scale")
+                pipe.execute()
+    
+    def _scan_keys(self, prefix: str, batch_size: int = 500):
+        """Yield lists of keys under a prefix using SCAN (never KEYS)"""
+        batch = []
+        for key in self.redis.scan_iter(match=f"{prefix}*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def dimension_for(self, collection_name: str) -> int:
+        """Vector dimension used by a collection's index"""
+        self.refresh_layout()
+        return self.dimensions[self.COLLECTION_ALIASES[collection_name]]
+    
+    def _write_index_meta(
+        self,
+        collection: str,
+        shard: Optional[str] = None,
+        physical: Optional[str] = None,
+        version: Optional[int] = None
+    ):
+        versioned = {"physical": physical, "version": version} if physical else {}
+        self.redis.hset(f"{self.INDEX_META_PREFIX}{self._index_name(collection, shard)}", mapping={
+            **versioned,
+            "dim": self.dimensions[collection],
+            "vector_field": self.vector_fields[collection],
+            "type": self.vector_types[collection],
+            "index_params": json.dumps(self.index_params[collection]),
+            "derived_fields": 1,
+            "provider": self.embeddings.provider_id,
+            "model": self.embeddings.model_id
+        })
+    
+    def _check_dimension(self, collection: str, vector: List[float]):
+        """Reject vectors whose size doesn't match the collection's index"""
+        if len(vector) != self.dimensions[collection]:
+            raise ValueError(
+                f"Embedding has {len(vector)} dimensions but collection '{collection}' "
+                f"expects {self.dimensions[collection]}"
+            )
+    
+    def add_document(
         self,
         collection_name: str,
         doc_id: str,
         content: str,
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        embedding: Optional[List[float]] = None
     ) -> str:
-        """Add a document to a collection"""
+        """Add a document to a collection (pass `embedding` if already computed)"""
+        collection = self.COLLECTION_ALIASES.get(collection_name, "kb")
+        
+        # Generate embedding
+        if embedding is None:
+            embedding = self.embeddings.embed(content, self.dimensions[collection])
+        
+        result = self.add_documents([{
+            "collection_name": collection_name,
+            "doc_id": doc_id,
+            "content": content,
+            "metadata": metadata,
+            "embedding": embedding
+        }])[0]
+        if not result["success"]:
+            raise ValueError(result["error"])
+        
+        logger.info(f"Added document {doc_id} to {collection_name} as {result['embedding_id']}")
+        return result["embedding_id"]
+    
+    def add_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        batch_size: int = None,
+        replace: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Write many pre-embedded documents with pipelined MULTI/EXEC batches.
+        
+        Each batch is one round trip; a document's hash fields and TTL are
+        written together, so a key never exists without its expiry.
+        
+        Documents are grouped by source (parent_id for upload chunks,
+        otherwise doc_id). A source's chunks replace its previous chunks in
+        the same transaction and its fingerprint is recorded, so pass all
+        chunks of a source in one call.
+        
+        Args:
+            documents: Dicts with collection_name, doc_id, content, metadata
+                and embedding (same arguments as add_document)
+            batch_size: Documents per round trip (default Config.WRITE_BATCH_SIZE)
+            replace: False to only write the documents, leaving the rest of
+                their sources in place (single chunks, streamed sources; see
+                finish_source). Their keys are added to the source's chunk
+                list and its fingerprint is cleared.
+            
+        Returns:
+            One dict per input document (same order) with doc_id, success,
+            and either embedding_id or error
+        """
+        batch_size = batch_size or Config.WRITE_BATCH_SIZE
+        results: List[Dict[str, Any]] = [None] * len(documents)
+        self.refresh_layout()
+        next_embeddings = self._next_embeddings(documents)
+        
+        sources: Dict[tuple, List[tuple]] = OrderedDict()
+        for i, doc in enumerate(documents):
+            try:
+                record = self._document_record(**doc, next_embedding=next_embeddings.get(i))
+            except (ValueError, TypeError) as e:
+                results[i] = {"doc_id": doc.get("doc_id"), "success": False, "error": str(e)}
+                continue
+            collection = self.COLLECTION_ALIASES.get(doc["collection_name"], "kb")
+            source = (collection, self.source_id(doc["doc_id"], doc["metadata"]))
+            sources.setdefault(source, []).append((i, doc, *record))
+        
+        batch: List[tuple] = []
+        batch_docs = 0
+        for source, records in sources.items():
+            batch.append((source, records))
+            batch_docs += len(records)
+            if batch_docs >= batch_size:
+                self._write_sources(batch, results, replace)
+                batch, batch_docs = [], 0
+        if batch:
+            self._write_sources(batch, results, replace)
+        
+        return results
+    
+    def _next_embeddings(self, documents: List[Dict[str, Any]]) -> Dict[int, List[float]]:
+        """
+        Dual-write support: documents of collections with a running re-embed
+        job are also embedded at the job's target dimension (one batch per
+        collection). Failed items are left out, so their write fails. A
+        vector type migration stores the same vector again.
+        """
+        vectors: Dict[int, List[float]] = {}
+        for collection, target in self.reembed_targets.items():
+            positions = [
+                i for i, doc in enumerate(documents)
+                if self.COLLECTION_ALIASES.get(doc["collection_name"], "kb") == collection
+            ]
+            if not positions:
+                continue
+            if "type" in target:
+                vectors.update({i: documents[i]["embedding"] for i in positions if documents[i].get("embedding")})
+                continue
+            batch = self.embeddings.embed_batch([documents[i]["content"] for i in positions], target["dim"])
+            vectors.update({i: v for i, v in zip(positions, batch.embeddings) if v is not None})
+        return vectors
+    
+    def _write_sources(self, batch: List[tuple], results: List[Dict[str, Any]], replace: bool = True):
+        """
+        Replace the chunks of each source in `batch` in one MULTI/EXEC. A
+        source whose previous chunks couldn't be looked up is only written:
+        nothing is deleted and its chunk list is left for the next ingest.
+        """
+        previous = self._previous_keys({
+            source: [doc["doc_id"] for _, doc, _, _, _ in records] for source, records in batch
+        })
         
-        # Get prefix for collection
-        prefix_map = {
-            "kb": "kb:", Config.COLLECTION_KB: "kb:",
-            "ticket": "tickets:", Config.COLLECTION_TICKETS: "tickets:",
-            "sop": "sop:", Config.COLLECTION_SOP: "sop:"
+        pipe = self.redis.pipeline(transaction=True)
+        # Invalidate cached search results of every index written to (all
+        # shards: a document that changed partition leaves its old shard)
+        touched = {
+            index_name
+            for collection in {collection for (collection, _), _ in batch}
+            for index_name in self._index_names(collection)
         }
-        prefix = prefix_map.get(collection_name, "kb:")
+        for index_name in touched:
+            pipe.incr(SearchResultCache.generation_key(index_name))
+        commands = []
+        for source, records in batch:
+            collection, source_id = source
+            ttl = self.COLLECTIONS[collection]["ttl"]
+            keys = [key for _, _, key, _, _ in records]
+            count = 0
+            
+            stale = previous[source] - set(keys) if replace and previous[source] is not None else None
+            if stale:
+                pipe.delete(*stale)
+                count += 1
+            for _, _, key, fields, _ in records:
+                pipe.hset(key, mapping=fields)
+                count += 1
+                if ttl:
+                    pipe.expire(key, ttl)
+                    count += 1
+            if previous[source] is None:
+                commands.append(count)
+                continue
+            
+            source_key = self._source_key(collection, source_id)
+            if replace:
+                chunks = [(doc["doc_id"], doc["content"], doc["metadata"]) for _, doc, _, _, _ in records]
+                pipe.delete(source_key)
+                pipe.hset(source_key, mapping={
+                    "fp": self.fingerprint(collection, chunks),
+                    "keys": json.dumps(keys)
+                })
+            else:
+                # Part of the source changed: the stored fingerprint no longer describes it
+                pipe.hdel(source_key, "fp")
+                pipe.hset(source_key, "keys", json.dumps(sorted(previous[source] | set(keys))))
+            count += 2
+            if ttl:
+                pipe.expire(source_key, ttl)
+                count += 1
+            commands.append(count)
         
-        # Generate embedding
-        embedding = self.embeddings.embed(content)
+        try:
+            replies = iter(pipe.execute(raise_on_error=False)[len(touched):])
+        except redis.RedisError as e:
+            replies = iter([e] * sum(commands))
+        
+        for (source, records), count in zip(batch, commands):
+            error = next((r for r in (next(replies) for _ in range(count)) if isinstance(r, Exception)), None)
+            for i, doc, key, _, _ in records:
+                results[i] = {"doc_id": doc["doc_id"], "success": error is None}
+                if error is not None:
+                    results[i]["error"] = str(error)
+                else:
+                    results[i]["embedding_id"] = key.rsplit(":", 1)[-1]
+    
+    def _previous_keys(self, sources: Dict[tuple, List[str]]) -> Dict[tuple, Optional[set]]:
+        """
+        Keys currently stored for each source.
+        
+        Read from the source's chunk list; sources ingested before
+        fingerprinting have none, so their keys are looked up by the source
+        id and the incoming doc_ids (all pages of the search). None when
+        that lookup fails, so callers don't mistake it for a new source.
+        
+        Args:
+            sources: (collection, source_id) -> doc_ids being written
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for collection, source_id in sources:
+            pipe.hget(self._source_key(collection, source_id), "keys")
+        
+        previous = {}
+        unknown = []
+        for source, keys in zip(sources, pipe.execute()):
+            if keys is None:
+                unknown.append(source)
+            else:
+                previous[source] = set(json.loads(keys))
+        
+        if unknown:
+            def search_args(source: tuple, offset: int) -> list:
+                collection, source_id = source
+                doc_ids = {source_id, *sources[source]}
+                return [
+                    "FT.SEARCH", self._index_name(collection),
+                    "@doc_id:{" + "|".join(self.escape_tag(d) for d in sorted(doc_ids)) + "}",
+                    "NOCONTENT", "LIMIT", str(offset), str(self.LEGACY_LOOKUP_PAGE)
+                ]
+            
+            pipe = self.redis.pipeline(transaction=False)
+            for source in unknown:
+                pipe.execute_command(*search_args(source, 0))
+            for source, reply in zip(unknown, pipe.execute(raise_on_error=False)):
+                try:
+                    if isinstance(reply, Exception):
+                        raise reply
+                    keys = {k.decode() if isinstance(k, bytes) else k for k in reply[1:]}
+                    # Sources with more chunks than one page: fetch the rest
+                    while len(reply) > 1 and len(keys) < reply[0]:
+                        reply = self.redis.execute_command(*search_args(source, len(keys)))
+                        keys.update(k.decode() if isinstance(k, bytes) else k for k in reply[1:])
+                    previous[source] = keys
+                except redis.RedisError as e:
+                    logger.warning(f"Previous chunks of {source[1]} in {source[0]} unknown, not replacing them: {e}")
+                    previous[source] = None
+        
+        return previous
+    
+    def document_key(self, collection_name: str, doc_id: str, metadata: Dict[str, Any]) -> str:
+        """Key a document is stored under (shard chosen from its metadata)"""
+        collection = self.COLLECTION_ALIASES.get(collection_name, "kb")
+        return self._document_key(collection, doc_id, self.shard_for(collection, metadata))
+    
+    def unchanged_documents(self, documents: List[Dict[str, Any]]) -> set:
+        """
+        Positions of documents already stored with identical content (one
+        pipelined round trip). Keys are deterministic and stored vectors
+        always match the index layout, so these need no embedding or write.
+        
+        Args:
+            documents: Dicts with collection_name, doc_id, content, metadata
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for doc in documents:
+            pipe.hget(self.document_key(doc["collection_name"], doc["doc_id"], doc["metadata"]), "content")
+        
+        return {
+            i for i, (doc, stored) in enumerate(zip(documents, pipe.execute()))
+            if stored is not None and stored.decode(errors="ignore") == doc["content"]
+        }
+    
+    def finish_source(self, collection_name: str, source_id: str, doc_ids: List[str], keys: List[str]) -> int:
+        """
+        Complete a source written piecewise with add_documents(replace=False):
+        delete chunks of its previous version that weren't rewritten and
+        record its chunk list. No fingerprint is stored, since streamed
+        sources are compared chunk by chunk (unchanged_documents).
+        
+        Returns:
+            Number of stale chunks deleted
+        """
+        collection = self.COLLECTION_ALIASES.get(collection_name, "kb")
+        source = (collection, source_id)
+        previous = self._previous_keys({source: doc_ids})[source]
+        if previous is None:
+            return 0
+        stale = previous - set(keys)
+        ttl = self.COLLECTIONS[collection]["ttl"]
+        source_key = self._source_key(collection, source_id)
+        
+        pipe = self.redis.pipeline(transaction=True)
+        if stale:
+            pipe.delete(*stale)
+            for index_name in self._index_names(collection):
+                pipe.incr(SearchResultCache.generation_key(index_name))
+        pipe.delete(source_key)
+        pipe.hset(source_key, "keys", json.dumps(keys))
+        if ttl:
+            pipe.expire(source_key, ttl)
+        pipe.execute()
+        return len(stale)
+    
+    def _derived_fields(self, collection: str, doc_id: str, content: str, metadata: Dict[str, Any]) -> Dict[str, str]:
+        """Fields precomputed at ingest so searches never need to return full content"""
+        fields = {"summary": self.summarize(content)}
+        if collection == "ticket":
+            resolution = metadata.get("resolution")
+            if not resolution:
+                match = self.RESOLUTION_SECTION.search(content)
+                resolution = match.group(1) if match else ""
+            fields["incident_number"] = metadata.get("incident_number") or doc_id
+            fields["resolution"] = self.summarize(resolution)
+        return fields
+    
+    @staticmethod
+    def hash_value(value: Any) -> Any:
+        """A metadata value Redis can store in a hash field"""
+        if value is None:
+            return ""
+        if isinstance(value, (str, bytes)) or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+            return value
+        return json.dumps(value, default=str)
+    
+    @staticmethod
+    def summarize(text: str, limit: int = None) -> str:
+        """Whitespace-collapsed prefix of `text`, cut at a word boundary"""
+        limit = limit or Config.SUMMARY_CHARS
+        text = " ".join(text.split())
+        if len(text) <= limit:
+            return text
+        return text[:limit].rsplit(" ", 1)[0] + "..."
+    
+    def backfill_derived_fields(self, collection: str, batch_size: int = 500) -> int:
+        """Add summary (and ticket resolution) fields to documents ingested before they existed"""
+        updated = 0
+        for keys in self._scan_keys(self._key_prefix(collection), batch_size):
+            read = self.redis.pipeline(transaction=False)
+            for key in keys:
+                read.hmget(key, "summary", "content", "doc_id", "incident_number", "resolution")
+            
+            write = self.redis.pipeline(transaction=False)
+            for key, (summary, content, doc_id, incident_number, resolution) in zip(keys, read.execute()):
+                if summary is not None or content is None:
+                    continue
+                metadata = {
+                    "incident_number": (incident_number or b"").decode(),
+                    "resolution": (resolution or b"").decode()
+                }
+                write.hset(key, mapping=self._derived_fields(
+                    collection, (doc_id or b"").decode(), content.decode(errors="ignore"), metadata
+                ))
+                updated += 1
+            write.execute()
+        
+        if updated:
+            self.redis.incr(SearchResultCache.generation_key(self._index_name(collection)))
+        return updated
+    
+    def _document_record(
+        self,
+        collection_name: str,
+        doc_id: str,
+        content: str,
+        metadata: Dict[str, Any],
+        embedding: List[float],
+        next_embedding: Optional[List[float]] = None
+    ) -> tuple:
+        """
+        Key, hash fields and TTL for one document. While the collection is
+        being re-embedded, `next_embedding` (at the target dimension) is
+        stored in the job's vector field as well (in the target type while
+        its vector type is migrated).
+        """
+        collection = self.COLLECTION_ALIASES.get(collection_name, "kb")
+        
+        if embedding is None:
+            raise ValueError(f"No embedding for document {doc_id}")
+        self._check_dimension(collection, embedding)
         
-        # Generate unique key
-        embed_id = hashlib.md5(f"{doc_id}:{content[:100]}".encode()).hexdigest()
-        key = f"{prefix}{embed_id}"
+        shard = self.shard_for(collection, metadata)
+        key = self._document_key(collection, doc_id, shard)
         
         # Store in Redis as hash with vector field
-        import struct
-        embedding_bytes = struct.pack(f'{len(embedding)}f', *embedding)
+        vector_type = self.vector_types[collection]
         
-        self.redis.hset(key, mapping={
+        fields = {
             "content": content,
             "doc_id": doc_id,
-            "title": metadata.get("title", ""),
-            "category": metadata.get("category", ""),
-            "kb_number": metadata.get("kb_number", ""),
-            "sys_id": metadata.get("sys_id", ""),
+            **{f: metadata.get(f) or "" for f in self.STORED_METADATA_FIELDS},
+            **self._derived_fields(collection, doc_id, content, metadata),
             "created_at": int(time.time()),
-            "embedding": embedding_bytes
-        })
-        
-        # Set TTL (90 days for tickets, no expiry for KB/SOP)
-        if "tickets" in prefix:
-            self.redis.expire(key, 86400 * 90)
+            **self.vector_hash_fields(self.vector_fields[collection], embedding, vector_type)
+        }
+        target = self.reembed_targets.get(collection)
+        if target:
+            if next_embedding is None or len(next_embedding) != target["dim"]:
+                raise ValueError(f"No {target['dim']}-dim embedding for document {doc_id} (re-embed in progress)")
+            fields.update(self.vector_hash_fields(target["field"], next_embedding, target.get("type", vector_type)))
+        if shard:
+            fields.setdefault(self.shard_specs[collection][0], shard)
         
-        logger.info(f"Added document {doc_id} to {collection_name} as {key}")
-        return embed_id
+        # TTL (90 days for tickets, no expiry for KB/SOP)
+        return key, fields, self.COLLECTIONS[collection]["ttl"]
     
     def search_similar(
         self,
         collection_name: str,
         query: str,
-        top_k: int = None
+        top_k: int = None,
+        ef_runtime: int = None,
+        filters: Optional[SearchFilters] = None,
+        mode: str = "vector",
+        collapse: Optional[bool] = None,
+        mmr: Optional[bool] = None
     ) -> List[Dict]:
-        """Search for similar documents using Redis vector search"""
-        
-        index_name = self.collections.get(collection_name)
-        if not index_name:
-            raise ValueError(f"Unknown collection: {collection_name}")
+        """Search for similar documents using Redis vector (or hybrid) search"""
+        return self.search_multi(
+            query, {collection_name: top_k}, ef_runtime, filters, mode, collapse, mmr
+        )[collection_name]
+    
+    def search_multi(
+        self,
+        query: str,
+        top_k_by_collection: Dict[str, int],
+        ef_runtime: int = None,
+        filters: Optional[SearchFilters] = None,
+        mode: str = "vector",
+        collapse: Optional[bool] = None,
+        mmr: Optional[bool] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Search several collections with a single query embedding.
         
-        # Generate query embedding
-        query_embedding = self.embeddings.embed(query)
+        The query is embedded once per distinct index dimension (once in the
+        common case) and the KNN queries are sent to all requested indexes
+        concurrently. Sharded collections fan out to each selected shard and
+        the per-shard results are merged into one top_k.
         
-        import struct
-        query_bytes = struct.pack(f'{len(query_embedding)}f', *query_embedding)
+        Args:
+            query: Query text
+            top_k_by_collection: Collection name -> top_k (None uses the default)
+            ef_runtime: HNSW candidate list size for this query (None uses the
+                index's EF_RUNTIME; ignored for FLAT indexes)
+            filters: Metadata pre-filters applied to every collection
+                (filters.partitions limits sharded collections to those shards)
+            mode: "vector" (KNN) or "hybrid" (KNN + BM25 with rank fusion)
+            collapse: Group chunks of one document into a single result
+                (None uses Config.COLLAPSE_CHUNKS)
+            mmr: Re-rank candidates by maximal marginal relevance within the
+                token budget (None: Config.MMR_ENABLED for MMR_COLLECTIONS)
+            
+        Returns:
+            Collection name -> list of similar documents
+        """
+        plan = self._search_plan(top_k_by_collection, ef_runtime, filters, collapse, mmr)
         
-        k = top_k or Config.TOP_K_RESULTS
+        dims = {step["dim"] for step in plan.values()}
+        vectors = {dim: self.embeddings.embed(query, dim) for dim in dims}
         
-        try:
-            # Execute KNN vector search
-            results = self.redis.execute_command(
-                "FT.SEARCH", index_name,
-                f"*=>[KNN {k} @embedding $vec AS score]",
-                "PARAMS", "2", "vec", query_bytes,
-                "SORTBY", "score",
-                "RETURN", "5", "content", "doc_id", "title", "category", "score",
-                "DIALECT", "2"
+        futures = {
+            name: [
+                self._search_pool.submit(self._search_collection, shard_step, vectors[step["dim"]], query, mode)
+                for shard_step in self._shard_steps(step)
+            ]
+            for name, step in plan.items()
+        }
+        return {
+            name: self._merge_shards(
+                [future.result() for future in shard_futures], plan[name], vectors[plan[name]["dim"]]
             )
-            
-            # Parse results
-            similar_docs = []
-            if results and len(results) > 1:
-                # Results format: [count, key1, [field, value, ...], key2, ...]
-                i = 1
-                while i < len(results):
-                    if i + 1 < len(results):
-                        fields = results[i + 1]
-                        doc = {}
-                        score = 0
-                        
-                        for j in range(0, len(fields), 2):
-                            field_name = fields[j].decode() if isinstance(fields[j], bytes) else fields[j]
-                            field_val = fields[j + 1].decode() if isinstance(fields[j + 1], bytes) else fields[j + 1]
-                            
-                            if field_name == "score":
-                                # Redis returns distance, convert to similarity (1 - distance for cosine)
-                                score = 1 - float(field_val)
-                            else:
-                                doc[field_name] = field_val
-                        
-                        if score >= Config.SIMILARITY_THRESHOLD:
-                            similar_docs.append({
-                                "content": doc.get("content", ""),
-                                "metadata": {
-                                    "doc_id": doc.get("doc_id", ""),
-                                    "title": doc.get("title", ""),
-                                    "category": doc.get("category", ""),
-                                    "number": doc.get("doc_id", ""),
-                                    "short_description": doc.get("title", "")
-                                },
-                                "score": score
-                            })
-                    i += 2
-            
-            return similar_docs
-            
-        except redis.ResponseError as e:
-            logger.error(f"Vector search failed: {e}")
-            return []
+            for name, shard_futures in futures.items()
+        }
     
-    def get_collection_stats(self) -> Dict[str, int]:
-        """Get document counts for each collection"""
-        stats = {}
-        for index_name in set(self.collections.values()):
-            try:
-                info = self.redis.execute_command("FT.INFO", index_name)
-                # Parse info response for num_docs
-                for i, v in enumerate(info):
-                    if isinstance(v, bytes) and v.decode() == "num_docs":
-                        stats[index_name] = int(info[i + 1])
-                        break
-            except:
-                stats[index_name] = 0
-        return stats
+    async def asearch_similar(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = None,
+        ef_runtime: int = None,
+        filters: Optional[SearchFilters] = None,
+        mode: str = "vector",
+        collapse: Optional[bool] = None,
+        mmr: Optional[bool] = None
+    ) -> List[Dict]:
+        """Async variant of search_similar"""
+        return (await self.asearch_multi(
+            query, {collection_name: top_k}, ef_runtime, filters, mode, collapse, mmr
+        ))[collection_name]
     
-    def _get_collection(self, name: str):
-        """Get collection index name (for compatibility)"""
-        if name not in self.collections:
-            raise ValueError(f"Unknown collection: {name}")
-        return self.collections[name]
+    async def asearch_multi(
+        self,
+        query: str,
+        top_k_by_collection: Dict[str, int],
+        ef_runtime: int = None,
+        filters: Optional[SearchFilters] = None,
+        mode: str = "vector",
+        collapse: Optional[bool] = None,
+        mmr: Optional[bool] = None
+    ) -> Dict[str, List[Dict]]:
+        """Async variant of search_multi (one embedding, concurrent KNN queries)"""
+        plan = self._search_plan(top_k_by_collection, ef_runtime, filters, collapse, mmr)
+        
+        dims = list({step["dim"] for step in plan.values()})
+        vectors = dict(zip(dims, await asyncio.gather(*(self.embeddings.aembed(query, dim) for dim in dims))))
+        
+        tasks = [
+            (name, shard_step)
+            for name, step in plan.items()
+            for shard_step in self._shard_steps(step)
+        ]
+        results = await asyncio.gather(*(
+            blocking_io.run(self._search_collection, shard_step, vectors[shard_step["dim"]], query, mode)
+            for _, shard_step in tasks
+        ))
+        
+        by_collection: Dict[str, List[List[Dict]]] = {name: [] for name in plan}
+        for (name, _), shard_results in zip(tasks, results):
+            by_collection[name].append(shard_results)
+        return {
+            name: self._merge_shards(parts, plan[name], vectors[plan[name]["dim"]])
+            for name, parts in by_collection.items()
+        }
+    
+    def _search_plan(
+        self,
+        top_k_by_collection: Dict[str, int],
+        ef_runtime: int = None,
+        filters: Optional[SearchFilters] = None,
+        collapse: Optional[bool] = None,
+        mmr: Optional[bool] = None
+    ) -> Dict[str, Dict]:
+        """Collection name -> index names, vector dimension, vector type, k, EF_RUNTIME, pre-filter, RETURN fields, collapse, MMR"""
+        self.refresh_layout()
+        prefilter = self.filter_query(filters)
+        partitions = {p.strip().lower() for p in filters.partitions} if filters and filters.partitions else None
+        collapse = Config.COLLAPSE_CHUNKS if collapse is None else collapse
+        plan = {}
+        for name, top_k in top_k_by_collection.items():
+            index_name = self._get_collection(name)
+            collection = self.COLLECTION_ALIASES[name]
+            k = top_k or Config.TOP_K_RESULTS
+            hnsw = self.index_params[collection]["ALGORITHM"] == "HNSW"
+            plan[name] = {
+                "index": index_name,
+                "indexes": self._search_indexes(collection, partitions),
+                "dim": self.dimension_for(name),
+                "type": self.vector_types[collection],
+                "k": k,
+                # EF_RUNTIME below k cannot return k neighbours
+                "ef_runtime": max(ef_runtime, k) if ef_runtime and hnsw else None,
+                "prefilter": prefilter,
+                "fields": self.COLLECTIONS[collection]["return"],
+                "vector_field": self.vector_fields[collection],
+                "collapse": collapse and "parent_id" in self.COLLECTIONS[collection]["return"],
+                "mmr": (Config.MMR_ENABLED and collection in Config.MMR_COLLECTIONS) if mmr is None else mmr
+            }
+        return plan
+    
+    def _search_indexes(self, collection: str, partitions: Optional[set] = None) -> List[str]:
+        """
+        Indexes a search on `collection` touches: every shard plus the base
+        index, or only the requested shards. Partitions that aren't shards
+        live in the base index.
+        """
+        shards = self.shards(collection)
+        if not partitions:
+            return self._index_names(collection)
+        selected = [self._index_name(collection, s) for s in shards if s in partitions]
+        if not shards or partitions - set(shards):
+            selected.insert(0, self._index_name(collection))
+        return selected
+    
+    @staticmethod
+    def _shard_steps(step: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        One search step per index of a (possibly sharded) collection. With
+        MMR over several shards, each shard only returns its candidates
+        (with vectors) and the selection runs once over all of them.
+        """
+        mmr_candidates = step["mmr"] and len(step["indexes"]) > 1
+        return [
+            {**step, "index": index_name, "mmr_candidates": mmr_candidates}
+            for index_name in step["indexes"]
+        ]
+    
+    @classmethod
+    def _merge_shards(
+        cls,
+        shard_results: List[List[Dict]],
+        step: Dict[str, Any],
+        query_vector: List[float]
+    ) -> List[Dict]:
+        """
+        Merge per-shard results into the collection's top_k, best first. In
+        hybrid mode each shard's list is a ranking of its own (RRF scores
+        aren't comparable across shards), so the lists are fused again with
+        RRF and `rrf_score` is the cross-shard value; otherwise hits are
+        merged on cosine similarity. With MMR, top_k is selected from the
+        union of all shards' candidates, within the token budget, so
+        near-duplicates on different shards compete.
+        """
+        if len(shard_results) == 1:
+            return shard_results[0]
+        hits = [hit for hits in shard_results for hit in hits]
+        if step["mmr"]:
+            merged = cls._mmr_select(hits, query_vector, step["k"], Config.MMR_LAMBDA, Config.MMR_TOKEN_BUDGET)
+            for hit in merged:
+                hit.pop("_embedding", None)
+            return merged
+        if not any("rrf_score" in hit for hit in hits):
+            return sorted(hits, key=lambda hit: hit["score"], reverse=True)[:step["k"]]
+        # Shards hold disjoint keys, so each hit is in exactly one list;
+        # equal ranks on different shards are ordered by cosine similarity
+        ranked = sorted(
+            ((1 / (Config.RRF_K + rank), hit) for shard_hits in shard_results for rank, hit in enumerate(shard_hits, 1)),
+            key=lambda pair: (pair[0], pair[1]["score"]),
+            reverse=True
+        )[:step["k"]]
+        for rrf, hit in ranked:
+            hit["rrf_score"] = round(rrf, 6)
+        return [hit for _, hit in ranked]
+    
+    @staticmethod
+    def estimate_tokens(hit: Dict) -> int:
+        """Rough token count of a hit's title and content (CHARS_PER_TOKEN chars each)"""
+        return (len(hit["metadata"].get("title", "")) + len(hit["content"])) // Config.CHARS_PER_TOKEN + 1
+    
+    def _search_collection(
+        self,
+        step: Dict[str, Any],
+        query_vector: List[float],
+        query_text: str,
+        mode: str = "vector"
+    ) -> List[Dict]:
+        """
+        Run one collection's search step: KNN, or KNN + BM25 fused with RRF.
+        
+        Served from the result cache when the index hasn't changed since the
+        same search was last run.
+        """
+        query_bytes = VectorCodec.encode(query_vector, step["type"])[0]
+        
+        if step.get("mmr_candidates"):
+            # Candidates keep their vectors for the cross-shard MMR selection
+            # in _merge_shards, so they bypass the cache
+            return self._mmr_candidates(step, query_vector, query_bytes, query_text, mode)
+        
+        cache_key = None
+        if self.result_cache is not None:
+            generation = self.result_cache.generation(step["index"])
+            if generation is not None:
+                cache_key = self.result_cache.key(
+                    generation, step["index"], query_bytes,
+                    k=step["k"], ef_runtime=step["ef_runtime"], prefilter=step["prefilter"],
+                    fields=step["fields"], mode=mode, text=query_text if mode == "hybrid" else None,
+                    collapse=step["collapse"], merge=Config.COLLAPSE_MERGE_ADJACENT,
+                    mmr=(Config.MMR_LAMBDA, Config.MMR_CANDIDATE_FACTOR, Config.MMR_TOKEN_BUDGET) if step["mmr"] else None
+                )
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+        
+        if step["mmr"]:
+            results = self._mmr_search(step, query_vector, query_bytes, query_text, mode)
+        elif step["collapse"]:
+            results = self._collapsed_search(step, query_vector, query_bytes, query_text, mode)
+        else:
+            results = self._run_search(step, query_vector, query_bytes, query_text, mode)
+        
+        # Raw vectors are only needed for re-ranking; never cache or return them
+        for result in results:
+            result.pop("_embedding", None)
+        
+        if cache_key is not None:
+            self.result_cache.put(cache_key, results)
+        return results
+    
+    def _run_search(
+        self,
+        step: Dict[str, Any],
+        query_vector: List[float],
+        query_bytes: bytes,
+        query_text: str,
+        mode: str
+    ) -> List[Dict]:
+        if mode == "hybrid":
+            return self._hybrid_search(step, query_vector, query_bytes, query_text)
+        return self._knn_search(
+            step["index"], query_bytes, step["k"], step["ef_runtime"], step["prefilter"], step["fields"],
+            step["vector_field"]
+        )
+    
+    def _collapsed_search(
+        self,
+        step: Dict[str, Any],
+        query_vector: List[float],
+        query_bytes: bytes,
+        query_text: str,
+        mode: str
+    ) -> List[Dict]:
+        """
+        Search with chunk collapsing: over-fetch top_k * COLLAPSE_OVERFETCH
+        hits, group them by parent document, and fetch more (doubling, up to
+        COLLAPSE_MAX_FETCH) while fewer than top_k distinct documents came
+        back and the index may still hold more matches.
+        """
+        k = step["k"]
+        fetch = min(k * Config.COLLAPSE_OVERFETCH, max(Config.COLLAPSE_MAX_FETCH, k))
+        while True:
+            wider = {**step, "k": fetch, "ef_runtime": max(step["ef_runtime"], fetch) if step["ef_runtime"] else None}
+            hits = self._run_search(wider, query_vector, query_bytes, query_text, mode)
+            documents = self._collapse_chunks(hits, k)
+            if len(documents) >= k or len(hits) < fetch or fetch >= Config.COLLAPSE_MAX_FETCH:
+                return documents
+            fetch = min(fetch * 2, Config.COLLAPSE_MAX_FETCH)
+    
+    @classmethod
+    def _collapse_chunks(cls, hits: List[Dict], k: int) -> List[Dict]:
+        """
+        Keep the best-ranked chunk of each parent document (hits are in rank
+        order), recording how many of its chunks matched. With
+        COLLAPSE_MERGE_ADJACENT, summaries of matching chunks next to the
+        best one are appended in document order.
+        """
+        groups: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        for hit in hits:
+            metadata = hit["metadata"]
+            groups.setdefault(metadata.get("parent_id") or metadata.get("doc_id", ""), []).append(hit)
+        
+        documents = []
+        for chunks in list(groups.values())[:k]:
+            best = dict(chunks[0])
+            best["metadata"] = {**best["metadata"], "chunk_hits": len(chunks)}
+            
+            anchor = cls._chunk_position(chunks[0])
+            if Config.COLLAPSE_MERGE_ADJACENT and len(chunks) > 1 and anchor is not None:
+                neighbours = [
+                    c for c in chunks[1:]
+                    if cls._chunk_position(c) is not None and abs(cls._chunk_position(c) - anchor) == 1
+                ]
+                ordered = sorted([chunks[0], *neighbours], key=cls._chunk_position)
+                best["content"] = " ".join(c["content"] for c in ordered)
+                best["metadata"]["merged_chunks"] = [cls._chunk_position(c) for c in ordered]
+            
+            documents.append(best)
+        return documents
+    
+    def _mmr_search(
+        self,
+        step: Dict[str, Any],
+        query_vector: List[float],
+        query_bytes: bytes,
+        query_text: str,
+        mode: str
+    ) -> List[Dict]:
+        """
+        Fetch top_k * MMR_CANDIDATE_FACTOR candidates together with their
+        stored vectors (one round trip, collapsed if enabled), then pick
+        top_k of them with _mmr_select.
+        """
+        hits = self._mmr_candidates(step, query_vector, query_bytes, query_text, mode)
+        return self._mmr_select(hits, query_vector, step["k"], Config.MMR_LAMBDA, Config.MMR_TOKEN_BUDGET)
+    
+    def _mmr_candidates(
+        self,
+        step: Dict[str, Any],
+        query_vector: List[float],
+        query_bytes: bytes,
+        query_text: str,
+        mode: str
+    ) -> List[Dict]:
+        """MMR candidate hits of one index, with their stored vectors"""
+        candidates = step["k"] * Config.MMR_CANDIDATE_FACTOR
+        wider = {
+            **step,
+            "k": candidates,
+            "ef_runtime": max(step["ef_runtime"], candidates) if step["ef_runtime"] else None,
+            "fields": step["fields"] + tuple(f for f in self.VECTOR_FIELDS if f not in step["fields"])
+        }
+        if step["collapse"]:
+            return self._collapsed_search(wider, query_vector, query_bytes, query_text, mode)
+        return self._run_search(wider, query_vector, query_bytes, query_text, mode)
+    
+    @classmethod
+    def _mmr_select(
+        cls,
+        hits: List[Dict],
+        query_vector: List[float],
+        k: int,
+        lambda_: float = 0.7,
+        token_budget: int = 0
+    ) -> List[Dict]:
+        """
+        Greedy maximal marginal relevance over candidate hits.
+        
+        Each step picks the hit maximising
+        lambda * sim(query, d) - (1 - lambda) * max sim(d, already picked),
+        with all similarities taken from one candidate x candidate matrix
+        product. Hits that would overrun `token_budget` (0 = unlimited) are
+        skipped, so the result may hold fewer than k hits. Each selected hit
+        carries its `mmr_score`.
+        """
+        hits = [h for h in hits if "_embedding" in h]
+        if not hits:
+            return []
+        
+        vectors = np.stack([
+            VectorCodec.decode(blob, vector_type or "FLOAT32", float(scale) if scale else None)
+            for blob, vector_type, scale in (h["_embedding"] for h in hits)
+        ])
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        
+        relevance = vectors @ query
+        similarity = vectors @ vectors.T
+        costs = np.array([cls.estimate_tokens(h) for h in hits])
+        
+        redundancy = np.zeros(len(hits), dtype=np.float32)
+        available = np.ones(len(hits), dtype=bool)
+        remaining = token_budget or np.inf
+        selected = []
+        while len(selected) < k and available.any():
+            scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+            best = int(np.argmax(scores))
+            available[best] = False
+            if costs[best] > remaining:
+                continue
+            remaining -= costs[best]
+            selected.append((best, float(scores[best])))
+            redundancy = np.maximum(redundancy, similarity[:, best])
+        
+        results = []
+        for i, score in selected:
+            result = dict(hits[i])
+            result["mmr_score"] = round(score, 6)
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def _chunk_position(hit: Dict) -> Optional[int]:
+        value = str(hit["metadata"].get("chunk_index", ""))
+        return int(value) if value.isdigit() else None
+    
+    def _knn_search(
+        self,
+        index_name: str,
+        query_bytes: bytes,
+        k: int,
+        ef_runtime: int = None,
+        prefilter: str = "*",
+        fields: tuple = ("doc_id", "title", "category", "summary"),
+        vector_field: str = "embedding"
+    ) -> List[Dict]:
+        """Run a (pre-filtered) KNN query against one index and apply the similarity threshold"""
+        try:
+            results = self.redis.execute_command(
+                *self._knn_args(index_name, query_bytes, k, ef_runtime, prefilter, fields, vector_field)
+            )
+        except redis.ResponseError as e:
+            logger.error(f"Vector search failed on {index_name}: {e}")
+            return []
+        
+        return [
+            self._format_document(doc, score)
+            for doc, score in self._parse_knn(results, fields, vector_field)
+            if score >= Config.SIMILARITY_THRESHOLD
+        ]
+    
+    def _hybrid_search(
+        self,
+        step: Dict[str, Any],
+        query_vector: List[float],
+        query_bytes: bytes,
+        query_text: str
+    ) -> List[Dict]:
+        """
+        BM25 full-text and KNN in one pipelined round trip, merged with
+        reciprocal rank fusion (score = sum of 1 / (RRF_K + rank)).
+        
+        Vector-only hits still have to pass SIMILARITY_THRESHOLD; lexical
+        hits (error codes, KB/INC numbers) are kept regardless. Every result
+        carries its cosine similarity as `score` (computed from the stored
+        vector for text-only hits, 0.0 when the hash has none), plus
+        `rrf_score` and `match`.
+        """
+        k = step["k"]
+        candidates = k * Config.HYBRID_CANDIDATE_FACTOR
+        ef_runtime = max(step["ef_runtime"], candidates) if step["ef_runtime"] else None
+        text_query = self._text_query(query_text, step["prefilter"])
+        
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.execute_command(*self._knn_args(
+            step["index"], query_bytes, candidates, ef_runtime, step["prefilter"], step["fields"],
+            step["vector_field"]
+        ))
+        text_fields = step["fields"] + tuple(f for f in self.VECTOR_FIELDS if f not in step["fields"])
+        if text_query:
+            pipe.execute_command(
+                "FT.SEARCH", step["index"], text_query,
+                "SCORER", "BM25",
+                "LIMIT", "0", str(candidates),
+                "RETURN", str(len(text_fields)), *self._stored_fields(text_fields, step["vector_field"]),
+                "DIALECT", "2"
+            )
+        replies = pipe.execute(raise_on_error=False)
+        for reply in replies:
+            if isinstance(reply, Exception):
+                logger.error(f"Hybrid search leg failed on {step['index']}: {reply}")
+        
+        fused: Dict[str, Dict[str, Any]] = {}
+        if not isinstance(replies[0], Exception):
+            for rank, (doc, score) in enumerate(self._parse_knn(replies[0], step["fields"], step["vector_field"]), 1):
+                entry = fused.setdefault(doc["doc_id"], {"doc": doc, "score": score, "rrf": 0.0, "match": []})
+                entry["rrf"] += 1 / (Config.RRF_K + rank)
+                entry["match"].append("vector")
+        
+        if text_query and not isinstance(replies[1], Exception):
+            query = np.asarray(query_vector, dtype=np.float32)
+            for rank, doc in enumerate(self._parse_reply(replies[1], text_fields, step["vector_field"]), 1):
+                entry = fused.get(doc["doc_id"])
+                if entry is None:
+                    if doc.get("embedding"):
+                        stored = VectorCodec.decode(
+                            doc["embedding"],
+                            doc.get("embedding_type") or "FLOAT32",
+                            float(doc["embedding_scale"]) if doc.get("embedding_scale") else None
+                        )
+                        score = float(stored @ query / (np.linalg.norm(stored) * np.linalg.norm(query) + 1e-12))
+                    else:
+                        # Legacy or partially written hash: still a lexical hit
+                        score = 0.0
+                    entry = fused[doc["doc_id"]] = {"doc": doc, "score": score, "rrf": 0.0, "match": []}
+                entry["rrf"] += 1 / (Config.RRF_K + rank)
+                entry["match"].append("text")
+        
+        results = []
+        for entry in sorted(fused.values(), key=lambda e: e["rrf"], reverse=True):
+            if entry["match"] == ["vector"] and entry["score"] < Config.SIMILARITY_THRESHOLD:
+                continue
+            result = self._format_document(entry["doc"], entry["score"])
+            result["rrf_score"] = round(entry["rrf"], 6)
+            result["match"] = entry["match"]
+            results.append(result)
+            if len(results) == k:
+                break
+        return results
+    
+    def _text_query(self, query_text: str, prefilter: str = "*") -> Optional[str]:
+        """
+        BM25 query matching any query word in content/title, or an exact
+        doc_id for tokens that look like identifiers ("INC0012345",
+        "KB0001234"); None if the text has no usable terms.
+        """
+        words = list(OrderedDict.fromkeys(
+            w for w in self.TEXT_WORD.findall(query_text.lower()) if len(w) > 1
+        ))[:self.MAX_TEXT_TERMS]
+        if not words:
+            return None
+        
+        query = f"@content|title:({'|'.join(words)})"
+        ids = list(OrderedDict.fromkeys(
+            t for t in self.TEXT_TERM.findall(query_text) if any(c.isdigit() for c in t)
+        ))[:self.MAX_TEXT_TERMS]
+        if ids:
+            query = f"({query} | @doc_id:{{{'|'.join(self.escape_tag(t) for t in ids)}}})"
+        return query if prefilter == "*" else f"{prefilter} {query}"
+    
+    @classmethod
+    def _knn_args(
+        cls,
+        index_name: str,
+        query_bytes: bytes,
+        k: int,
+        ef_runtime: int = None,
+        prefilter: str = "*",
+        fields: tuple = ("doc_id", "title", "category", "summary"),
+        vector_field: str = "embedding"
+    ) -> list:
+        """FT.SEARCH arguments for a (pre-filtered) KNN query returning `fields` and score"""
+        if ef_runtime:
+            knn = f"{prefilter}=>[KNN {k} @embedding $vec EF_RUNTIME {int(ef_runtime)} AS score]"
+        else:
+            knn = f"{prefilter}=>[KNN {k} @embedding $vec AS score]"
+        return [
+            "FT.SEARCH", index_name,
+            knn,
+            "PARAMS", "2", "vec", query_bytes,
+            "SORTBY", "score",
+            "LIMIT", "0", str(k),
+            "RETURN", str(len(fields) + 1), *cls._stored_fields(fields, vector_field), "score",
+            "DIALECT", "2"
+        ]
+    
+    @classmethod
+    def _stored_fields(cls, fields: tuple, vector_field: str = "embedding") -> List[str]:
+        """Hash field names for `fields`, with embedding* mapped to the collection's vector field"""
+        return [
+            vector_field + name[len("embedding"):] if name in cls.VECTOR_FIELDS else name
+            for name in fields
+        ]
+    
+    @classmethod
+    def _parse_reply(cls, results, fields: tuple, vector_field: str = "embedding") -> List[Dict[str, Any]]:
+        """
+        FT.SEARCH reply [count, key1, [field, value, ...], key2, ...] -> dicts
+        of the projected `fields` in result order. Only those values are
+        decoded (the raw embedding blob is left as bytes).
+        """
+        names = [(name, stored.encode()) for name, stored in zip(fields, cls._stored_fields(fields, vector_field))]
+        docs = []
+        for raw in results[2::2]:
+            pairs = iter(raw)
+            values = dict(zip(pairs, pairs))
+            docs.append({
+                name: value if name == "embedding" else value.decode()
+                for name, value in ((name, values.get(key)) for name, key in names)
+                if value is not None
+            })
+        return docs
+    
+    def _parse_knn(self, results, fields: tuple, vector_field: str = "embedding") -> List[tuple]:
+        """KNN reply -> (doc, cosine similarity) pairs, best first"""
+        # Redis returns distance, convert to similarity (1 - distance for cosine)
+        return [
+            (doc, 1 - float(doc.pop("score")))
+            for doc in self._parse_reply(results, fields + ("score",), vector_field)
+        ]
+    
+    @classmethod
+    def _format_document(cls, doc: Dict[str, Any], score: float) -> Dict[str, Any]:
+        """
+        Search hit: summary as content, projected fields as metadata. A
+        returned vector is kept as `_embedding` (blob, type, scale) for
+        re-ranking and stripped before results leave _search_collection.
+        """
+        metadata = {k: v for k, v in doc.items() if k != "summary" and k not in cls.VECTOR_FIELDS}
+        metadata.setdefault("title", "")
+        metadata["number"] = doc.get("kb_number") or doc.get("incident_number") or doc.get("doc_id", "")
+        metadata["short_description"] = metadata["title"]
+        result = {
+            "content": doc.get("summary", ""),
+            "metadata": metadata,
+            "score": score
+        }
+        if "embedding" in doc:
+            result["_embedding"] = (doc["embedding"], doc.get("embedding_type"), doc.get("embedding_scale"))
+        return result
+    
+    def record_recent_incident(
+        self,
+        incident_number: str,
+        embedding: List[float],
+        metadata: Dict[str, Any] = None
+    ) -> str:
+        """
+        Add an incident to the rolling dedup index (one round trip).
+        
+        Skips fingerprinting and chunk bookkeeping: entries are single
+        vectors that simply expire after RECENT_INCIDENT_TTL_SECONDS.
+        Caller metadata is flattened to hash-safe strings (nested values as
+        JSON, None as "").
+        """
+        key, fields, ttl = self._document_record(
+            collection_name="recent",
+            doc_id=incident_number,
+            content="",
+            metadata={name: self.hash_value(value) for name, value in (metadata or {}).items()},
+            embedding=embedding
+        )
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, ttl)
+        pipe.incr(SearchResultCache.generation_key(self._index_name("recent")))
+        pipe.execute()
+        return key.rsplit(":", 1)[-1]
+    
+    def find_recent_duplicates(
+        self,
+        embedding: List[float],
+        time_window_minutes: int,
+        threshold: float,
+        exclude_id: Optional[str] = None,
+        limit: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        Best matches in the dedup index within a time window.
+        
+        A FLAT KNN over the pre-filtered window that returns only doc_id and
+        score, so the query stays in single-digit milliseconds.
+        
+        Returns:
+            [{"incident_number", "score"}] with score >= threshold, best first
+        """
+        self._check_dimension("recent", embedding)
+        query_bytes, _ = VectorCodec.encode(embedding, self.vector_types["recent"])
+        prefilter = self.filter_query(SearchFilters(
+            time_window_minutes=time_window_minutes,
+            exclude_ids=[exclude_id] if exclude_id else None
+        ))
+        
+        try:
+            results = self.redis.execute_command(
+                "FT.SEARCH", self._index_name("recent"),
+                f"{prefilter}=>[KNN {limit} @embedding $vec AS score]",
+                "PARAMS", "2", "vec", query_bytes,
+                "SORTBY", "score",
+                "LIMIT", "0", str(limit),
+                "RETURN", "2", "doc_id", "score",
+                "DIALECT", "2"
+            )
+        except redis.ResponseError as e:
+            # Missing or rebuilding index: no duplicates rather than a failed check
+            logger.error(f"Duplicate search failed on {self._index_name('recent')}: {e}")
+            return []
+        
+        matches = []
+        for fields in results[2::2]:
+            doc = dict(zip(fields[::2], fields[1::2]))
+            score = 1 - float(doc[b"score"])
+            if score >= threshold:
+                matches.append({"incident_number": doc[b"doc_id"].decode(), "score": round(score, 4)})
+        return matches
+    
+    def get_collection_stats(self) -> Dict[str, int]:
+        """
+        Get document counts for each collection.
+        
+        Keyed by the provider-neutral index name (idx:kb, idx:tickets, idx:sop)
+        so /health and the admin portal don't depend on the namespace.
+        Sharded collections report the total under their base name plus
+        one entry per shard (idx:tickets.emea).
+        """
+        stats = {}
+        for name, spec in self.COLLECTIONS.items():
+            total = 0
+            for shard in (None, *self.shards(name)):
+                count = self._num_docs(self._index_name(name, shard))
+                total += count
+                if shard:
+                    stats[f"idx:{self._stem(name, shard)}"] = count
+            stats[f"idx:{spec['stem']}"] = total
+        return stats
+    
+    def _num_docs(self, index_name: str) -> int:
+        try:
+            return int(self._ft_info(index_name).get("num_docs", 0))
+        except (redis.RedisError, ValueError):
+            return 0
+    
+    def _ft_info(self, index_name: str) -> Dict[str, Any]:
+        """FT.INFO as a dict (top-level keys decoded, values as returned)"""
+        info = self.redis.execute_command("FT.INFO", index_name)
+        return {
+            (info[i].decode() if isinstance(info[i], bytes) else info[i]): info[i + 1]
+            for i in range(0, len(info) - 1, 2)
+        }
+    
+    def _get_collection(self, name: str):
+        """Get collection index name (for compatibility)"""
+        if name not in self.collections:
+            raise ValueError(f"Unknown collection: {name}")
+        return self.collections[name]
+
+
+# =============================================================================
+# Re-embedding
+# =============================================================================
+
+class ReembedJob:
+    """
+    Resumable background re-embedding of a collection at a new dimension.
+    
+    start() creates the next version of each of the collection's indexes
+    (base and shards) over the same key prefixes, reading the vector from a
+    new hash field (embedding_v2, embedding_v3, ...) as @embedding, and
+    flags the job in Redis so every service process dual-writes that field
+    on ingest. run() walks the keys with SCAN, embeds them in batches under
+    a rate budget and checkpoints the cursor after every batch, so a
+    restarted job resumes where it stopped. cutover() swaps the aliases to
+    the new indexes in one transaction, then removes the old vectors and
+    refreshes source fingerprints so the next sync doesn't re-embed again.
+    
+    State lives in `rag:reembed:{index}`: status (running -> ready -> done),
+    target dim and field, the new physical indexes, SCAN position and
+    cursor, counters and the measured rate (reported on /stats).
+    """
+    
+    def __init__(self, vector_db: VectorDBManager, collection: str):
+        self.vector_db = vector_db
+        self.redis = vector_db.redis
+        self.collection = VectorDBManager.COLLECTION_ALIASES[collection]
+        if self.collection == "recent":
+            raise ValueError("The dedup index expires on its own; recreate it with a new EMBED_DIM_RECENT instead")
+        self.key = vector_db._reembed_key(self.collection)
+        self.failed_key = f"{self.key}:failed"
+        self._set_if_exists = self.redis.register_script(VectorDBManager.SET_IF_EXISTS)
+        self._rate = 0.0
+    
+    def state(self) -> Dict[str, str]:
+        return {k.decode(): v.decode() for k, v in self.redis.hgetall(self.key).items()}
+    
+    def start(self, dim: int) -> Dict[str, str]:
+        """Create the target indexes and turn on dual-writes; a job already in progress is resumed"""
+        state = self.state()
+        if state.get("status") in ("running", "ready"):
+            if int(state["dim"]) != dim:
+                raise ValueError(f"A re-embed of {self.collection} to dim={state['dim']} is in progress")
+            logger.info(f"Resuming re-embed of {self.collection} at {state['processed']} documents")
+            return state
+        
+        db = self.vector_db
+        db.embeddings.check_dimension(dim)
+        if dim == db.dimensions[self.collection]:
+            raise ValueError(f"{self.collection} is already embedded at dim={dim}")
+        if self.redis.hget(db._migrate_key(self.collection), "status") in (b"running", b"cutover"):
+            raise ValueError(f"A vector type migration of {self.collection} is in progress; finish it first")
+        
+        current = db.vector_fields[self.collection]
+        field = db._next_vector_field(self.collection)
+        
+        indexes = {}
+        for shard in (None, *db.shards(self.collection)):
+            physical = f"{db._index_name(self.collection, shard)}@v{db._index_version(self.collection, shard) + 1}"
+            try:
+                # Left over from an aborted start
+                self.redis.execute_command("FT.DROPINDEX", physical)
+            except redis.ResponseError:
+                pass
+            db._ft_create(physical, self.collection, shard, db.index_params[self.collection], dim, field)
+            indexes[shard or ""] = physical
+        
+        self.redis.delete(self.failed_key)
+        self.redis.hset(self.key, mapping={
+            "status": "running",
+            "dim": dim,
+            "field": field,
+            "old_field": current,
+            "old_schema": db.fingerprint_schema(self.collection),
+            "indexes": json.dumps(indexes),
+            "prefixes": json.dumps([db._key_prefix(self.collection, shard) for shard in (None, *db.shards(self.collection))]),
+            "position": 0,
+            "cursor": 0,
+            "processed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "total": sum(db._num_docs(db._index_name(self.collection, s)) for s in (None, *db.shards(self.collection))),
+            "rate": 0,
+            "started_at": int(time.time()),
+            "updated_at": int(time.time())
+        })
+        self.redis.incr(VectorDBManager.LAYOUT_KEY)
+        
+        # Let every process pick up the job (and start dual-writing) before
+        # the scan, so no update slips in behind the cursor
+        time.sleep(2 * Config.LAYOUT_CHECK_INTERVAL)
+        logger.info(f"Started re-embed of {self.collection} to dim={dim} in field {field} ({indexes})")
+        return self.state()
+    
+    def run(self, rate_limit: float = None, batch_size: int = None) -> Dict[str, str]:
+        """
+        SCAN and re-embed until every prefix is done, then mark the job
+        ready. Keeps at most `rate_limit` embeddings per second.
+        """
+        state = self.state()
+        if state.get("status") != "running":
+            return state
+        
+        rate_limit = rate_limit or Config.REEMBED_RATE_LIMIT
+        batch_size = batch_size or Config.REEMBED_BATCH_SIZE
+        prefixes = json.loads(state["prefixes"])
+        position, cursor = int(state["position"]), int(state["cursor"])
+        
+        while position < len(prefixes):
+            started = time.monotonic()
+            cursor, keys = self.redis.scan(cursor, match=f"{prefixes[position]}*", count=batch_size)
+            counts = self._reembed_keys(keys, int(state["dim"]), state["field"])
+            if cursor == 0:
+                position += 1
+            
+            # Never faster than the Bedrock budget allows
+            pause = counts["processed"] / rate_limit - (time.monotonic() - started)
+            if pause > 0:
+                time.sleep(pause)
+            self._checkpoint(position, cursor, counts, time.monotonic() - started)
+        
+        # One more attempt for documents whose embedding failed
+        retry = [key for key in self.redis.smembers(self.failed_key)]
+        if retry:
+            self.redis.delete(self.failed_key)
+            for start in range(0, len(retry), batch_size):
+                started = time.monotonic()
+                counts = self._reembed_keys(retry[start:start + batch_size], int(state["dim"]), state["field"])
+                self._checkpoint(position, 0, {**counts, "failed": 0}, time.monotonic() - started)
+        
+        self.redis.hset(self.key, mapping={"status": "ready", "failed": self.redis.scard(self.failed_key)})
+        state = self.state()
+        logger.info(f"Re-embed of {self.collection} scanned: {state['processed']} embedded, {state['failed']} failed")
+        return state
+    
+    def _reembed_keys(self, keys: list, dim: int, field: str) -> Dict[str, int]:
+        """Embed the content of `keys` that don't have the target vector yet"""
+        read = self.redis.pipeline(transaction=False)
+        for key in keys:
+            read.hmget(key, "content", field)
+        todo = [
+            (key, content.decode(errors="ignore"))
+            for key, (content, existing) in zip(keys, read.execute())
+            if content is not None and existing is None
+        ]
+        counts = {"processed": 0, "skipped": len(keys) - len(todo), "failed": 0}
+        if not todo:
+            return counts
+        
+        vector_type = self.vector_db.vector_types[self.collection]
+        batch = self.vector_db.embeddings.embed_batch([content for _, content in todo], dim)
+        write = self.redis.pipeline(transaction=False)
+        for (key, _), vector in zip(todo, batch.embeddings):
+            if vector is None:
+                write.sadd(self.failed_key, key)
+                counts["failed"] += 1
+                continue
+            fields = VectorDBManager.vector_hash_fields(field, vector, vector_type)
+            self._set_if_exists(keys=[key], args=[x for item in fields.items() for x in item], client=write)
+            counts["processed"] += 1
+        write.execute()
+        return counts
+    
+    def _checkpoint(self, position: int, cursor: int, counts: Dict[str, int], seconds: float):
+        """Persist the SCAN position and counters (one transaction per batch)"""
+        if counts["processed"]:
+            rate = counts["processed"] / max(seconds, 1e-6)
+            self._rate = rate if not self._rate else 0.8 * self._rate + 0.2 * rate
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(self.key, mapping={
+            "position": position,
+            "cursor": cursor,
+            "rate": round(self._rate, 2),
+            "updated_at": int(time.time())
+        })
+        for name, value in counts.items():
+            if value:
+                pipe.hincrby(self.key, name, value)
+        pipe.execute()
+    
+    def cutover(self, force: bool = False, timeout: float = 3600) -> Dict[str, str]:
+        """
+        Point the collection's aliases at the re-embedded indexes (one
+        transaction), then drop the old indexes and vector fields.
+        
+        Raises:
+            RuntimeError: The scan hasn't finished, or documents failed to
+                re-embed (unless `force`)
+        """
+        state = self.state()
+        if state.get("status") != "ready":
+            raise RuntimeError(f"Re-embed of {self.collection} is {state.get('status', 'not started')}, not ready")
+        failed = self.redis.scard(self.failed_key)
+        if failed and not force:
+            raise RuntimeError(f"{failed} documents of {self.collection} failed to re-embed; re-run or force")
+        
+        db = self.vector_db
+        dim, field = int(state["dim"]), state["field"]
+        indexes = {shard or None: physical for shard, physical in json.loads(state["indexes"]).items()}
+        for physical in indexes.values():
+            db._wait_for_indexing(physical, timeout)
+        old = {shard: db._physical_index(self.collection, shard) for shard in indexes}
+        
+        pipe = self.redis.pipeline(transaction=True)
+        for shard, physical in indexes.items():
+            index_name = db._index_name(self.collection, shard)
+            if old[shard] == index_name:
+                # Pre-alias index: free its name for the alias in the same transaction
+                pipe.execute_command("FT.DROPINDEX", index_name)
+                pipe.execute_command("FT.ALIASADD", index_name, physical)
+            else:
+                pipe.execute_command("FT.ALIASUPDATE", index_name, physical)
+            pipe.hset(f"{db.INDEX_META_PREFIX}{index_name}", mapping={
+                "physical": physical,
+                "version": int(physical.rsplit("@v", 1)[1]),
+                "dim": dim,
+                "vector_field": field
+            })
+            pipe.incr(SearchResultCache.generation_key(index_name))
+        pipe.hset(self.key, "status", "cutover")
+        pipe.incr(VectorDBManager.LAYOUT_KEY)
+        pipe.execute()
+        db.refresh_layout(force=True)
+        logger.info(f"{self.collection} now serves dim={dim} vectors from {field}")
+        
+        for shard, physical in old.items():
+            if physical != db._index_name(self.collection, shard):
+                self.redis.execute_command("FT.DROPINDEX", physical)
+        db._drop_vector_field(state["old_field"], json.loads(state["prefixes"]))
+        refreshed = self._refresh_fingerprints(state["old_schema"])
+        
+        self.redis.hset(self.key, mapping={"status": "done", "finished_at": int(time.time())})
+        logger.info(f"Re-embed of {self.collection} done ({refreshed} source fingerprints refreshed)")
+        return self.state()
+    
+    def _refresh_fingerprints(self, old_schema: str) -> int:
+        """
+        Recompute source fingerprints (which cover the dimension) from the
+        stored chunks, so unchanged documents keep being skipped on ingest.
+        
+        Derived fields (a ticket's incident_number, resolution) are stored
+        instead of the metadata they came from, so each candidate
+        reconstruction is checked against the pre-cutover fingerprint
+        first. Sources that can't be reproduced, or lost a chunk, are left
+        alone and re-embed once on their next ingest.
+        """
+        db = self.vector_db
+        partition_key = db.shard_specs.get(self.collection, (None,))[0]
+        names = ("doc_id", "content", *db.STORED_METADATA_FIELDS, *([partition_key] if partition_key else []))
+        derived = [f for f in db.STORED_METADATA_FIELDS if f in db._derived_fields(self.collection, "", "", {})]
+        variants = [
+            [f for i, f in enumerate(derived) if mask >> i & 1]
+            for mask in range(2 ** len(derived))
+        ]
+        
+        refreshed = 0
+        for source_keys in db._scan_keys(f"{db.SOURCE_PREFIX}{db._index_name(self.collection)}:"):
+            pipe = self.redis.pipeline(transaction=False)
+            for source_key in source_keys:
+                pipe.hmget(source_key, "keys", "fp")
+            sources = pipe.execute()
+            chunk_keys = [json.loads(keys) if keys else [] for keys, _ in sources]
+            
+            pipe = self.redis.pipeline(transaction=False)
+            for keys in chunk_keys:
+                for key in keys:
+                    pipe.hmget(key, *names)
+            values = iter(pipe.execute())
+            
+            write = self.redis.pipeline(transaction=False)
+            for source_key, keys, (_, stored_fp) in zip(source_keys, chunk_keys, sources):
+                rows = [next(values) for _ in keys]
+                if not rows or stored_fp is None or any(row[0] is None for row in rows):
+                    continue
+                chunks = []
+                for row in rows:
+                    fields = {name: (value or b"").decode(errors="ignore") for name, value in zip(names, row)}
+                    chunks.append((fields.pop("doc_id"), fields.pop("content"), fields))
+                for blank in variants:
+                    candidate = [(d, c, {**m, **{f: "" for f in blank}}) for d, c, m in chunks]
+                    if db.fingerprint(self.collection, candidate, old_schema) == stored_fp.decode():
+                        write.hset(source_key, "fp", db.fingerprint(self.collection, candidate))
+                        refreshed += 1
+                        break
+            write.execute()
+        return refreshed
+    
+    @staticmethod
+    def progress(vector_db: VectorDBManager) -> Dict[str, Dict[str, Any]]:
+        """Per-collection job status, throughput and ETA for /stats"""
+        collections = [name for name in VectorDBManager.COLLECTIONS if name != "recent"]
+        pipe = vector_db.redis.pipeline(transaction=False)
+        for name in collections:
+            pipe.hgetall(vector_db._reembed_key(name))
+        
+        report = {}
+        for name, raw in zip(collections, pipe.execute()):
+            if not raw:
+                continue
+            state = {k.decode(): v.decode() for k, v in raw.items()}
+            done = int(state["processed"]) + int(state["skipped"])
+            total = max(int(state["total"]), done)
+            rate = float(state["rate"])
+            report[name] = {
+                "status": state["status"],
+                "dim": int(state["dim"]),
+                "processed": int(state["processed"]),
+                "skipped": int(state["skipped"]),
+                "failed": int(state["failed"]),
+                "total": total,
+                "percent": round(100 * done / total, 1) if total else 100.0,
+                "docs_per_second": rate,
+                "eta_seconds": int((total - done) / rate) if rate and state["status"] == "running" else None
+            }
+        return report
+
+
+# =============================================================================
+# RAG Service
+# =============================================================================
+
+class RAGService:
+    """Main RAG Service combining all components"""
+    
+    def __init__(self):
+        self.embeddings = create_embedding_provider()
+        if Config.EMBED_CACHE_ENABLED:
+            # Ingest, search and Storm Shield all embed through the cache
+            self.embeddings = EmbeddingCache(
+                self.embeddings,
+                redis.from_url(Config.REDIS_URL, decode_responses=False)
+            )
+        self.reasoning = ClaudeReasoning()
+        self.vector_db = VectorDBManager(self.embeddings)
+        logger.info("RAG Service initialized successfully")
+    
+    def process_ticket(self, ticket: TicketQuery) -> RAGResponse:
+        """
+        Main RAG pipeline for ticket processing.
+        
+        1. Generate embedding for ticket (once)
+        2. Retrieve similar KB articles
+        3. Retrieve similar historical tickets
+        4. Retrieve relevant SOPs
+           (steps 2-4 run concurrently against their indexes)
+        5. Use Claude for reasoning
+        6. Return structured response
+        """
+        start_time = time.time()
+        
+        # Step 1-4: Embed once and search all collections concurrently
+        results = self.vector_db.search_multi(
+            self._query_text(ticket), self._retrieval_plan(),
+            filters=self._retrieval_filters(ticket), mode=Config.RETRIEVAL_MODE
+        )
+        kb_articles, similar_tickets, sop_references = self._assemble_context(results)
+        
+        # Step 5: Claude reasoning
+        claude_response = self.reasoning.analyze_ticket(
+            **self._reasoning_inputs(ticket, kb_articles, similar_tickets, sop_references)
+        )
+        
+        # Step 6: Structured response
+        return self._build_response(
+            ticket, claude_response, kb_articles, similar_tickets, sop_references, start_time
+        )
+    
+    async def aprocess_ticket(self, ticket: TicketQuery) -> RAGResponse:
+        """Async variant of process_ticket; never blocks the event loop"""
+        start_time = time.time()
+        
+        results = await self.vector_db.asearch_multi(
+            self._query_text(ticket), self._retrieval_plan(),
+            filters=self._retrieval_filters(ticket), mode=Config.RETRIEVAL_MODE
+        )
+        kb_articles, similar_tickets, sop_references = self._assemble_context(results)
+        
+        claude_response = await self.reasoning.aanalyze_ticket(
+            **self._reasoning_inputs(ticket, kb_articles, similar_tickets, sop_references)
+        )
+        
+        return self._build_response(
+            ticket, claude_response, kb_articles, similar_tickets, sop_references, start_time
+        )
+    
+    @staticmethod
+    def _query_text(ticket: TicketQuery) -> str:
+        """Combine short and long description for embedding"""
+        return f"{ticket.short_description}\n{ticket.description}"
+    
+    @staticmethod
+    def _retrieval_plan() -> Dict[str, int]:
+        """Collections searched for /api/v1/analyze and their top_k"""
+        return {
+            "kb": Config.TOP_K_KB,
+            "ticket": Config.TOP_K_TICKETS,
+            "sop": Config.TOP_K_SOP
+        }
+    
+    @staticmethod
+    def _retrieval_filters(ticket: TicketQuery) -> Optional[SearchFilters]:
+        """Scope sharded collections to the ticket's partition, if it names one"""
+        return SearchFilters(partitions=[ticket.partition]) if ticket.partition else None
+    
+    @staticmethod
+    def _assemble_context(results: Dict[str, List[Dict]]):
+        """Turn raw search hits into KB articles, similar tickets and SOP refs"""
+        
+        # Similar KB articles
+        kb_articles = [
+            KBArticle(
+                kb_number=r['metadata'].get('kb_number') or r['metadata'].get('doc_id') or 'KB0000000',
+                title=r['metadata'].get('title', 'Untitled'),
+                content=r['content'],
+                category=r['metadata'].get('category', 'General'),
+                relevance_score=r['score']
+            )
+            for r in results["kb"]
+        ]
+        
+        # Similar historical tickets
+        similar_tickets = [
+            SimilarTicket(
+                incident_number=r['metadata'].get('incident_number') or r['metadata'].get('doc_id') or 'INC0000000',
+                short_description=r['metadata'].get('short_description', ''),
+                resolution=r['metadata'].get('resolution') or 'Not available',
+                resolution_time_hours=r['metadata'].get('resolution_time_hours', 0),
+                relevance_score=r['score']
+            )
+            for r in results["ticket"]
+        ]
+        
+        # Relevant SOPs
+        sop_references = [r['metadata'].get('title') or r['content'][:100] for r in results["sop"]]
+        
+        return kb_articles, similar_tickets, sop_references
+    
+    @staticmethod
+    def _reasoning_inputs(
+        ticket: TicketQuery,
+        kb_articles: List[KBArticle],
+        similar_tickets: List[SimilarTicket],
+        sop_references: List[str]
+    ) -> Dict[str, Any]:
+        """Keyword arguments for ClaudeReasoning.analyze_ticket"""
+        return {
+            "ticket": ticket,
+            "kb_context": [{"title": kb.title, "content": kb.content, "score": kb.relevance_score}
+                           for kb in kb_articles],
+            "similar_tickets": [{"incident_number": t.incident_number,
+                                 "short_description": t.short_description,
+                                 "resolution": t.resolution,
+                                 "resolution_time": t.resolution_time_hours}
+                                for t in similar_tickets],
+            "sop_context": sop_references
+        }
+    
+    @staticmethod
+    def _build_response(
+        ticket: TicketQuery,
+        claude_response: Dict,
+        kb_articles: List[KBArticle],
+        similar_tickets: List[SimilarTicket],
+        sop_references: List[str],
+        start_time: float
+    ) -> RAGResponse:
+        """Build the RAGResponse from Claude's output and retrieved context"""
+        
+        # Calculate processing time
+        processing_time = int((time.time() - start_time) * 1000)
+        
+        # Generate query ID
+        query_id = hashlib.md5(
+            f"{ticket.short_description}:{datetime.utcnow().isoformat()}".encode()
+        ).hexdigest()[:12]
+        
+        # Build response
+        return RAGResponse(
+            query_id=query_id,
+            timestamp=datetime.utcnow().isoformat(),
+            analysis=claude_response.get('analysis', ''),
+            root_cause_hypothesis=claude_response.get('root_cause_hypothesis', ''),
+            recommended_actions=claude_response.get('recommended_actions', []),
+            suggested_category=CategorySuggestion(
+                category=claude_response.get('suggested_category', {}).get('category', 'General'),
+                subcategory=claude_response.get('suggested_category', {}).get('subcategory', 'Unknown'),
+                confidence=claude_response.get('suggested_category', {}).get('confidence', 0.5),
+                reasoning=claude_response.get('suggested_category', {}).get('reasoning', '')
+            ),
+            kb_articles=kb_articles,
+            similar_tickets=similar_tickets,
+            sop_references=sop_references,
+            overall_confidence=claude_response.get('overall_confidence', 0.5),
+            processing_time_ms=processing_time
+        )
+    
+    def ingest_document(self, doc: DocumentIngest) -> IngestResponse:
+        """
+        Ingest a new document into the vector database (skipped if unchanged).
+        
+        A chunk of a larger source (parent_id) is written alongside its
+        siblings instead of replacing them.
+        """
+        
+        collection_name, _, metadata = self._prepare_document(doc)
+        whole_source = self.vector_db.source_id(doc.document_id, metadata) == doc.document_id
+        result = self.ingest_documents([doc], replace=whole_source)[0]
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["error"])
+        
+        return IngestResponse(
+            success=True,
+            document_id=doc.document_id,
+            collection=collection_name,
+            embedding_id=result["embedding_id"],
+            unchanged=result["unchanged"]
+        )
+    
+    async def aingest_document(self, doc: DocumentIngest) -> IngestResponse:
+        """Async variant of ingest_document (offloaded to the I/O executor)"""
+        return await blocking_io.run(self.ingest_document, doc)
+    
+    async def aingest_documents(self, docs: List[DocumentIngest]) -> List[Dict[str, Any]]:
+        """Async variant of ingest_documents (offloaded to the I/O executor)"""
+        return await blocking_io.run(self.ingest_documents, docs)
+    
+    def ingest_documents(self, docs: List[DocumentIngest], replace: bool = True) -> List[Dict[str, Any]]:
+        """
+        Ingest many documents, embedding them concurrently in one batch.
+        
+        Sources (a document, or all chunks sharing a parent_id) whose content
+        fingerprint is unchanged are skipped without embedding or writing.
+        Failures are reported per document instead of aborting the batch.
+        
+        Args:
+            docs: Documents to ingest, all chunks of a source together
+            replace: False when `docs` hold only part of their sources, so
+                chunks that weren't sent are kept (see add_documents)
+        
+        Returns:
+            One dict per input document (same order) with document_id,
+            success, unchanged, and either embedding_id or error
+        """
+        results: List[Dict[str, Any]] = [None] * len(docs)
+        prepared = []
+        for i, doc in enumerate(docs):
+            try:
+                prepared.append((i, doc, *self._prepare_document(doc)))
+            except HTTPException as e:
+                results[i] = {"document_id": doc.document_id, "success": False, "error": e.detail}
+        
+        # Skip sources whose content hasn't changed since the last ingest
+        sources: Dict[tuple, List[tuple]] = {}
+        for entry in prepared:
+            _, doc, collection_name, content, metadata = entry
+            source = (collection_name, self.vector_db.source_id(doc.document_id, metadata))
+            sources.setdefault(source, []).append(entry)
+        unchanged = self.vector_db.unchanged_sources({
+            source: self.vector_db.fingerprint(source[0], [(e[1].document_id, e[3], e[4]) for e in entries])
+            for source, entries in sources.items()
+        })
+        for source in unchanged:
+            for i, doc, collection_name, _, _ in sources[source]:
+                results[i] = {
+                    "document_id": doc.document_id,
+                    "success": True,
+                    "unchanged": True,
+                    "embedding_id": self.vector_db.embedding_id(doc.document_id)
+                }
+        prepared = [e for source, entries in sources.items() if source not in unchanged for e in entries]
+        if unchanged:
+            logger.info(f"Skipped {len(docs) - len(prepared)} unchanged documents")
+        
+        # One batch per target dimension (collections may use different sizes)
+        by_dimension: Dict[int, List[int]] = {}
+        for j, (_, _, collection_name, _, _) in enumerate(prepared):
+            by_dimension.setdefault(self.vector_db.dimension_for(collection_name), []).append(j)
+        
+        embeddings: List[Optional[List[float]]] = [None] * len(prepared)
+        errors: Dict[int, str] = {}
+        for dim, positions in by_dimension.items():
+            batch = self.vector_db.embeddings.embed_batch([prepared[j][3] for j in positions], dim)
+            for n, j in enumerate(positions):
+                embeddings[j] = batch.embeddings[n]
+                if n in batch.errors:
+                    errors[j] = batch.errors[n]
+        
+        # Pipelined writes for everything that embedded successfully
+        writable = [j for j in range(len(prepared)) if j not in errors]
+        written = self.vector_db.add_documents([
+            {
+                "collection_name": prepared[j][2],
+                "doc_id": prepared[j][1].document_id,
+                "content": prepared[j][3],
+                "metadata": prepared[j][4],
+                "embedding": embeddings[j]
+            }
+            for j in writable
+        ], replace=replace)
+        
+        for j, error in errors.items():
+            i, doc = prepared[j][:2]
+            results[i] = {"document_id": doc.document_id, "success": False, "error": error}
+        for j, result in zip(writable, written):
+            i, doc = prepared[j][:2]
+            results[i] = {"document_id": doc.document_id, "success": result["success"], "unchanged": False}
+            if result["success"]:
+                results[i]["embedding_id"] = result["embedding_id"]
+            else:
+                results[i]["error"] = result["error"]
+        
+        return results
+    
+    async def aingest_stream(self, docs: Iterable[DocumentIngest], window: int = None) -> Dict[str, Any]:
+        """Async variant of ingest_stream (offloaded to the I/O executor)"""
+        return await blocking_io.run(self.ingest_stream, docs, window)
+    
+    def ingest_stream(
+        self,
+        docs: Iterable[DocumentIngest],
+        window: int = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Ingest the chunks of one source as they are produced.
+        
+        Chunks are consumed `window` at a time: each window is checked for
+        unchanged chunks, embedded as one batch and written with pipelined
+        writes before the next one is pulled, so memory is bounded by the
+        window rather than the document. When the stream ends, chunks of
+        the previous version that weren't rewritten are deleted.
+        
+        Args:
+            docs: Chunks sharing a parent_id (may be a generator)
+            window: Chunks per embedding/write batch (default Config.UPLOAD_WINDOW_CHUNKS)
+            progress: Called with the running summary after each window
+            
+        Returns:
+            Counts of created, failed, unchanged and removed chunks, the
+            first errors, and a preview of the first chunks
+        """
+        window = window or Config.UPLOAD_WINDOW_CHUNKS
+        summary = {"created": 0, "failed": 0, "unchanged": 0, "removed": 0, "errors": [], "preview": []}
+        source, doc_ids, keys = None, [], []
+        
+        def fail(document_id: str, error: str):
+            summary["failed"] += 1
+            if len(summary["errors"]) < 10:
+                summary["errors"].append({"document_id": document_id, "success": False, "error": error})
+        
+        docs = iter(docs)
+        while True:
+            chunk_window = list(itertools.islice(docs, window))
+            if not chunk_window:
+                break
+            
+            prepared = []
+            for doc in chunk_window:
+                if len(summary["preview"]) < 3:
+                    summary["preview"].append(doc.content)
+                try:
+                    collection_name, content, metadata = self._prepare_document(doc)
+                except HTTPException as e:
+                    fail(doc.document_id, e.detail)
+                    continue
+                if source is None:
+                    source = (collection_name, self.vector_db.source_id(doc.document_id, metadata))
+                doc_ids.append(doc.document_id)
+                prepared.append({
+                    "collection_name": collection_name,
+                    "doc_id": doc.document_id,
+                    "content": content,
+                    "metadata": metadata
+                })
+            if not prepared:
+                if progress:
+                    progress(summary)
+                continue
+            
+            unchanged = self.vector_db.unchanged_documents(prepared)
+            for i in unchanged:
+                keys.append(self.vector_db.document_key(**{k: prepared[i][k] for k in ("collection_name", "doc_id", "metadata")}))
+            summary["unchanged"] += len(unchanged)
+            pending = [doc for i, doc in enumerate(prepared) if i not in unchanged]
+            if not pending:
+                if progress:
+                    progress(summary)
+                continue
+            
+            dim = self.vector_db.dimension_for(source[0])
+            batch = self.vector_db.embeddings.embed_batch([doc["content"] for doc in pending], dim)
+            writable = []
+            for n, doc in enumerate(pending):
+                if n in batch.errors:
+                    fail(doc["doc_id"], batch.errors[n])
+                else:
+                    writable.append({**doc, "embedding": batch.embeddings[n]})
+            
+            for doc, result in zip(writable, self.vector_db.add_documents(writable, replace=False)):
+                if result["success"]:
+                    summary["created"] += 1
+                    keys.append(self.vector_db.document_key(doc["collection_name"], doc["doc_id"], doc["metadata"]))
+                else:
+                    fail(doc["doc_id"], result["error"])
+            if progress:
+                progress(summary)
+        
+        if source is not None:
+            summary["removed"] = self.vector_db.finish_source(*source, doc_ids, keys)
+        return summary
+    
+    def ingest_batches(
+        self,
+        docs: List[DocumentIngest],
+        batch_size: int = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Ingest a large list of documents in batches, reporting progress.
+        
+        Batches hold whole sources (all chunks sharing a parent_id), so
+        change detection and chunk replacement work as in ingest_documents.
+        
+        Args:
+            docs: Documents to ingest
+            batch_size: Documents per ingest_documents call (default Config.WRITE_BATCH_SIZE)
+            progress: Called with the running summary after each batch
+            
+        Returns:
+            Counts of created, failed and unchanged documents and the first errors
+        """
+        summary = {"created": 0, "failed": 0, "unchanged": 0, "errors": []}
+        
+        for batch in self.source_batches(docs, batch_size):
+            for result in self.ingest_documents(batch):
+                if not result["success"]:
+                    summary["failed"] += 1
+                    if len(summary["errors"]) < 10:
+                        summary["errors"].append(result)
+                elif result.get("unchanged"):
+                    summary["unchanged"] += 1
+                else:
+                    summary["created"] += 1
+            if progress:
+                progress(summary)
+        return summary
+    
+    def source_batches(self, docs: List[DocumentIngest], batch_size: int = None) -> List[List[DocumentIngest]]:
+        """
+        Split documents into batches of about `batch_size` (default
+        Config.WRITE_BATCH_SIZE) that keep each source's chunks together.
+        """
+        batch_size = batch_size or Config.WRITE_BATCH_SIZE
+        sources: Dict[tuple, List[DocumentIngest]] = OrderedDict()
+        for doc in docs:
+            source = (doc.document_type, self.vector_db.source_id(doc.document_id, doc.metadata or {}))
+            sources.setdefault(source, []).append(doc)
+        
+        batches: List[List[DocumentIngest]] = []
+        batch: List[DocumentIngest] = []
+        for group in sources.values():
+            batch += group
+            if len(batch) >= batch_size:
+                batches.append(batch)
+                batch = []
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _prepare_document(self, doc: DocumentIngest):
+        """Resolve collection, embedding text and metadata for a document"""
+        
+        collection_map = {
+            "kb": Config.COLLECTION_KB,
+            "ticket": Config.COLLECTION_TICKETS,
+            "sop": Config.COLLECTION_SOP
+        }
+        
+        collection_name = collection_map.get(doc.document_type)
+        if not collection_name:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid document_type: {doc.document_type}. Must be kb, ticket, or sop"
+            )
+        
+        metadata = doc.metadata or {}
+        metadata['document_id'] = doc.document_id
+        metadata['title'] = doc.title
+        metadata['ingested_at'] = datetime.utcnow().isoformat()
+        
+        return collection_name, f"{doc.title}\n{doc.content}", metadata
+
+
+# =============================================================================
+# Chunking
+# =============================================================================
+
+class Chunker:
+    """
+    Structure- and token-aware chunker for uploaded documents.
+    
+    Text is read line by line in a single pass and grouped into blocks:
+    headings, paragraphs, fenced code and tables. Markdown headings are
+    recognized everywhere; in PDFs numbered ("3.2 Configuring VPN") and
+    upper-case lines stand in for them. Blocks are packed into chunks of
+    at most `max_tokens` (estimated at CHARS_PER_TOKEN characters each):
+    
+    - a heading starts a new chunk once the current one holds `min_tokens`,
+      so sections aren't mixed but tiny sections are merged
+    - a chunk starting inside a section is prefixed with its heading path
+    - blocks larger than a chunk are split at sentence boundaries (code and
+      tables at line boundaries, repeating the table header)
+    - consecutive chunks of a section share up to `overlap_tokens` of
+      trailing sentences
+    
+    Only the current chunk is held in memory, so chunks stream out as the
+    text streams in.
+    """
+    
+    MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.*?)[\s#]*$")
+    NUMBERED_HEADING = re.compile(r"^(\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+[A-Z][^.!?:;]{1,78}$")
+    FENCE = re.compile(r"^\s*(```|~~~)")
+    TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+    TABLE_SEPARATOR = re.compile(r"^[\s|:-]+$")
+    SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+    
+    def __init__(
+        self,
+        max_tokens: int = None,
+        overlap_tokens: int = None,
+        min_tokens: int = None,
+        pdf: bool = False
+    ):
+        self.max_tokens = max(max_tokens or Config.CHUNK_MAX_TOKENS, 16)
+        overlap_tokens = Config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.overlap_tokens = min(max(overlap_tokens, 0), self.max_tokens // 2)
+        min_tokens = Config.CHUNK_MIN_TOKENS if min_tokens is None else min_tokens
+        self.min_tokens = min(max(min_tokens, 0), self.max_tokens)
+        self.pdf = pdf
+        self.max_chars = self.max_tokens * Config.CHARS_PER_TOKEN
+    
+    @staticmethod
+    def tokens(text: str) -> int:
+        """Estimated token count (CHARS_PER_TOKEN characters per token)"""
+        return -(-len(text) // Config.CHARS_PER_TOKEN)
+    
+    def chunks(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Chunks of streamed text, yielded as soon as each is complete"""
+        path: List[tuple] = []      # (level, title) of the enclosing headings
+        body: List[tuple] = []      # (kind, text) of the current chunk
+        used = 0                    # tokens in body
+        filled = False              # body holds more than headings and carry-over
+        
+        def start(carry: List[tuple]):
+            nonlocal body, used, filled
+            body = [] if not path or (carry and carry[0][0] == "heading") else [
+                ("path", " > ".join(title for _, title in path))
+            ]
+            body += carry
+            used = sum(self.tokens(text) for _, text in body)
+            filled = False
+        
+        def emit() -> str:
+            return "\n\n".join(text for _, text in body)
+        
+        for kind, text, level, title in self._blocks(self._lines(pieces)):
+            if kind == "heading":
+                if filled and used >= self.min_tokens:
+                    yield emit()
+                    start([])
+                path = [(l, t) for l, t in path if l < level] + [(level, title)]
+                if not filled:
+                    # The new heading path replaces the old one
+                    headings = [(k, t) for k, t in body if k == "heading"]
+                    parents = [t for _, t in path[:-1]]
+                    body = ([("path", " > ".join(parents))] if parents and not headings else []) + headings
+                body.append((kind, text))
+                used = sum(self.tokens(t) for _, t in body)
+                continue
+            
+            for piece in self._split(kind, text):
+                size = self.tokens(piece)
+                if filled and used + size > self.max_tokens:
+                    # Headings at the end belong to the next chunk
+                    trailing = []
+                    while body and body[-1][0] == "heading":
+                        trailing.insert(0, body.pop())
+                    yield emit()
+                    carry = trailing or self._overlap(body)
+                    start(carry)
+                    if used + size > self.max_tokens:
+                        start(trailing)
+                body.append((kind, piece))
+                used += size
+                filled = True
+        
+        if filled:
+            yield emit()
+    
+    def _overlap(self, body: List[tuple]) -> List[tuple]:
+        """Trailing sentences of a chunk's last paragraph, up to overlap_tokens"""
+        if not self.overlap_tokens or not body or body[-1][0] != "text":
+            return []
+        tail: List[str] = []
+        used = 0
+        for sentence in reversed(self.SENTENCE_BREAK.split(body[-1][1])):
+            used += self.tokens(sentence) + 1
+            if used > self.overlap_tokens:
+                break
+            tail.insert(0, sentence)
+        return [("overlap", " ".join(tail))] if tail else []
+    
+    def _split(self, kind: str, text: str) -> List[str]:
+        """A block as pieces that fit in a chunk next to its heading path"""
+        budget = self.max_tokens * 3 // 4
+        if self.tokens(text) <= budget:
+            return [text]
+        
+        if kind == "text":
+            units, sep, header = self.SENTENCE_BREAK.split(text), " ", []
+        else:
+            units, sep, header = text.split("\n"), "\n", []
+            if kind == "table" and len(units) > 2 and self.TABLE_SEPARATOR.match(units[1]):
+                header, units = units[:2], units[2:]
+        
+        limit = budget * Config.CHARS_PER_TOKEN - len("\n".join(header))
+        pieces: List[str] = []
+        current: List[str] = []
+        size = 0
+        for unit in units:
+            # A single sentence or line longer than the budget is cut at spaces
+            while len(unit) > limit:
+                cut = unit.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+                units_cut, unit = unit[:cut], unit[cut:].lstrip()
+                if current:
+                    pieces.append(sep.join(header + current))
+                    current, size = [], 0
+                pieces.append(sep.join(header + [units_cut]))
+            if current and size + len(unit) + 1 > limit:
+                pieces.append(sep.join(header + current))
+                current, size = [], 0
+            current.append(unit)
+            size += len(unit) + 1
+        if current:
+            pieces.append(sep.join(header + current))
+        return pieces
+    
+    def _lines(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Lines of streamed text; overlong lines are cut at a sentence end or space"""
+        buffer = ""
+        for piece in pieces:
+            buffer += piece
+            *lines, buffer = buffer.split("\n")
+            yield from lines
+            while len(buffer) > self.max_chars:
+                # Prefer a sentence end in the latter half of the window, so
+                # paragraphs split cleanly without leaving small fragments
+                cut = buffer.rfind(". ", self.max_chars // 2, self.max_chars) + 1
+                cut = cut or buffer.rfind(" ", 0, self.max_chars)
+                cut = cut if cut > 0 else self.max_chars
+                yield buffer[:cut]
+                buffer = buffer[cut:].lstrip()
+        if buffer:
+            yield buffer
+    
+    def _heading(self, line: str) -> Optional[tuple]:
+        """(level, title) if the line is a heading"""
+        match = self.MARKDOWN_HEADING.match(line)
+        if match and match.group(2):
+            return len(match.group(1)), match.group(2)
+        if self.pdf and len(line) <= 80:
+            match = self.NUMBERED_HEADING.match(line)
+            if match:
+                return match.group(1).count(".") + 1, line
+            if line.isupper() and line[-1] not in ".!?:;," and len(line.split()) <= 8:
+                return 1, line
+        return None
+    
+    def _blocks(self, lines: Iterable[str]) -> Iterator[tuple]:
+        """(kind, text, heading level, heading title) blocks of a line stream"""
+        paragraph: List[str] = []
+        paragraph_chars = 0
+        table: List[str] = []
+        code: List[str] = []
+        fence = None
+        
+        for line in lines:
+            if fence:
+                code.append(line)
+                if line.strip().startswith(fence):
+                    yield "code", "\n".join(code), 0, None
+                    code, fence = [], None
+                continue
+            
+            if table and not self.TABLE_ROW.match(line):
+                yield "table", "\n".join(table), 0, None
+                table = []
+            
+            stripped = line.strip()
+            fence_match = self.FENCE.match(line)
+            heading = None if fence_match or not stripped else self._heading(stripped)
+            if paragraph and (not stripped or fence_match or heading or self.TABLE_ROW.match(line)):
+                yield "text", "\n".join(paragraph), 0, None
+                paragraph, paragraph_chars = [], 0
+            
+            if not stripped:
+                continue
+            if fence_match:
+                fence, code = fence_match.group(1), [line]
+            elif heading:
+                yield "heading", stripped, heading[0], heading[1]
+            elif self.TABLE_ROW.match(line):
+                table.append(line)
+            else:
+                paragraph.append(stripped)
+                paragraph_chars += len(stripped) + 1
+                # Text without blank lines is flushed once it fills a chunk,
+                # at its last sentence boundary
+                if paragraph_chars >= self.max_chars:
+                    text = "\n".join(paragraph)
+                    breaks = [m.end() for m in self.SENTENCE_BREAK.finditer(text)]
+                    cut = breaks[-1] if breaks else len(text)
+                    yield "text", text[:cut].rstrip(), 0, None
+                    paragraph = [text[cut:]] if cut < len(text) else []
+                    paragraph_chars = len(text) - cut
+        
+        if code:
+            yield "code", "\n".join(code), 0, None
+        if table:
+            yield "table", "\n".join(table), 0, None
+        if paragraph:
+            yield "text", "\n".join(paragraph), 0, None
+
+
+# =============================================================================
+# Upload Streaming
+# =============================================================================
+
+def iter_file_text(file: BinaryIO, filename: str, block_size: int = None) -> Iterator[str]:
+    """
+    Text of an uploaded file, piece by piece.
+    
+    PDFs yield one page at a time (pypdf reads pages from the file on
+    demand); text and Markdown are decoded incrementally in blocks of
+    `block_size` bytes. Only JSON is parsed as a whole.
+    """
+    block_size = block_size or Config.UPLOAD_READ_BYTES
+    file.seek(0)
+    
+    if filename.endswith(".pdf"):
+        import pypdf
+        
+        for page in pypdf.PdfReader(file).pages:
+            yield (page.extract_text() or "") + "\n"
+    
+    elif filename.endswith(".json"):
+        json_data = json.loads(file.read().decode())
+        # Handle various JSON formats
+        if isinstance(json_data, list):
+            for item in json_data:
+                yield json.dumps(item) + "\n\n"
+        else:
+            yield json.dumps(json_data, indent=2)
+    
+    else:
+        # Assume text/md
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+
+
+def upload_doc_id(filename: str) -> str:
+    """Parent id shared by the chunks of an uploaded file"""
+    return f"DOC_{hashlib.md5(filename.encode()).hexdigest()[:8]}"
+
+
+def iter_upload_documents(
+    file: BinaryIO,
+    filename: str,
+    collection: str,
+    chunk_size: int,
+    chunk_overlap: int
+) -> Iterator[DocumentIngest]:
+    """Chunks of an uploaded file as documents, produced while the file is read"""
+    doc_id = upload_doc_id(filename)
+    document_type = collection if collection in ["kb", "ticket", "sop"] else "kb"
+    chunker = Chunker(chunk_size, chunk_overlap, pdf=filename.endswith(".pdf"))
+    
+    for i, chunk_text in enumerate(chunker.chunks(iter_file_text(file, filename))):
+        yield DocumentIngest(
+            document_type=document_type,
+            document_id=f"{doc_id}_part{i+1}",
+            title=f"{filename} (Part {i+1})",
+            content=chunk_text,
+            metadata={"source_file": filename, "chunk_index": i, "parent_id": doc_id}
+        )
+
+
+# =============================================================================
+# Ingestion Jobs
+# =============================================================================
+
+class IngestJobManager:
+    """
+    Runs ingestion jobs (uploads, batch ingests) on a bounded worker pool.
+    
+    Each job's status, counters and first errors are kept in a Redis hash
+    (`rag:job:{id}`, expiring after INGEST_JOB_TTL_SECONDS) and updated
+    after every batch, so any instance can report progress and throughput.
+    At most INGEST_JOB_MAX_PENDING jobs are queued or running; further
+    submissions are refused instead of piling up in memory.
+    """
+    
+    KEY_PREFIX = "rag:job:"
+    ERRORS_SUFFIX = ":errors"
+    COUNTERS = ("created", "failed", "unchanged", "removed", "skipped")
+    
+    def __init__(self, redis_client: redis.Redis, workers: int = None, max_pending: int = None):
+        self.redis = redis_client
+        self.workers = workers or Config.INGEST_JOB_WORKERS
+        self.max_pending = max_pending or Config.INGEST_JOB_MAX_PENDING
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rag-ingest")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._futures: Dict[str, Any] = {}
+    
+    def _key(self, job_id: str) -> str:
+        return f"{self.KEY_PREFIX}{job_id}"
+    
+    def submit(
+        self,
+        kind: str,
+        func: Callable[[Callable[[Dict[str, Any]], None]], Dict[str, Any]],
+        total: Optional[int] = None,
+        **details: str
+    ) -> str:
+        """
+        Queue `func(progress)` as a job and return its id.
+        
+        `func` reports its running summary (see RAGService.ingest_batches)
+        through `progress` and returns the final one.
+        
+        Raises:
+            RuntimeError: Too many jobs are queued or running
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise RuntimeError(f"{self._pending} ingestion jobs pending, try again later")
+            self._pending += 1
+        
+        try:
+            job_id = self.create(kind, total, **details)
+        except redis.RedisError:
+            with self._lock:
+                self._pending -= 1
+            raise
+        
+        try:
+            with self._lock:
+                self._futures[job_id] = self._pool.submit(self._run, job_id, func)
+        except RuntimeError:
+            # Pool shut down
+            with self._lock:
+                self._pending -= 1
+            self._finish(job_id, "failed", error="service is shutting down")
+            raise
+        logger.info(f"Queued {kind} job {job_id}")
+        return job_id
+    
+    def create(self, kind: str, total: Optional[int] = None, **details: Any) -> str:
+        """Record a new queued job and return its id (jobs run elsewhere use this directly)"""
+        job_id = uuid.uuid4().hex
+        key = self._key(job_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping={
+            "status": "queued",
+            "kind": kind,
+            "submitted_at": time.time(),
+            **({"total": total} if total is not None else {}),
+            **{name: value for name, value in details.items() if value is not None}
+        })
+        pipe.expire(key, Config.INGEST_JOB_TTL_SECONDS)
+        pipe.execute()
+        return job_id
+    
+    def _run(self, job_id: str, func: Callable):
+        key = self._key(job_id)
+        with self._lock:
+            self._running += 1
+        self.redis.hset(key, mapping={"status": "running", "started_at": time.time()})
+        
+        def progress(summary: Dict[str, Any]):
+            self._record(key, summary)
+        
+        try:
+            summary = func(progress)
+            self._record(key, summary)
+            self._finish(job_id, "completed", summary)
+            logger.info(f"Ingestion job {job_id} completed: {', '.join(f'{c}={summary.get(c, 0)}' for c in self.COUNTERS)}")
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            self._finish(job_id, "failed", error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._running -= 1
+                self._futures.pop(job_id, None)
+    
+    def _record(self, key: str, summary: Dict[str, Any]):
+        """Store a job's running counters and first errors"""
+        self.redis.hset(key, mapping={
+            **{name: summary.get(name, 0) for name in self.COUNTERS},
+            "errors": json.dumps(summary.get("errors", [])[:10]),
+            "updated_at": time.time()
+        })
+    
+    def _finish(self, job_id: str, status: str, summary: Optional[Dict[str, Any]] = None, error: str = None):
+        fields = {"status": status, "finished_at": time.time()}
+        if summary and summary.get("preview") is not None:
+            fields["preview"] = json.dumps(summary["preview"])
+        if error:
+            fields["error"] = error
+        self.redis.hset(self._key(job_id), mapping=fields)
+    
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status with counters, throughput and (when the size is known) percent done"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self._key(job_id))
+        pipe.lrange(self._key(job_id) + self.ERRORS_SUFFIX, 0, -1)
+        raw, queued_errors = pipe.execute()
+        if not raw:
+            return None
+        job = {k.decode(): v.decode() for k, v in raw.items()}
+        
+        counts = {name: int(job.get(name, 0)) for name in self.COUNTERS}
+        processed = counts["created"] + counts["failed"] + counts["unchanged"]
+        started = float(job["started_at"]) if "started_at" in job else None
+        finished = float(job["finished_at"]) if "finished_at" in job else None
+        elapsed = ((finished or time.time()) - started) if started else 0.0
+        total = int(job["total"]) if "total" in job else None
+        
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "kind": job.get("kind"),
+            **{name: job[name] for name in ("filename", "collection", "doc_id") if name in job},
+            **counts,
+            "processed": processed,
+            "total": total,
+            "percent": round(100.0 * processed / total, 1) if total else None,
+            "docs_per_second": round(processed / elapsed, 2) if elapsed > 0 else None,
+            "elapsed_seconds": round(elapsed, 1),
+            "submitted_at": datetime.utcfromtimestamp(float(job["submitted_at"])).isoformat(),
+            # Queued jobs collect errors from several consumers in a list
+            "errors": json.loads(job.get("errors") or "[]") + [json.loads(e) for e in queued_errors],
+            "preview": json.loads(job["preview"]) if "preview" in job else None,
+            "error": job.get("error")
+        }
+    
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self._pending, "running": self._running, "workers": self.workers}
+    
+    def shutdown(self):
+        """Stop accepting jobs; queued jobs are cancelled, running ones finish"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            cancelled = [job_id for job_id, future in self._futures.items() if future.cancelled()]
+        for job_id in cancelled:
+            self._finish(job_id, "failed", error="cancelled at shutdown")
 
 
 # =============================================================================
-# RAG Service
+# Ingestion Queue
 # =============================================================================
 
-class RAGService:
-    """Main RAG Service combining all components"""
+class IngestQueue:
+    """
+    Durable batch-ingest queue on a Redis Stream.
     
-    def __init__(self):
-        self.embeddings = TitanEmbeddings()
-        self.reasoning = ClaudeReasoning()
-        self.vector_db = VectorDBManager(self.embeddings)
-        logger.info("RAG Service initialized successfully")
+    A submitted batch becomes an ingestion job (see IngestJobManager) split
+    into stream entries of whole sources, about WRITE_BATCH_SIZE documents
+    each, so a restart loses nothing and entries spread over consumers.
+    Consumers of the `rag-ingest` group (INGEST_QUEUE_CONSUMERS threads in
+    the service and/or ingest_worker.py processes) read entries with
+    XREADGROUP and acknowledge one only after its documents are written,
+    in the same script that adds its counts to the job, so a redelivered
+    entry is never counted twice. Entries left pending by a dead consumer
+    are reclaimed with XAUTOCLAIM once idle for INGEST_QUEUE_CLAIM_IDLE_MS;
+    after INGEST_QUEUE_MAX_DELIVERIES attempts an entry is acknowledged as
+    failed instead of being retried forever.
+    """
     
-    def process_ticket(self, ticket: TicketQuery) -> RAGResponse:
+    STREAM = "rag:ingest:stream"
+    GROUP = "rag-ingest"
+    
+    # KEYS: stream, job hash, job errors list
+    # ARGV: group, entry id, created, unchanged, failed, now, ttl, errors...
+    ACK_ENTRY = """
+    if redis.call('XACK', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+        return -1
+    end
+    redis.call('XDEL', KEYS[1], ARGV[2])
+    redis.call('HINCRBY', KEYS[2], 'created', ARGV[3])
+    redis.call('HINCRBY', KEYS[2], 'unchanged', ARGV[4])
+    redis.call('HINCRBY', KEYS[2], 'failed', ARGV[5])
+    for i = 8, #ARGV do
+        redis.call('RPUSH', KEYS[3], ARGV[i])
+    end
+    if #ARGV >= 8 then
+        redis.call('LTRIM', KEYS[3], 0, 9)
+        redis.call('EXPIRE', KEYS[3], ARGV[7])
+    end
+    local done = redis.call('HINCRBY', KEYS[2], 'parts_done', 1)
+    if done >= tonumber(redis.call('HGET', KEYS[2], 'parts') or '0') then
+        redis.call('HSET', KEYS[2], 'status', 'completed', 'finished_at', ARGV[6])
+    end
+    redis.call('HSET', KEYS[2], 'updated_at', ARGV[6])
+    redis.call('EXPIRE', KEYS[2], ARGV[7])
+    return done
+    """
+    
+    # KEYS: job hash; ARGV: now
+    START_JOB = """
+    if redis.call('HGET', KEYS[1], 'status') == 'queued' then
+        redis.call('HSET', KEYS[1], 'status', 'running', 'started_at', ARGV[1])
+    end
+    return 1
+    """
+    
+    def __init__(self, rag_service: "RAGService", jobs: IngestJobManager):
+        self.rag_service = rag_service
+        self.jobs = jobs
+        self.redis = jobs.redis
+        self._ack_entry = self.redis.register_script(self.ACK_ENTRY)
+        self._start_job = self.redis.register_script(self.START_JOB)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._ensure_group()
+    
+    def _ensure_group(self):
+        try:
+            self.redis.xgroup_create(self.STREAM, self.GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+    
+    def enqueue(self, docs: List[DocumentIngest]) -> str:
         """
-        Main RAG pipeline for ticket processing.
+        Queue documents for ingestion and return the job id.
         
-        1. Generate embedding for ticket
-        2. Retrieve similar KB articles
-        3. Retrieve similar historical tickets
-        4. Retrieve relevant SOPs
-        5. Use Claude for reasoning
-        6. Return structured response
+        Raises:
+            RuntimeError: The queue holds INGEST_QUEUE_MAX_ENTRIES entries
         """
-        import time
-        start_time = time.time()
-        
-        # Combine short and long description for embedding
-        query_text = f"{ticket.short_description}\n{ticket.description}"
-        
-        # Step 1 & 2: Retrieve similar KB articles
-        kb_results = self.vector_db.search_similar("kb", query_text)
-        kb_articles = [
-            KBArticle(
-                kb_number=r['metadata'].get('kb_number', 'KB0000000'),
-                title=r['metadata'].get('title', 'Untitled'),
-                content=r['content'][:500],
-                category=r['metadata'].get('category', 'General'),
-                relevance_score=r['score']
-            )
-            for r in kb_results
-        ]
-        
-        # Step 3: Retrieve similar historical tickets
-        ticket_results = self.vector_db.search_similar("ticket", query_text)
-        similar_tickets = [
-            SimilarTicket(
-                incident_number=r['metadata'].get('incident_number', 'INC0000000'),
-                short_description=r['metadata'].get('short_description', ''),
-                resolution=r['metadata'].get('resolution', 'Not available'),
-                resolution_time_hours=r['metadata'].get('resolution_time_hours', 0),
-                relevance_score=r['score']
-            )
-            for r in ticket_results
-        ]
+        backlog = self.redis.xlen(self.STREAM)
+        if backlog >= Config.INGEST_QUEUE_MAX_ENTRIES:
+            raise RuntimeError(f"{backlog} ingest batches queued, try again later")
         
-        # Step 4: Retrieve relevant SOPs
-        sop_results = self.vector_db.search_similar("sop", query_text)
-        sop_references = [r['metadata'].get('title', r['content'][:100]) for r in sop_results]
-        
-        # Step 5: Claude reasoning
-        claude_response = self.reasoning.analyze_ticket(
-            ticket=ticket,
-            kb_context=[{"title": kb.title, "content": kb.content, "score": kb.relevance_score} 
-                       for kb in kb_articles],
-            similar_tickets=[{"incident_number": t.incident_number, 
-                            "short_description": t.short_description,
-                            "resolution": t.resolution,
-                            "resolution_time": t.resolution_time_hours}
-                           for t in similar_tickets],
-            sop_context=sop_references
+        parts = self.rag_service.source_batches(docs)
+        job_id = self.jobs.create("batch", total=len(docs), parts=len(parts))
+        if not parts:
+            self.jobs._finish(job_id, "completed")
+            return job_id
+        pipe = self.redis.pipeline(transaction=True)
+        for part in parts:
+            pipe.xadd(self.STREAM, {
+                "job_id": job_id,
+                "count": len(part),
+                "docs": json.dumps([doc.model_dump() for doc in part])
+            })
+        pipe.execute()
+        logger.info(f"Queued batch job {job_id}: {len(docs)} documents in {len(parts)} entries")
+        return job_id
+    
+    def consume(self, consumer: str, stop: threading.Event, block_ms: int = 5000):
+        """Process entries as `consumer` until `stop` is set"""
+        last_claim = 0.0
+        while not stop.is_set():
+            try:
+                entries = []
+                if time.monotonic() - last_claim >= Config.INGEST_QUEUE_CLAIM_INTERVAL:
+                    last_claim = time.monotonic()
+                    entries = self._claim(consumer)
+                if not entries:
+                    reply = self.redis.xreadgroup(
+                        self.GROUP, consumer, {self.STREAM: ">"}, count=1, block=block_ms
+                    )
+                    entries = reply[0][1] if reply else []
+                for entry_id, fields in entries:
+                    self._process(entry_id, fields)
+            except Exception as e:
+                # Unacknowledged entries stay pending and are reclaimed later
+                logger.error(f"Ingest consumer {consumer}: {e}")
+                stop.wait(1.0)
+    
+    def _claim(self, consumer: str) -> List[tuple]:
+        """Take over entries idle longer than INGEST_QUEUE_CLAIM_IDLE_MS"""
+        reply = self.redis.xautoclaim(
+            self.STREAM, self.GROUP, consumer,
+            min_idle_time=Config.INGEST_QUEUE_CLAIM_IDLE_MS, start_id="0-0", count=10
         )
+        entries = [(entry_id, fields) for entry_id, fields in reply[1] if fields]
+        if entries:
+            logger.warning(f"Consumer {consumer} reclaimed {len(entries)} stale ingest entries")
+        return entries
+    
+    def _process(self, entry_id: bytes, fields: Dict[bytes, bytes]):
+        job_id = fields[b"job_id"].decode()
+        count = int(fields.get(b"count", b"0"))
         
-        # Calculate processing time
-        processing_time = int((time.time() - start_time) * 1000)
-        
-        # Generate query ID
-        query_id = hashlib.md5(
-            f"{ticket.short_description}:{datetime.utcnow().isoformat()}".encode()
-        ).hexdigest()[:12]
+        deliveries = self.redis.xpending_range(self.STREAM, self.GROUP, min=entry_id, max=entry_id, count=1)
+        attempts = deliveries[0]["times_delivered"] if deliveries else 1
+        if attempts > Config.INGEST_QUEUE_MAX_DELIVERIES:
+            logger.error(f"Giving up on ingest entry {entry_id.decode()} of job {job_id} after {attempts - 1} attempts")
+            self._ack(entry_id, job_id, {
+                "created": 0, "unchanged": 0, "failed": count,
+                "errors": [{"success": False, "error": f"Gave up after {attempts - 1} attempts ({count} documents)"}]
+            })
+            return
         
-        # Build response
-        return RAGResponse(
-            query_id=query_id,
-            timestamp=datetime.utcnow().isoformat(),
-            analysis=claude_response.get('analysis', ''),
-            root_cause_hypothesis=claude_response.get('root_cause_hypothesis', ''),
-            recommended_actions=claude_response.get('recommended_actions', []),
-            suggested_category=CategorySuggestion(
-                category=claude_response.get('suggested_category', {}).get('category', 'General'),
-                subcategory=claude_response.get('suggested_category', {}).get('subcategory', 'Unknown'),
-                confidence=claude_response.get('suggested_category', {}).get('confidence', 0.5),
-                reasoning=claude_response.get('suggested_category', {}).get('reasoning', '')
-            ),
-            kb_articles=kb_articles,
-            similar_tickets=similar_tickets,
-            sop_references=sop_references,
-            overall_confidence=claude_response.get('overall_confidence', 0.5),
-            processing_time_ms=processing_time
+        self._start_job(keys=[self.jobs._key(job_id)], args=[time.time()])
+        docs = [DocumentIngest.model_validate(doc) for doc in json.loads(fields[b"docs"])]
+        self._ack(entry_id, job_id, self.rag_service.ingest_batches(docs))
+    
+    def _ack(self, entry_id: bytes, job_id: str, summary: Dict[str, Any]):
+        key = self.jobs._key(job_id)
+        self._ack_entry(
+            keys=[self.STREAM, key, key + self.jobs.ERRORS_SUFFIX],
+            args=[
+                self.GROUP, entry_id, summary["created"], summary["unchanged"], summary["failed"],
+                time.time(), Config.INGEST_JOB_TTL_SECONDS,
+                *(json.dumps(e) for e in summary["errors"][:10])
+            ]
         )
     
-    def ingest_document(self, doc: DocumentIngest) -> IngestResponse:
-        """Ingest a new document into the vector database"""
-        
-        collection_map = {
-            "kb": Config.COLLECTION_KB,
-            "ticket": Config.COLLECTION_TICKETS,
-            "sop": Config.COLLECTION_SOP
-        }
-        
-        collection_name = collection_map.get(doc.document_type)
-        if not collection_name:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid document_type: {doc.document_type}. Must be kb, ticket, or sop"
+    def start(self, consumers: int = None):
+        """Run consumer threads in this process"""
+        consumers = Config.INGEST_QUEUE_CONSUMERS if consumers is None else consumers
+        for n in range(consumers):
+            name = f"{socket.gethostname()}-{os.getpid()}-{n}"
+            thread = threading.Thread(
+                target=self.consume, args=(name, self._stop), name=f"rag-ingest-consumer-{n}", daemon=True
             )
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, timeout: float = 10.0):
+        """Stop consumer threads after their current entry"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+    
+    def stats(self) -> Dict[str, Any]:
+        group = next(
+            (g for g in self.redis.xinfo_groups(self.STREAM) if g["name"] in (self.GROUP, self.GROUP.encode())),
+            {}
+        )
+        return {
+            "length": self.redis.xlen(self.STREAM),
+            "pending": group.get("pending", 0),
+            "consumers": group.get("consumers", 0),
+            "local_consumers": len(self._threads)
+        }
+
+
+# =============================================================================
+# Bulk Import
+# =============================================================================
+
+class BulkFieldMap:
+    """
+    Maps exported records (e.g. a ServiceNow table export) to DocumentIngest.
+    
+    A field map names the record field for document_id, title and each
+    metadata key; `content` is a field name or a template such as
+    "Description:\n{description}". Names may be dotted paths into nested
+    objects, and ServiceNow {"value", "display_value"} pairs resolve to the
+    display value (or the value, when there is none).
+    """
+    
+    # Same documents as the ServiceNow sync builds
+    DEFAULTS = {
+        "ticket": {
+            "document_id": "number",
+            "title": "short_description",
+            "content": "Description:\n{description}\n\nResolution:\n{close_notes}",
+            "metadata": {
+                "incident_number": "number",
+                "closed_at": "closed_at",
+                "resolution_code": "resolution_code",
+                "category": "category"
+            }
+        },
+        "kb": {
+            "document_id": "number",
+            "title": "short_description",
+            "content": "text",
+            "metadata": {
+                "kb_number": "number",
+                "category": "category",
+                "topic": "topic",
+                "updated_on": "sys_updated_on"
+            }
+        },
+        "sop": {
+            "document_id": "id",
+            "title": "title",
+            "content": "content",
+            "metadata": {"category": "category"}
+        }
+    }
+    PLACEHOLDER = re.compile(r"\{([\w.]+)\}")
+    
+    def __init__(self, document_type: str, overrides: Optional[Dict[str, Any]] = None):
+        if document_type not in self.DEFAULTS:
+            raise ValueError(f"Invalid document_type: {document_type}. Must be kb, ticket, or sop")
+        self.document_type = document_type
+        spec = dict(self.DEFAULTS[document_type])
+        for layer in (Config.BULK_IMPORT_FIELD_MAPS.get(document_type) or {}, overrides or {}):
+            if not isinstance(layer, dict):
+                raise ValueError("A field map must be a JSON object")
+            unknown = set(layer) - {"document_id", "title", "content", "metadata"}
+            if unknown:
+                raise ValueError(f"Unknown field map keys: {', '.join(sorted(unknown))}")
+            metadata = layer.get("metadata") or {}
+            if not isinstance(metadata, dict) or not all(isinstance(path, str) for path in metadata.values()):
+                raise ValueError("Field map metadata must map metadata keys to field names")
+            for key, path in layer.items():
+                if key != "metadata" and not isinstance(path, str):
+                    raise ValueError(f"Field map {key} must be a field name or template, got {path!r}")
+            spec.update({k: v for k, v in layer.items() if k != "metadata"})
+            spec["metadata"] = {**spec["metadata"], **metadata}
+        self.spec = spec
+    
+    @staticmethod
+    def lookup(record: Dict[str, Any], path: str) -> str:
+        """Value at a dotted path as a string ("" when missing)"""
+        value: Any = record
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(value, dict) and ("display_value" in value or "value" in value):
+            value = value.get("display_value") or value.get("value")
+        if value is None:
+            return ""
+        return value if isinstance(value, str) else json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    
+    def document(self, record: Dict[str, Any]) -> DocumentIngest:
+        """
+        Raises:
+            ValueError: The record has no document id or no content
+        """
+        if not isinstance(record, dict):
+            raise ValueError("Record is not a JSON object")
         
-        metadata = doc.metadata or {}
-        metadata['document_id'] = doc.document_id
-        metadata['title'] = doc.title
-        metadata['ingested_at'] = datetime.utcnow().isoformat()
+        document_id = self.lookup(record, self.spec["document_id"])
+        content = self.spec["content"]
+        if self.PLACEHOLDER.search(content):
+            content = self.PLACEHOLDER.sub(lambda m: self.lookup(record, m.group(1)), content)
+            has_content = any(self.lookup(record, path) for path in self.PLACEHOLDER.findall(self.spec["content"]))
+        else:
+            content = self.lookup(record, content)
+            has_content = bool(content.strip())
+        if not document_id:
+            raise ValueError(f"Missing document id ({self.spec['document_id']})")
+        if not has_content:
+            raise ValueError(f"Record {document_id} has no content")
         
-        embed_id = self.vector_db.add_document(
-            collection_name=collection_name,
-            doc_id=doc.document_id,
-            content=f"{doc.title}\n{doc.content}",
-            metadata=metadata
+        return DocumentIngest(
+            document_type=self.document_type,
+            document_id=document_id,
+            title=self.lookup(record, self.spec["title"]) or document_id,
+            content=content,
+            metadata={
+                key: value for key, path in self.spec["metadata"].items()
+                if (value := self.lookup(record, path))
+            }
         )
+
+
+def iter_ndjson_lines(chunks: Iterable[bytes], gzipped: bool = False, max_line_bytes: int = None) -> Iterator[tuple]:
+    """
+    Lines of a streamed NDJSON body, as (line number, bytes) pairs.
+    
+    Only the current partial line is buffered, and a gzipped body is
+    inflated at most `max_line_bytes` at a time (member by member, if
+    several were concatenated). A line longer than `max_line_bytes` is
+    yielded as None (and the rest of it skipped), so one bad record can't
+    exhaust memory. A truncated gzip body raises zlib.error.
+    """
+    max_line_bytes = max_line_bytes or Config.BULK_IMPORT_MAX_LINE_BYTES
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    buffer = b""
+    overlong = False
+    number = 0
+    
+    def inflate(chunk: bytes):
+        nonlocal decompressor
+        if not decompressor:
+            yield chunk
+            return
+        while True:
+            if decompressor.eof:
+                if not chunk:
+                    return
+                # Concatenated gzip members (`cat a.gz b.gz`): start the next one
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data = decompressor.decompress(chunk, max_line_bytes)
+            yield data
+            chunk = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+            if not chunk and not decompressor.eof and len(data) < max_line_bytes:
+                return
+    
+    def split(data: bytes):
+        nonlocal buffer, overlong, number
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if overlong or len(line) > max_line_bytes:
+                overlong = False
+                yield number, None
+            elif line.strip():
+                yield number, line
+        if len(buffer) > max_line_bytes:
+            buffer, overlong = b"", True
+    
+    for chunk in chunks:
+        for data in inflate(chunk):
+            yield from split(data)
+    
+    if decompressor:
+        yield from split(decompressor.flush())
+        if not decompressor.eof:
+            raise zlib.error("truncated gzip stream")
+    if overlong or buffer.strip():
+        yield number + 1, None if overlong else buffer
+
+
+def run_bulk_import(
+    service: RAGService,
+    file: BinaryIO,
+    mapper: BulkFieldMap,
+    gzipped: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Import a spooled NDJSON/JSONL export (one record per line).
+    
+    The file is read block by block, records are mapped to documents with
+    `mapper` and ingested in batches of WRITE_BATCH_SIZE: each batch is
+    embedded and written while the next one is parsed, so memory use stays
+    constant whatever the file size. Unparseable or unmappable lines are
+    skipped and reported with their line numbers.
+    
+    Returns:
+        Counts of lines and created, unchanged, failed and skipped records,
+        with the first errors
+    
+    Raises:
+        zlib.error: `gzipped` and the file isn't valid gzip
+    """
+    summary = {"lines": 0, "created": 0, "unchanged": 0, "failed": 0, "skipped": 0, "errors": []}
+    
+    def fail(key: str, error: Dict[str, Any]):
+        summary[key] += 1
+        if len(summary["errors"]) < 10:
+            summary["errors"].append(error)
+    
+    def ingest(batch: List[tuple]):
+        for (line, _), result in zip(batch, service.ingest_documents([doc for _, doc in batch])):
+            if not result["success"]:
+                fail("failed", {"line": line, **result})
+            elif result.get("unchanged"):
+                summary["unchanged"] += 1
+            else:
+                summary["created"] += 1
+        if progress:
+            progress(summary)
+    
+    blocks = iter(lambda: file.read(Config.UPLOAD_READ_BYTES), b"")
+    batch: List[tuple] = []
+    in_flight = None
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-bulk") as writer:
+        for line, raw in iter_ndjson_lines(blocks, gzipped):
+            summary["lines"] = line
+            try:
+                if raw is None:
+                    raise ValueError(f"Line longer than {Config.BULK_IMPORT_MAX_LINE_BYTES} bytes")
+                batch.append((line, mapper.document(json.loads(raw))))
+            except ValueError as e:
+                # json.JSONDecodeError is a ValueError too
+                fail("skipped", {"line": line, "error": str(e)})
+                continue
+            
+            if len(batch) >= Config.WRITE_BATCH_SIZE:
+                # One batch embeds while the next is parsed
+                if in_flight:
+                    in_flight.result()
+                in_flight = writer.submit(ingest, batch)
+                batch = []
         
-        return IngestResponse(
-            success=True,
-            document_id=doc.document_id,
-            collection=collection_name,
-            embedding_id=embed_id
-        )
+        if in_flight:
+            in_flight.result()
+        if batch:
+            ingest(batch)
+    return summary
 
 
 # =============================================================================
@@ -690,16 +4946,23 @@ class RAGService:
 
 # Global RAG service instance
 rag_service: Optional[RAGService] = None
+ingest_jobs: Optional[IngestJobManager] = None
+ingest_queue: Optional[IngestQueue] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global rag_service
+    global rag_service, ingest_jobs, ingest_queue
     logger.info("Starting AEGIS RAG Service...")
     rag_service = RAGService()
+    ingest_jobs = IngestJobManager(rag_service.vector_db.redis)
+    ingest_queue = IngestQueue(rag_service, ingest_jobs)
+    ingest_queue.start()
     yield
     logger.info("Shutting down AEGIS RAG Service...")
+    ingest_queue.stop()
+    ingest_jobs.shutdown()
 
 
 app = FastAPI(
@@ -730,7 +4993,7 @@ async def health_check():
     stats = {}
     if rag_service:
         try:
-            stats = rag_service.vector_db.get_collection_stats()
+            stats = await blocking_io.run(rag_service.vector_db.get_collection_stats)
         except Exception as e:
             logger.warning(f"Could not get collection stats: {e}")
     
@@ -752,12 +5015,24 @@ async def get_stats():
     stats = {}
     if rag_service:
         try:
-            stats = rag_service.vector_db.get_collection_stats()
+            stats = await blocking_io.run(rag_service.vector_db.get_collection_stats)
         except Exception as e:
             logger.warning(f"Could not get stats: {e}")
     
+    cache_stats = None
+    if rag_service and isinstance(rag_service.embeddings, EmbeddingCache):
+        cache_stats = await blocking_io.run(rag_service.embeddings.stats)
+    result_cache = rag_service.vector_db.result_cache if rag_service else None
+    reembed = await blocking_io.run(ReembedJob.progress, rag_service.vector_db) if rag_service else None
+    
     return {
         "collections": stats,
+        "embedding_cache": cache_stats,
+        "result_cache": result_cache.stats() if result_cache else None,
+        "reembed": reembed,
+        "ingest_jobs": ingest_jobs.stats() if ingest_jobs else None,
+        "ingest_queue": await blocking_io.run(ingest_queue.stats) if ingest_queue else None,
+        "io": {"blocking": blocking_io.stats(), "llm": llm_io.stats()},
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -786,7 +5061,7 @@ async def analyze_ticket(ticket: TicketQuery):
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     logger.info(f"Processing ticket: {ticket.short_description[:50]}...")
-    return rag_service.process_ticket(ticket)
+    return await rag_service.aprocess_ticket(ticket)
 
 
 @app.post("/api/v1/ingest", response_model=IngestResponse)
@@ -803,7 +5078,7 @@ async def ingest_document(doc: DocumentIngest):
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     try:
-        return rag_service.ingest_document(doc)
+        return await rag_service.aingest_document(doc)
     except Exception as e:
         logger.error(f"Ingestion failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -813,99 +5088,83 @@ async def ingest_document(doc: DocumentIngest):
 async def upload_document(
     file: UploadFile = File(...),
     collection: str = Form("kb"),
-    chunk_size: int = Form(512),
-    chunk_overlap: int = Form(50)
+    chunk_size: int = Form(Config.CHUNK_MAX_TOKENS),
+    chunk_overlap: int = Form(Config.CHUNK_OVERLAP_TOKENS),
+    wait: bool = False
 ):
     """
     📤 Upload and ingest a file directly.
     Supports: PDF, TXT, MD, JSON
+    
+    `chunk_size` and `chunk_overlap` are in (estimated) tokens; chunks
+    follow the document's headings, paragraphs, code blocks and tables.
+    
+    The file is ingested as a background job: the response carries a
+    `job_id` to poll at `/api/v1/jobs/{job_id}`. With `?wait=true` it is
+    ingested before responding.
     """
     if not rag_service:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     filename = file.filename
-    content = ""
+    doc_id = upload_doc_id(filename)
     
     logger.info(f"Receiving upload: {filename} for {collection}")
     
-    try:
-        # 1. Extract content based on file type
-        if filename.endswith(".pdf"):
-            import pypdf
-            import io
-            
-            # Read file into memory
-            file_content = await file.read()
-            pdf_file = io.BytesIO(file_content)
-            reader = pypdf.PdfReader(pdf_file)
-            
-            text_parts = []
-            for page in reader.pages:
-                text_parts.append(page.extract_text())
-            content = "\n".join(text_parts)
-            
-        elif filename.endswith(".json"):
-            file_content = await file.read()
-            json_data = json.loads(file_content.decode())
-            # Handle various JSON formats
-            if isinstance(json_data, list):
-                content = "\n\n".join([json.dumps(item) for item in json_data])
-            else:
-                content = json.dumps(json_data, indent=2)
-                
-        else:
-            # Assume text/md
-            file_content = await file.read()
-            content = file_content.decode("utf-8", errors="ignore")
+    if not wait:
+        # The request's spooled file is closed once we respond, so the job
+        # gets its own copy (copied block by block, never fully in memory)
+        spool = tempfile.TemporaryFile()
+        file.file.seek(0)
+        await blocking_io.run(shutil.copyfileobj, file.file, spool)
         
-        if not content.strip():
-            raise ValueError("File is empty or content could not be extracted")
-            
-        # 2. Key for document
-        doc_id = f"DOC_{hashlib.md5(filename.encode()).hexdigest()[:8]}"
-        
-        # 3. Simple chunking (naive implementation)
-        # In a real scenario, use LangChain's RecursiveCharacterTextSplitter
-        words = content.split()
-        chunks = []
-        current_chunk = []
-        current_len = 0
-        
-        for word in words:
-            current_chunk.append(word)
-            current_len += 1
-            if current_len >= chunk_size:
-                chunks.append(" ".join(current_chunk))
-                # Overlap logic (simple rewind)
-                overlap_words = current_chunk[-chunk_overlap:] if chunk_overlap > 0 else []
-                current_chunk = list(overlap_words)
-                current_len = len(current_chunk)
-        
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-            
-        # 4. Ingest chunks
-        chunks_created = 0
-        for i, chunk_text in enumerate(chunks):
-            chunk_doc_id = f"{doc_id}_part{i+1}"
-            
-            ingest_doc = DocumentIngest(
-                document_type=collection if collection in ["kb", "ticket", "sop"] else "kb",
-                document_id=chunk_doc_id,
-                title=f"{filename} (Part {i+1})",
-                content=chunk_text,
-                metadata={"source_file": filename, "chunk_index": i}
+        def run(progress):
+            with spool:
+                summary = rag_service.ingest_stream(
+                    iter_upload_documents(spool, filename, collection, chunk_size, chunk_overlap),
+                    progress=progress
+                )
+            check_upload(summary)
+            return summary
+        
+        try:
+            job_id = await blocking_io.run(
+                ingest_jobs.submit, "upload", run, filename=filename, collection=collection, doc_id=doc_id
             )
-            
-            rag_service.ingest_document(ingest_doc)
-            chunks_created += 1
+        except RuntimeError as e:
+            spool.close()
+            raise HTTPException(status_code=429, detail=str(e))
+        except redis.RedisError as e:
+            spool.close()
+            logger.error(f"Could not create upload job: {e}")
+            raise HTTPException(status_code=503, detail="Job store unavailable, try again later")
+        
+        return {
+            "success": True,
+            "status": "accepted",
+            "job_id": job_id,
+            "filename": filename,
+            "doc_id": doc_id
+        }
+    
+    try:
+        # Chunks are extracted page by page and ingested window by window
+        # (the upload itself is spooled to disk by Starlette, not held in memory)
+        summary = await rag_service.aingest_stream(
+            iter_upload_documents(file.file, filename, collection, chunk_size, chunk_overlap)
+        )
+        check_upload(summary)
             
         return {
             "success": True,
             "filename": filename,
-            "chunks_created": chunks_created,
+            "chunks_created": summary["created"] + summary["unchanged"],
+            "chunks_failed": summary["failed"],
+            "chunks_unchanged": summary["unchanged"],
+            "chunks_removed": summary["removed"],
+            "errors": summary["errors"],
             "doc_id": doc_id,
-            "preview": chunks[:3]
+            "preview": summary["preview"]
         }
         
     except Exception as e:
@@ -913,53 +5172,162 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def check_upload(summary: Dict[str, Any]):
+    """Fail an upload that produced no chunks or whose chunks all failed"""
+    total = summary["created"] + summary["failed"] + summary["unchanged"]
+    if not total:
+        raise ValueError("File is empty or content could not be extracted")
+    if not summary["created"] and not summary["unchanged"]:
+        raise RuntimeError(f"All {total} chunks failed: {summary['errors'][0]['error']}")
+
+
 @app.post("/api/v1/batch-ingest")
-async def batch_ingest(documents: List[DocumentIngest], background_tasks: BackgroundTasks):
+async def batch_ingest(documents: List[DocumentIngest], wait: bool = False):
     """
     📥 Batch ingest multiple documents (async).
+    
+    The batch is added to the durable ingest queue and processed by the
+    queue's consumers; poll the returned `job_id` at `/api/v1/jobs/{job_id}`.
+    With `?wait=true` the batch is ingested before responding and the
+    per-document results are returned.
     """
     if not rag_service:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
-    async def ingest_batch():
-        for doc in documents:
-            try:
-                rag_service.ingest_document(doc)
-            except Exception as e:
-                logger.error(f"Failed to ingest {doc.document_id}: {e}")
+    if wait:
+        results = await rag_service.aingest_documents(documents)
+        return {
+            "status": "completed",
+            "count": len(documents),
+            "succeeded": sum(1 for r in results if r["success"]),
+            "results": results
+        }
     
-    background_tasks.add_task(ingest_batch)
+    try:
+        job_id = await blocking_io.run(ingest_queue.enqueue, documents)
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     
     return {
         "status": "accepted",
         "count": len(documents),
+        "job_id": job_id,
         "message": "Documents queued for ingestion"
     }
 
 
+@app.post("/api/v1/bulk-import")
+async def bulk_import(
+    request: Request,
+    document_type: str = "ticket",
+    field_map: Optional[str] = None,
+    wait: bool = False
+):
+    """
+    📦 Import an NDJSON/JSONL export (one record per line).
+    
+    The body (optionally gzipped, `Content-Encoding: gzip`) is spooled to
+    disk as it arrives and imported as a background job: the response
+    carries a `job_id` to poll at `/api/v1/jobs/{job_id}`. Records are
+    mapped to documents with the field map for `document_type` (optionally
+    overridden by the `field_map` query parameter, JSON) and ingested in
+    batches of WRITE_BATCH_SIZE, so memory use stays constant whatever the
+    file size.
+    
+    With `?wait=true` the import runs before responding and returns counts
+    of imported, unchanged, failed and skipped (unparseable or unmappable)
+    records with the first errors and their line numbers.
+    """
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG service not initialized")
+    
+    try:
+        mapper = BulkFieldMap(document_type, json.loads(field_map) if field_map else None)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid field map: {e}")
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    
+    # The job outlives the request, so it reads its own copy of the body
+    spool = tempfile.TemporaryFile()
+    try:
+        async for chunk in request.stream():
+            await blocking_io.run(spool.write, chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    
+    def run(progress=None):
+        with spool:
+            return run_bulk_import(rag_service, spool, mapper, gzipped, progress)
+    
+    if not wait:
+        try:
+            job_id = await blocking_io.run(ingest_jobs.submit, "bulk-import", run, collection=document_type)
+        except RuntimeError as e:
+            spool.close()
+            raise HTTPException(status_code=429, detail=str(e))
+        except redis.RedisError as e:
+            spool.close()
+            logger.error(f"Could not create bulk import job: {e}")
+            raise HTTPException(status_code=503, detail="Job store unavailable, try again later")
+        
+        return {"success": True, "status": "accepted", "job_id": job_id, "document_type": document_type}
+    
+    started = time.time()
+    try:
+        summary = await blocking_io.run(run)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    
+    elapsed = time.time() - started
+    logger.info(
+        f"Bulk import of {summary['lines']} lines: {summary['created']} imported, "
+        f"{summary['unchanged']} unchanged, {summary['failed']} failed, {summary['skipped']} skipped"
+    )
+    return {
+        "status": "completed",
+        "document_type": document_type,
+        "lines": summary["lines"],
+        "imported": summary["created"],
+        "unchanged": summary["unchanged"],
+        "failed": summary["failed"],
+        "skipped": summary["skipped"],
+        "errors": summary["errors"],
+        "docs_per_second": round((summary["created"] + summary["unchanged"]) / elapsed, 2) if elapsed > 0 else None
+    }
+
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    📋 Status of an ingestion job: queued, running, completed or failed,
+    with created/unchanged/failed counts, throughput and the first errors.
+    """
+    if not ingest_jobs:
+        raise HTTPException(status_code=503, detail="RAG service not initialized")
+    
+    job = await blocking_io.run(ingest_jobs.status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
 @app.get("/api/v1/stats")
-async def get_stats():
+async def get_api_stats():
     """📊 Get vector database statistics"""
     if not rag_service:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
+    counts = await blocking_io.run(rag_service.vector_db.get_collection_stats)
     return {
         "collections": {
-            "knowledge_base": {
-                "name": Config.COLLECTION_KB,
-                "count": rag_service.vector_db.kb_collection.count()
-            },
-            "ticket_history": {
-                "name": Config.COLLECTION_TICKETS,
-                "count": rag_service.vector_db.tickets_collection.count()
-            },
-            "sop_documents": {
-                "name": Config.COLLECTION_SOP,
-                "count": rag_service.vector_db.sop_collection.count()
-            }
+            "knowledge_base": {"name": Config.COLLECTION_KB, "count": counts.get("idx:kb", 0)},
+            "ticket_history": {"name": Config.COLLECTION_TICKETS, "count": counts.get("idx:tickets", 0)},
+            "sop_documents": {"name": Config.COLLECTION_SOP, "count": counts.get("idx:sop", 0)}
         },
         "models": {
-            "embedding": Config.TITAN_MODEL_ID,
+            "embedding": rag_service.embeddings.model_id,
             "reasoning": Config.CLAUDE_MODEL
         },
         "config": {
@@ -974,6 +5342,12 @@ class SearchRequest(BaseModel):
     query: str
     collection: str = "kb_articles"
     top_k: int = 5
+    ef_runtime: Optional[int] = Field(None, ge=1, le=4096, description="HNSW recall/latency knob for this query")
+    filters: Optional[SearchFilters] = None
+    time_window_hours: Optional[int] = Field(None, ge=1, description="Shorthand for filters.time_window_minutes")
+    mode: str = Field("vector", pattern="^(vector|hybrid)$", description="hybrid = BM25 + KNN with rank fusion")
+    collapse: Optional[bool] = Field(None, description="One result per uploaded document (default COLLAPSE_CHUNKS)")
+    mmr: Optional[bool] = Field(None, description="Diversify results by maximal marginal relevance (default MMR_ENABLED)")
 
 
 @app.post("/search")
@@ -985,7 +5359,18 @@ async def search_documents(request: SearchRequest):
     {
         "query": "search text",
         "collection": "kb_articles" | "incidents" | "sop",
-        "top_k": 5
+        "top_k": 5,
+        "ef_runtime": 50,       // optional, HNSW indexes only
+        "filters": {            // optional pre-filters, applied before KNN
+            "categories": ["Network"],
+            "created_after": 1767225600,
+            "time_window_minutes": 15,
+            "exclude_ids": ["INC0012345"]
+        },
+        "time_window_hours": 24, // optional shorthand
+        "mode": "hybrid",       // optional: "vector" (default) or "hybrid"
+        "collapse": true,       // optional: one result per uploaded document
+        "mmr": true             // optional: diverse, token-budgeted results
     }
     """
     if not rag_service:
@@ -1003,11 +5388,20 @@ async def search_documents(request: SearchRequest):
     
     collection_name = collection_map.get(request.collection, "kb")
     
+    filters = request.filters
+    if request.time_window_hours and not (filters and filters.time_window_minutes):
+        filters = (filters or SearchFilters()).model_copy(update={"time_window_minutes": request.time_window_hours * 60})
+    
     try:
-        results = rag_service.vector_db.search_similar(
+        results = await rag_service.vector_db.asearch_similar(
             collection_name=collection_name,
             query=request.query,
-            top_k=request.top_k
+            top_k=request.top_k,
+            ef_runtime=request.ef_runtime,
+            filters=filters,
+            mode=request.mode,
+            collapse=request.collapse,
+            mmr=request.mmr
         )
         
         # Format results
@@ -1017,7 +5411,8 @@ async def search_documents(request: SearchRequest):
                 "title": r.get("metadata", {}).get("title", "Untitled"),
                 "summary": r.get("content", "")[:300],
                 "score": r.get("score", 0),
-                "metadata": r.get("metadata", {})
+                "metadata": r.get("metadata", {}),
+                **({"match": r["match"]} if "match" in r else {})
             })
         
         return {"results": formatted, "count": len(formatted)}
@@ -1027,6 +5422,93 @@ async def search_documents(request: SearchRequest):
         return {"results": [], "count": 0, "error": str(e)}
 
 
+class SimilarIncidentRequest(BaseModel):
+    """Storm Shield duplicate check"""
+    query: str
+    collection: str = "incidents"
+    time_window_minutes: int = Field(15, ge=1, le=1440)
+    threshold: float = Field(0.90, ge=0.0, le=1.0)
+    exclude_id: Optional[str] = None
+    limit: int = Field(1, ge=1, le=20)
+
+
+class IncidentEmbedRequest(BaseModel):
+    """Storm Shield dedup index write"""
+    incident_number: str
+    text: str
+    metadata: Dict[str, Any] = {}
+    timestamp: Optional[str] = None
+
+
+@app.post("/search/similar")
+async def search_similar_incidents(request: SimilarIncidentRequest):
+    """
+    🛡️ Storm Shield duplicate check against the rolling recent-incidents index.
+    
+    Returns the best matches within `time_window_minutes` scoring at least
+    `threshold` (`collection` is accepted for compatibility; the dedup
+    index is always used).
+    
+    Response:
+    {
+        "matches": [{"incident_number": "INC0012345", "score": 0.97}],
+        "latency_ms": {"embed": 0.4, "search": 1.8}
+    }
+    """
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG service not initialized")
+    
+    vector_db = rag_service.vector_db
+    
+    start = time.perf_counter()
+    embedding = await vector_db.embeddings.aembed(request.query, vector_db.dimensions["recent"])
+    embedded = time.perf_counter()
+    
+    matches = await blocking_io.run(
+        vector_db.find_recent_duplicates,
+        embedding,
+        request.time_window_minutes,
+        request.threshold,
+        request.exclude_id,
+        request.limit
+    )
+    searched = time.perf_counter()
+    
+    return {
+        "matches": matches,
+        "latency_ms": {
+            "embed": round((embedded - start) * 1000, 2),
+            "search": round((searched - embedded) * 1000, 2)
+        }
+    }
+
+
+@app.post("/embed/incident")
+async def embed_incident(request: IncidentEmbedRequest):
+    """
+    🛡️ Record an incident in the recent-incidents dedup index.
+    
+    Entries expire after RECENT_INCIDENT_TTL_SECONDS.
+    """
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG service not initialized")
+    
+    vector_db = rag_service.vector_db
+    try:
+        embedding = await vector_db.embeddings.aembed(request.text, vector_db.dimensions["recent"])
+        embedding_id = await blocking_io.run(
+            vector_db.record_recent_incident,
+            request.incident_number,
+            embedding,
+            {**request.metadata, "title": request.text[:200]}
+        )
+    except Exception as e:
+        logger.error(f"Failed to record incident {request.incident_number}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {"success": True, "incident_number": request.incident_number, "embedding_id": embedding_id}
+
+
 # =============================================================================
 # Main Entry Point
 # =============================================================================
@@ -0,0 +1,136 @@
+"""
+Vector Storage Migration
+========================
+Converts an existing collection to a compact vector type (FLOAT16,
+BFLOAT16 or INT8) - or back to FLOAT32.
+
+Before touching anything it runs a recall check on a sample of the stored
+vectors: brute-force top-k with the current vectors vs. the same vectors
+round-tripped through the target encoding. The migration is aborted if
+recall@k is below --min-recall (unless --force).
+
+Searches keep running: the converted vectors are written to a new hash
+field indexed by the next version of each index, ingest writes both while
+the migration runs, and the aliases swap once every document is indexed.
+Re-running after an interruption resumes it: already-converted documents
+are skipped.
+
+Usage:
+    python migrate_vectors.py --collection ticket --to FLOAT16 --check-only
+    python migrate_vectors.py --collection ticket --to FLOAT16
+"""
+
+import os
+import sys
+import random
+import argparse
+import logging
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import VectorDBManager, VectorCodec, create_embedding_provider
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("aegis-rag.migrate-vectors")
+
+
+def load_sample(vector_db: VectorDBManager, collection: str, sample: int) -> np.ndarray:
+    """Decode up to `sample` stored vectors of a collection to float32"""
+    vectors = []
+    vector_field = vector_db.vector_fields[collection]
+    prefixes = [vector_db._key_prefix(collection, shard) for shard in (None, *vector_db.shards(collection))]
+    for keys in (batch for prefix in prefixes for batch in vector_db._scan_keys(prefix)):
+        pipe = vector_db.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, vector_field, f"{vector_field}_type", f"{vector_field}_scale")
+        for blob, stored_type, scale in pipe.execute():
+            if blob is None:
+                continue
+            vectors.append(VectorCodec.decode(
+                blob,
+                stored_type.decode() if stored_type else "FLOAT32",
+                float(scale) if scale else None
+            ))
+        if len(vectors) >= sample:
+            break
+    return np.asarray(vectors[:sample], dtype=np.float32)
+
+
+def recall_check(vectors: np.ndarray, target_type: str, queries: int, k: int, seed: int) -> float:
+    """recall@k of `target_type`-encoded vectors against the originals"""
+
+    def normalize(m):
+        return m / (np.linalg.norm(m, axis=1, keepdims=True) + 1e-12)
+
+    def roundtrip(vector):
+        blob, scale = VectorCodec.encode(vector, target_type)
+        return VectorCodec.decode(blob, target_type, scale)
+
+    original = normalize(vectors)
+    approx = normalize(np.stack([roundtrip(v) for v in vectors]))
+
+    random.seed(seed)
+    query_ids = random.sample(range(len(vectors)), min(queries, len(vectors)))
+
+    def neighbours(corpus):
+        # Queries are encoded like stored docs, as they are at search time
+        scores = corpus[query_ids] @ corpus.T
+        scores[np.arange(len(query_ids)), query_ids] = -np.inf
+        return np.argpartition(-scores, kth=k, axis=1)[:, :k]
+
+    truth, found = neighbours(original), neighbours(approx)
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a collection's vectors to a compact storage type")
+    parser.add_argument("--collection", required=True, choices=list(VectorDBManager.COLLECTIONS))
+    parser.add_argument("--to", dest="target", required=True, choices=list(VectorCodec.TYPES))
+    parser.add_argument("--sample", type=int, default=2000, help="Vectors used for the recall check")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds to wait for indexing per index")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--check-only", action="store_true", help="Run the recall check and exit")
+    parser.add_argument("--force", action="store_true", help="Migrate even if recall is below --min-recall")
+    args = parser.parse_args()
+
+    vector_db = VectorDBManager(create_embedding_provider())
+    current = vector_db.vector_types[args.collection]
+    logger.info(f"{vector_db._index_name(args.collection)}: {current} -> {args.target}")
+
+    vectors = load_sample(vector_db, args.collection, args.sample)
+    if len(vectors) <= args.k:
+        logger.warning(f"Only {len(vectors)} vectors stored - skipping recall check")
+    else:
+        recall = recall_check(vectors, args.target, args.queries, args.k, args.seed)
+        bytes_before = vectors.shape[1] * VectorCodec.BYTES_PER_DIM[current]
+        bytes_after = vectors.shape[1] * VectorCodec.BYTES_PER_DIM[args.target]
+        logger.info(
+            f"recall@{args.k} = {recall:.4f} on {len(vectors)} vectors; "
+            f"vector bytes/doc {bytes_before} -> {bytes_after}"
+        )
+        if recall < args.min_recall and not args.force:
+            logger.error(f"Recall below {args.min_recall} - aborting (use --force to override)")
+            sys.exit(1)
+
+    if args.check_only:
+        return
+
+    try:
+        result = vector_db.migrate_vector_type(args.collection, args.target, args.batch_size, args.timeout)
+    except (ValueError, RuntimeError, TimeoutError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+    logger.info(f"Done: {result}. Set VECTOR_TYPE for this collection to {args.target} to match.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Zero-Downtime Index Rebuild
+===========================
+Rebuilds a collection's vector index (and each of its shards) with the
+current schema and HNSW/FLAT parameters while searches keep running.
+
+The logical index names (idx:kb, idx:tickets, ...) are FT aliases for
+versioned physical indexes (idx:tickets@v2). A rebuild creates the next
+version over the same key prefix, waits until RediSearch has indexed the
+existing documents, verifies the document count against the serving
+index, and then swaps the alias with FT.ALIASUPDATE. Indexes created
+before aliasing are converted on their first rebuild.
+
+Parameters come from INDEX_PARAMS merged with --params; set INDEX_PARAMS
+to match afterwards so the service doesn't warn about a mismatch.
+
+Usage:
+    python rebuild_index.py --collection ticket
+    python rebuild_index.py --collection kb --params '{"M": 32, "EF_CONSTRUCTION": 400}' --keep-old
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import VectorDBManager, create_embedding_provider
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("aegis-rag.rebuild-index")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a collection's index behind its alias without downtime")
+    parser.add_argument("--collection", required=True, choices=list(VectorDBManager.COLLECTIONS))
+    parser.add_argument("--params", type=json.loads, default=None,
+                        help="Index parameters (JSON) merged over the configured ones")
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds to wait for indexing per index")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the previous physical index")
+    args = parser.parse_args()
+
+    vector_db = VectorDBManager(create_embedding_provider())
+    try:
+        results = vector_db.rebuild_collection(
+            args.collection, params=args.params, timeout=args.timeout, keep_old=args.keep_old
+        )
+    except (RuntimeError, TimeoutError) as e:
+        logger.error(f"Rebuild aborted, the serving index is unchanged: {e}")
+        sys.exit(1)
+
+    for result in results:
+        logger.info(
+            f"{result['index']}: {result['old']} ({result['old_docs']} docs) -> "
+            f"{result['new']} ({result['new_docs']} docs)"
+        )
+
+
+if __name__ == "__main__":
+    main()
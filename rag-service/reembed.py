@@ -0,0 +1,75 @@
+"""
+Background Re-embedding
+=======================
+Re-embeds every document of a collection at a new embedding dimension
+without taking search offline.
+
+The job creates the next version of the collection's indexes (and of each
+shard) reading a new vector field, then SCANs the existing documents and
+embeds them in batches under a Bedrock rate budget (REEMBED_RATE_LIMIT
+embeddings per second). Progress is checkpointed in Redis after every
+batch: stop it at any time and run the same command again to resume.
+While it runs the service writes both vectors on ingest; once the scan is
+complete the aliases are swapped to the new indexes in one step.
+
+Throughput and ETA are reported under "reembed" on /stats.
+
+Usage:
+    python reembed.py --collection ticket --dim 512
+    python reembed.py --collection kb --dim 512 --rate 50 --no-cutover
+    python reembed.py --collection kb --cutover-only
+    python reembed.py --status
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import Config, VectorDBManager, ReembedJob, create_embedding_provider
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("aegis-rag.reembed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed a collection at a new dimension (resumable)")
+    parser.add_argument("--collection", choices=["kb", "ticket", "sop"])
+    parser.add_argument("--dim", type=int, help="Target embedding dimension")
+    parser.add_argument("--rate", type=float, default=Config.REEMBED_RATE_LIMIT, help="Embeddings per second")
+    parser.add_argument("--batch-size", type=int, default=Config.REEMBED_BATCH_SIZE)
+    parser.add_argument("--no-cutover", action="store_true", help="Stop when the scan is done")
+    parser.add_argument("--cutover-only", action="store_true", help="Swap to a finished job's indexes")
+    parser.add_argument("--force", action="store_true", help="Cut over even if some documents failed")
+    parser.add_argument("--status", action="store_true", help="Print job progress and exit")
+    args = parser.parse_args()
+
+    vector_db = VectorDBManager(create_embedding_provider())
+    if args.status:
+        print(json.dumps(ReembedJob.progress(vector_db), indent=2))
+        return
+    if not args.collection or not (args.dim or args.cutover_only):
+        parser.error("--collection and --dim (or --cutover-only) are required")
+
+    job = ReembedJob(vector_db, args.collection)
+    try:
+        if not args.cutover_only:
+            job.start(args.dim)
+            job.run(args.rate, args.batch_size)
+        if not args.no_cutover:
+            job.cutover(force=args.force)
+    except (ValueError, RuntimeError, TimeoutError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    print(json.dumps(ReembedJob.progress(vector_db).get(job.collection), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Bulk import unit tests
+======================
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+import gzip
+import zlib
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import BulkFieldMap, iter_ndjson_lines
+
+
+BODY = b"".join(b'{"n": %d}\n' % i for i in range(50))
+
+
+def read_lines(body: bytes, gzipped: bool = False, chunk_size: int = 1000, max_line_bytes: int = 1000):
+    chunks = (body[start:start + chunk_size] for start in range(0, len(body), chunk_size))
+    return list(iter_ndjson_lines(chunks, gzipped, max_line_bytes))
+
+
+def test_plain_lines_are_numbered_and_blank_lines_skipped():
+    assert read_lines(b'{"a": 1}\n\n{"b": 2}') == [(1, b'{"a": 1}'), (3, b'{"b": 2}')]
+
+
+def test_gzip_body_matches_plain_body():
+    expected = read_lines(BODY)
+    assert len(expected) == 50
+    for chunk_size in (1, 7, 1000):
+        assert read_lines(gzip.compress(BODY), True, chunk_size) == expected
+
+
+def test_concatenated_gzip_members_are_all_read():
+    body = gzip.compress(b'{"a": 1}\n') + gzip.compress(b'{"b": 2}\n{"c": 3}')
+    for chunk_size in (1, 5, 1000):
+        assert read_lines(body, True, chunk_size) == [(1, b'{"a": 1}'), (2, b'{"b": 2}'), (3, b'{"c": 3}')]
+
+
+def test_overlong_line_is_reported_and_skipped():
+    body = b'{"a": 1}\n' + b"x" * 5000 + b'\n{"b": 2}\n'
+    for chunk_size in (97, 100_000):
+        assert read_lines(body, chunk_size=chunk_size) == [(1, b'{"a": 1}'), (2, None), (3, b'{"b": 2}')]
+
+
+def test_gzip_bomb_line_is_cut_before_it_is_inflated():
+    body = gzip.compress(b"x" * 10_000_000 + b'\n{"ok": 1}\n')
+    assert read_lines(body, True, 64 * 1024) == [(1, None), (2, b'{"ok": 1}')]
+
+
+def test_truncated_gzip_body_raises():
+    with pytest.raises(zlib.error):
+        read_lines(gzip.compress(BODY)[:-12], True)
+
+
+def test_trailing_garbage_after_gzip_raises():
+    with pytest.raises(zlib.error):
+        read_lines(gzip.compress(BODY) + b"not gzip", True)
+
+
+TICKET = {
+    "number": {"value": "INC001", "display_value": "INC001"},
+    "short_description": "VPN drops",
+    "description": "Client disconnects",
+    "close_notes": "Reinstalled client",
+    "category": {"value": "net", "display_value": "Network"},
+    "closed_at": {"value": "2024-01-02 10:00:00"},
+    "resolution_code": {"value": None, "display_value": ""}
+}
+
+
+def test_ticket_record_maps_like_servicenow_sync():
+    doc = BulkFieldMap("ticket").document(TICKET)
+    assert doc.document_id == "INC001"
+    assert doc.title == "VPN drops"
+    assert doc.content == "Description:\nClient disconnects\n\nResolution:\nReinstalled client"
+    # display_value wins, value is the fallback, empty pairs are dropped
+    assert doc.metadata == {"incident_number": "INC001", "category": "Network", "closed_at": "2024-01-02 10:00:00"}
+
+
+def test_empty_value_pair_is_a_missing_document_id():
+    with pytest.raises(ValueError, match="Missing document id"):
+        BulkFieldMap("ticket").document({**TICKET, "number": {"value": None}})
+
+
+def test_field_map_overrides_and_dotted_paths():
+    mapper = BulkFieldMap("sop", {"content": "{body.text}", "metadata": {"owner": "owner.name"}})
+    doc = mapper.document({"id": "SOP-1", "title": "Reset", "body": {"text": "Steps"}, "owner": {"name": "ops"}})
+    assert (doc.content, doc.metadata) == ("Steps", {"owner": "ops"})
+
+
+@pytest.mark.parametrize("overrides", [
+    {"content": 5},
+    {"title": ["a"]},
+    {"metadata": ["category"]},
+    {"metadata": {"category": 1}},
+    {"nope": "x"},
+    ["content"]
+])
+def test_invalid_field_maps_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        BulkFieldMap("ticket", overrides)
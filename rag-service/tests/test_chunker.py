@@ -0,0 +1,95 @@
+"""
+Chunker unit tests
+==================
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Chunker
+
+
+def make_chunker() -> Chunker:
+    return Chunker(max_tokens=64, overlap_tokens=16, min_tokens=8)
+
+
+GUIDE = (
+    "# Guide\n\nIntro paragraph here.\n\n## VPN\n\n"
+    + " ".join(f"Sentence number {i} about the vpn client." for i in range(20))
+    + "\n\n## Email\n\nShort email text.\n"
+)
+
+
+def test_markdown_chunks_stay_within_budget():
+    chunker = make_chunker()
+    chunks = list(chunker.chunks([GUIDE]))
+    assert len(chunks) > 2
+    assert all(chunker.tokens(chunk) <= chunker.max_tokens for chunk in chunks)
+
+
+def test_markdown_chunks_carry_heading_path():
+    chunks = list(make_chunker().chunks([GUIDE]))
+    vpn = [chunk for chunk in chunks if "vpn client" in chunk]
+    # The section's first chunk holds its heading, later ones its path
+    assert "## VPN" in vpn[0]
+    assert all(chunk.startswith("Guide > VPN\n\n") for chunk in vpn[1:])
+    # A new section starts a new chunk
+    email = [chunk for chunk in chunks if "Short email text." in chunk]
+    assert len(email) == 1 and "## Email" in email[0] and "vpn client" not in email[0]
+
+
+def test_markdown_chunks_overlap_by_trailing_sentences():
+    chunks = [chunk for chunk in make_chunker().chunks([GUIDE]) if chunk.startswith("Guide > VPN")]
+    previous = [chunk for chunk in make_chunker().chunks([GUIDE]) if "vpn client" in chunk]
+    for before, after in zip(previous, chunks):
+        last_sentence = before.rsplit(". ", 1)[-1].split("\n\n")[-1]
+        assert after.split("\n\n")[1] == last_sentence
+
+
+def test_streamed_text_keeps_every_sentence_within_budget():
+    chunker = make_chunker()
+    chunks = list(chunker.chunks(GUIDE[i:i + 7] for i in range(0, len(GUIDE), 7)))
+    assert all(chunker.tokens(chunk) <= chunker.max_tokens for chunk in chunks)
+    text = "\n\n".join(chunks)
+    assert all(f"Sentence number {i} about the vpn client." in text for i in range(20))
+
+
+def test_table_chunks_repeat_header():
+    header = "| host | ip |\n|---|---|"
+    rows = [f"| server-{i:03d} | 10.0.0.{i} |" for i in range(40)]
+    text = "## Hosts\n\n" + header + "\n" + "\n".join(rows) + "\n"
+    chunker = make_chunker()
+    chunks = list(chunker.chunks([text]))
+    assert len(chunks) > 1
+    assert all(header in chunk for chunk in chunks)
+    assert all(chunker.tokens(chunk) <= chunker.max_tokens for chunk in chunks)
+    # Every row lands in exactly one chunk
+    found = [line for chunk in chunks for line in chunk.split("\n") if line.startswith("| server-")]
+    assert found == rows
+
+
+def test_fenced_code_stays_in_one_block():
+    code = "```bash\n" + "".join(f"echo line {i}\n" for i in range(10)) + "```"
+    chunks = list(make_chunker().chunks(["# Script\n\n" + code + "\n\nAfter code.\n"]))
+    assert len(chunks) == 1
+    assert code in chunks[0]
+    assert chunks[0].endswith("After code.")
+
+
+def test_overlong_line_cut_near_window_end():
+    chunker = make_chunker()
+    lines = list(chunker._lines(["word " * 200]))
+    assert all(chunker.max_chars // 2 < len(line) <= chunker.max_chars for line in lines[:-1])
+    assert " ".join(lines).split() == ["word"] * 200
+
+
+def test_overlong_line_prefers_late_sentence_end():
+    chunker = make_chunker()
+    text = "a" * 10 + ". " + "word " * 30 + "end. " + "word " * 40
+    first = next(chunker._lines([text]))
+    assert first.endswith("end.")
+    assert len(first) > chunker.max_chars // 2
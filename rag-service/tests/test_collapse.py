@@ -0,0 +1,83 @@
+"""
+Chunk collapsing unit tests
+===========================
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Config, VectorDBManager
+
+
+def hit(doc_id, score, parent_id=None, chunk_index=None, content=None):
+    metadata = {"doc_id": doc_id}
+    if parent_id:
+        metadata.update(parent_id=parent_id, chunk_index=str(chunk_index))
+    return {"content": content or doc_id, "metadata": metadata, "score": score}
+
+
+HITS = [
+    hit("guide_chunk_3", 0.9, "guide", 3, "three"),
+    hit("KB1", 0.85),
+    hit("guide_chunk_2", 0.8, "guide", 2, "two"),
+    hit("guide_chunk_7", 0.75, "guide", 7, "seven"),
+    hit("KB2", 0.7)
+]
+
+
+def test_best_chunk_represents_its_parent(monkeypatch):
+    monkeypatch.setattr(Config, "COLLAPSE_MERGE_ADJACENT", False)
+    documents = VectorDBManager._collapse_chunks(HITS, 5)
+    assert [d["metadata"]["doc_id"] for d in documents] == ["guide_chunk_3", "KB1", "KB2"]
+    assert [d["metadata"]["chunk_hits"] for d in documents] == [3, 1, 1]
+    assert documents[0]["content"] == "three"
+    # The input hits are left untouched
+    assert "chunk_hits" not in HITS[0]["metadata"]
+
+
+def test_collapse_keeps_top_k_documents(monkeypatch):
+    monkeypatch.setattr(Config, "COLLAPSE_MERGE_ADJACENT", False)
+    assert [d["metadata"]["doc_id"] for d in VectorDBManager._collapse_chunks(HITS, 2)] == ["guide_chunk_3", "KB1"]
+
+
+def test_adjacent_chunks_are_merged_in_document_order(monkeypatch):
+    monkeypatch.setattr(Config, "COLLAPSE_MERGE_ADJACENT", True)
+    best = VectorDBManager._collapse_chunks(HITS, 1)[0]
+    assert best["content"] == "two three"
+    assert best["metadata"]["merged_chunks"] == [2, 3]
+
+
+class StubManager(VectorDBManager):
+    """Serves `corpus` as ranked hits, recording each fetch size"""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.fetches = []
+
+    def _run_search(self, step, query_vector, query_bytes, query_text, mode):
+        self.fetches.append(step["k"])
+        return self.corpus[:step["k"]]
+
+
+def test_collapsed_search_widens_until_top_k_documents(monkeypatch):
+    monkeypatch.setattr(Config, "COLLAPSE_OVERFETCH", 2)
+    monkeypatch.setattr(Config, "COLLAPSE_MAX_FETCH", 64)
+    monkeypatch.setattr(Config, "COLLAPSE_MERGE_ADJACENT", False)
+    # One long upload outranks everything else
+    corpus = [hit(f"big_chunk_{i}", 0.9, "big", i) for i in range(20)] + [hit(f"KB{i}", 0.5) for i in range(5)]
+    manager = StubManager(corpus)
+    documents = manager._collapsed_search({"k": 3, "ef_runtime": None}, [], b"", "", "vector")
+    assert [d["metadata"]["doc_id"] for d in documents] == ["big_chunk_0", "KB0", "KB1"]
+    assert manager.fetches == [6, 12, 24]
+
+
+def test_collapsed_search_stops_when_the_index_runs_out(monkeypatch):
+    monkeypatch.setattr(Config, "COLLAPSE_OVERFETCH", 2)
+    monkeypatch.setattr(Config, "COLLAPSE_MAX_FETCH", 64)
+    manager = StubManager([hit(f"big_chunk_{i}", 0.9, "big", i) for i in range(4)])
+    documents = manager._collapsed_search({"k": 3, "ef_runtime": None}, [], b"", "", "vector")
+    assert len(documents) == 1 and manager.fetches == [6]
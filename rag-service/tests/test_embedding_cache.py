@@ -0,0 +1,115 @@
+"""
+Embedding cache unit tests
+==========================
+Run against an in-memory Redis (fakeredis), skipped when it isn't installed.
+
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EmbeddingCache, HashingEmbeddings
+
+DIM = 64
+ENTRY_BYTES = DIM * 4
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    """Hashing embeddings that record which texts were embedded"""
+
+    def __init__(self):
+        super().__init__(DIM)
+        self.embedded = []
+
+    def embed(self, text, dimension=None):
+        self.embedded.append(text)
+        return super().embed(text, dimension)
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """fakeredis that counts pipeline round trips"""
+
+    round_trips = 0
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted(*a, **kw):
+            CountingRedis.round_trips += 1
+            return execute(*a, **kw)
+
+        pipe.execute = counted
+        return pipe
+
+
+@pytest.fixture
+def redis_client():
+    CountingRedis.round_trips = 0
+    return CountingRedis()
+
+
+def stored_bytes(client) -> int:
+    return int(client.get(EmbeddingCache.BYTES_KEY) or 0)
+
+
+def test_batch_embeds_each_distinct_miss_once(redis_client):
+    provider = CountingEmbeddings()
+    cache = EmbeddingCache(provider, redis_client)
+    result = cache.embed_batch(["vpn down", "vpn  down", "disk full", "vpn down"], DIM)
+    assert sorted(provider.embedded) == ["disk full", "vpn down"]
+    assert result.embeddings[0] == result.embeddings[1] == result.embeddings[3]
+    assert result.embeddings[0] == provider.embed("vpn down", DIM)
+
+
+def test_batch_lookup_is_one_redis_round_trip(redis_client):
+    texts = [f"alert {i}" for i in range(100)]
+    EmbeddingCache(CountingEmbeddings(), redis_client).embed_batch(texts, DIM)
+
+    provider = CountingEmbeddings()
+    cache = EmbeddingCache(provider, redis_client)
+    CountingRedis.round_trips = 0
+    result = cache.embed_batch(texts, DIM)
+    assert CountingRedis.round_trips == 1
+    assert provider.embedded == []
+    assert cache.stats()["redis_hits"] == 100
+    assert all(embedding is not None for embedding in result.embeddings)
+
+
+def test_bytes_count_each_entry_once(redis_client):
+    cache = EmbeddingCache(CountingEmbeddings(), redis_client)
+    cache.embed_batch(["a", "b"], DIM)
+    # A second process storing the same entries doesn't count them again
+    EmbeddingCache(CountingEmbeddings(), redis_client).embed_batch(["a", "b"], DIM)
+    assert stored_bytes(redis_client) == 2 * ENTRY_BYTES
+
+
+def test_entry_recreated_after_expiry_is_not_counted_twice(redis_client):
+    cache = EmbeddingCache(CountingEmbeddings(), redis_client)
+    cache.embed("vpn down", DIM)
+    key = cache.cache_key("vpn down", DIM)
+    # Expired by TTL: the value is gone but its LRU entry is still there
+    redis_client.delete(key)
+
+    EmbeddingCache(CountingEmbeddings(), redis_client).embed("vpn down", DIM)
+    assert redis_client.exists(key)
+    assert stored_bytes(redis_client) == ENTRY_BYTES
+
+
+def test_eviction_keeps_recent_entries_within_budget(redis_client):
+    cache = EmbeddingCache(CountingEmbeddings(), redis_client)
+    cache.redis_max_bytes = 10 * ENTRY_BYTES
+    for i in range(30):
+        cache.embed(f"alert {i}", DIM)
+    assert 0 < stored_bytes(redis_client) <= cache.redis_max_bytes
+    assert redis_client.zcard(EmbeddingCache.LRU_KEY) * ENTRY_BYTES == stored_bytes(redis_client)
+    assert redis_client.exists(cache.cache_key("alert 29", DIM))
+    assert not redis_client.exists(cache.cache_key("alert 0", DIM))
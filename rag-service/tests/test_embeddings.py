@@ -0,0 +1,33 @@
+"""
+Embedding provider unit tests
+=============================
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import HashingEmbeddings, TitanEmbeddings
+
+
+def titan(model_id: str) -> TitanEmbeddings:
+    # No Bedrock client: namespace only depends on the model id
+    provider = TitanEmbeddings.__new__(TitanEmbeddings)
+    provider.model_id = model_id
+    return provider
+
+
+def test_default_titan_model_keeps_unprefixed_indexes():
+    assert titan("amazon.titan-embed-text-v2:0").namespace == ""
+
+
+def test_other_titan_models_get_their_own_namespace():
+    assert titan("amazon.titan-embed-g1-text-02").namespace == "titan-amazon-titan-embed-g1-text-02:"
+    assert titan("amazon.titan-embed-text-v2:1").namespace != titan("amazon.titan-embed-text-v2:0").namespace
+
+
+def test_other_providers_are_namespaced_by_provider():
+    assert HashingEmbeddings(64).namespace == "hashing:"
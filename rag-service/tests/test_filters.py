@@ -0,0 +1,49 @@
+"""
+Search filter unit tests
+========================
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import SearchFilters, VectorDBManager
+
+
+def compile_filters(**filters) -> str:
+    manager = VectorDBManager.__new__(VectorDBManager)
+    return manager.filter_query(SearchFilters(**filters) if filters else None)
+
+
+def test_no_filters_match_everything():
+    assert compile_filters() == "*"
+    assert VectorDBManager.__new__(VectorDBManager).filter_query(SearchFilters()) == "*"
+
+
+def test_tag_special_characters_are_escaped():
+    assert VectorDBManager.escape_tag("INC-1.2 a|b") == "INC\\-1\\.2\\ a\\|b"
+    assert VectorDBManager.escape_tag("{x}@y") == "\\{x\\}\\@y"
+    assert VectorDBManager.escape_tag("plain_id42") == "plain_id42"
+
+
+def test_categories_and_excluded_ids():
+    query = compile_filters(categories=["Network", "Identity & Access"], exclude_ids=["KB-1"])
+    assert query == "(@category:{Network|Identity\\ \\&\\ Access} -@doc_id:{KB\\-1})"
+
+
+def test_created_range_with_open_ends():
+    assert compile_filters(created_after=100) == "(@created_at:[100 +inf])"
+    assert compile_filters(created_before=200) == "(@created_at:[-inf 200])"
+    assert compile_filters(created_after=100, created_before=200) == "(@created_at:[100 200])"
+
+
+def test_time_window_narrows_created_after():
+    now = int(time.time())
+    low = int(compile_filters(time_window_minutes=10, created_after=0).split("[")[1].split()[0])
+    assert now - 600 - 1 <= low <= now - 600 + 1
+    # A later explicit bound wins over the window
+    assert compile_filters(time_window_minutes=10, created_after=now + 60) == f"(@created_at:[{now + 60} +inf])"
@@ -0,0 +1,135 @@
+"""
+Hybrid search unit tests
+========================
+Replies are canned FT.SEARCH results, so no Redis is needed.
+
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Config, VectorCodec, VectorDBManager
+
+FIELDS = ("doc_id", "title", "summary")
+QUERY = [1.0, 0.0, 0.0, 0.0]
+
+
+class CannedPipeline:
+    """Pipeline that records commands and returns fixed replies"""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    def execute(self, raise_on_error=True):
+        return self.replies[:len(self.commands)]
+
+
+class CannedRedis:
+    def __init__(self, replies):
+        self.pipe = CannedPipeline(replies)
+
+    def pipeline(self, transaction=True):
+        return self.pipe
+
+
+def make_manager(replies) -> VectorDBManager:
+    manager = VectorDBManager.__new__(VectorDBManager)
+    manager.redis = CannedRedis(replies)
+    return manager
+
+
+def knn_reply(*hits):
+    """hits: (doc_id, cosine distance)"""
+    reply = [len(hits)]
+    for doc_id, distance in hits:
+        reply += [f"doc:{doc_id}".encode(), [b"doc_id", doc_id.encode(), b"summary", b"s", b"score", str(distance).encode()]]
+    return reply
+
+
+def text_reply(*hits):
+    """hits: (doc_id, stored vector or None)"""
+    reply = [len(hits)]
+    for doc_id, vector in hits:
+        fields = [b"doc_id", doc_id.encode(), b"summary", b"s"]
+        if vector is not None:
+            fields += [b"embedding", VectorCodec.encode(vector, "FLOAT32")[0], b"embedding_type", b"FLOAT32"]
+        reply += [f"doc:{doc_id}".encode(), fields]
+    return reply
+
+
+def step(k=3):
+    return {
+        "index": "idx:kb", "k": k, "ef_runtime": None, "prefilter": "*",
+        "fields": FIELDS, "vector_field": "embedding"
+    }
+
+
+def hybrid(manager, k=3, text="vpn INC0012345"):
+    return manager._hybrid_search(step(k), QUERY, b"", text)
+
+
+def test_text_query_matches_words_and_exact_ids():
+    query = make_manager([])._text_query("VPN down vpn INC0012345 a", "@category:{net}")
+    assert query == "@category:{net} (@content|title:(vpn|down|inc0012345) | @doc_id:{INC0012345})"
+
+
+def test_text_query_escapes_id_tags_and_skips_empty_text():
+    manager = make_manager([])
+    assert manager._text_query("KB-12.3") == "(@content|title:(kb|12) | @doc_id:{KB\\-12\\.3})"
+    assert manager._text_query("? !") is None
+
+
+def test_hits_in_both_legs_rank_first():
+    manager = make_manager([
+        knn_reply(("a", 0.05), ("b", 0.1)),
+        text_reply(("b", [1.0, 0.0, 0.0, 0.0]), ("c", [0.0, 1.0, 0.0, 0.0]))
+    ])
+    results = hybrid(manager)
+    assert [r["metadata"]["doc_id"] for r in results] == ["b", "a", "c"]
+    assert results[0]["match"] == ["vector", "text"]
+    assert results[0]["rrf_score"] == round(1 / (Config.RRF_K + 2) + 1 / (Config.RRF_K + 1), 6)
+    # Text-only hits are scored against their stored vector
+    assert results[2]["match"] == ["text"] and abs(results[2]["score"]) < 1e-6
+
+
+def test_weak_vector_only_hits_are_dropped():
+    manager = make_manager([knn_reply(("a", 0.05), ("weak", 0.9)), text_reply()])
+    assert [r["metadata"]["doc_id"] for r in hybrid(manager)] == ["a"]
+
+
+def test_text_hit_without_stored_vector_is_kept():
+    manager = make_manager([knn_reply(("a", 0.05)), text_reply(("legacy", None), ("c", [1.0, 1.0, 0.0, 0.0]))])
+    results = {r["metadata"]["doc_id"]: r for r in hybrid(manager)}
+    assert set(results) == {"a", "legacy", "c"}
+    assert results["legacy"]["score"] == 0.0 and results["legacy"]["match"] == ["text"]
+    assert np.isclose(results["c"]["score"], 2 ** -0.5)
+
+
+def shard_hit(doc_id, score, rrf):
+    return {"content": "", "metadata": {"doc_id": doc_id}, "score": score, "rrf_score": rrf}
+
+
+def test_shard_lists_are_fused_by_rank_not_raw_rrf_score():
+    # Shard one's scores are inflated by hits matching both legs there
+    one = [shard_hit("a", 0.8, 0.033), shard_hit("b", 0.7, 0.032)]
+    two = [shard_hit("x", 0.9, 0.016), shard_hit("y", 0.6, 0.015)]
+    merged = VectorDBManager._merge_shards([one, two], {"k": 3, "mmr": False}, QUERY)
+    assert [hit["metadata"]["doc_id"] for hit in merged] == ["x", "a", "b"]
+    assert merged[0]["rrf_score"] == merged[1]["rrf_score"] == round(1 / (Config.RRF_K + 1), 6)
+
+
+def test_vector_shard_lists_merge_on_cosine_score():
+    one = [{"content": "", "metadata": {}, "score": 0.8}]
+    two = [{"content": "", "metadata": {}, "score": 0.9}, {"content": "", "metadata": {}, "score": 0.75}]
+    merged = VectorDBManager._merge_shards([one, two], {"k": 2, "mmr": False}, QUERY)
+    assert [hit["score"] for hit in merged] == [0.9, 0.8]
@@ -0,0 +1,63 @@
+"""
+MMR selection unit tests
+========================
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Config, VectorCodec, VectorDBManager
+
+QUERY = [1.0, 0.0, 0.0]
+
+
+def candidate(doc_id, vector, vector_type="FLOAT32", content="x" * 40):
+    blob, scale = VectorCodec.encode(vector, vector_type)
+    return {
+        "content": content,
+        "metadata": {"doc_id": doc_id, "title": ""},
+        "score": 0.0,
+        "_embedding": (blob, vector_type, repr(scale) if scale is not None else None)
+    }
+
+
+# Two near-duplicates of the best match and a less relevant, different hit
+CANDIDATES = [
+    candidate("a", [1.0, 0.2, 0.0]),
+    candidate("a-copy", [1.0, 0.21, 0.0], "INT8"),
+    candidate("b", [0.6, 0.0, 0.8])
+]
+
+
+def select(hits, k=2, lambda_=0.5, token_budget=0):
+    return [h["metadata"]["doc_id"] for h in VectorDBManager._mmr_select(hits, QUERY, k, lambda_, token_budget)]
+
+
+def test_pure_relevance_keeps_similarity_order():
+    assert select(CANDIDATES, lambda_=1.0) == ["a", "a-copy"]
+
+
+def test_diversity_skips_near_duplicates():
+    assert select(CANDIDATES) == ["a", "b"]
+
+
+def test_token_budget_skips_hits_that_do_not_fit():
+    cost = VectorDBManager.estimate_tokens(CANDIDATES[0])
+    long_b = {**CANDIDATES[2], "content": "x" * 4000}
+    assert select([CANDIDATES[0], long_b, CANDIDATES[1]], k=3, token_budget=2 * cost) == ["a", "a-copy"]
+
+
+def test_selected_hits_carry_mmr_score_and_inputs_are_unchanged():
+    results = VectorDBManager._mmr_select(CANDIDATES, QUERY, 2, Config.MMR_LAMBDA)
+    assert all("mmr_score" in r for r in results)
+    assert all("mmr_score" not in c for c in CANDIDATES)
+
+
+def test_hits_without_vectors_are_not_candidates():
+    bare = {"content": "", "metadata": {"doc_id": "bare"}, "score": 1.0}
+    assert select([bare, CANDIDATES[2]]) == ["b"]
+    assert select([bare]) == []
@@ -0,0 +1,80 @@
+"""
+Vector codec unit tests
+=======================
+Usage:
+    cd rag-service && python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import VectorCodec, VectorDBManager
+
+VECTOR = np.random.default_rng(7).normal(size=256).astype(np.float32)
+
+
+def round_trip(vector, vector_type):
+    blob, scale = VectorCodec.encode(vector, vector_type)
+    return blob, VectorCodec.decode(blob, vector_type, scale)
+
+
+def cosine(a, b) -> float:
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+@pytest.mark.parametrize("vector_type", VectorCodec.TYPES)
+def test_blob_size_matches_type(vector_type):
+    blob, decoded = round_trip(VECTOR, vector_type)
+    assert len(blob) == VECTOR.size * VectorCodec.BYTES_PER_DIM[vector_type]
+    assert decoded.dtype == np.float32 and decoded.shape == VECTOR.shape
+
+
+def test_float32_is_exact():
+    assert np.array_equal(round_trip(VECTOR, "FLOAT32")[1], VECTOR)
+
+
+@pytest.mark.parametrize("vector_type, tolerance", [("FLOAT16", 1e-3), ("BFLOAT16", 1e-2), ("INT8", 1e-2)])
+def test_compact_types_keep_values_close(vector_type, tolerance):
+    decoded = round_trip(VECTOR, vector_type)[1]
+    assert np.max(np.abs(decoded - VECTOR)) <= tolerance * np.max(np.abs(VECTOR))
+    assert cosine(decoded, VECTOR) > 0.999
+
+
+def test_bfloat16_rounds_to_nearest_even():
+    # 1 + 2^-8 is halfway between two bfloat16 values: ties go to the even one
+    values = np.array([1.0 + 2 ** -8, 1.0 + 3 * 2 ** -8, 1e30, -2.5], dtype=np.float32)
+    assert round_trip(values, "BFLOAT16")[1].tolist() == [1.0, 1.0 + 4 * 2 ** -8, pytest.approx(1e30, rel=1e-2), -2.5]
+
+
+def test_int8_scale_maps_largest_component_to_127():
+    blob, scale = VectorCodec.encode(VECTOR, "INT8")
+    assert scale == pytest.approx(np.abs(VECTOR).max() / 127)
+    assert np.abs(np.frombuffer(blob, dtype=np.int8)).max() == 127
+
+
+def test_int8_zero_vector_has_unit_scale():
+    blob, scale = VectorCodec.encode(np.zeros(4), "INT8")
+    assert scale == 1.0 and VectorCodec.decode(blob, "INT8", scale).tolist() == [0.0] * 4
+
+
+def test_unknown_type_is_rejected():
+    with pytest.raises(ValueError):
+        VectorCodec.check_type("FLOAT64")
+    with pytest.raises(ValueError):
+        VectorCodec.encode(VECTOR, "FLOAT64")
+    with pytest.raises(ValueError):
+        VectorCodec.decode(b"", "FLOAT64")
+
+
+def test_hash_fields_store_scale_only_for_int8():
+    assert set(VectorDBManager.vector_hash_fields("embedding_v2", VECTOR, "FLOAT16")) == {
+        "embedding_v2", "embedding_v2_type"
+    }
+    fields = VectorDBManager.vector_hash_fields("embedding", VECTOR, "INT8")
+    assert fields["embedding_type"] == "INT8"
+    assert VectorCodec.decode(fields["embedding"], "INT8", float(fields["embedding_scale"])) == pytest.approx(VECTOR, abs=0.05)
@@ -29,6 +29,7 @@ SNOW_INSTANCE = os.getenv("SERVICENOW_INSTANCE")
 SNOW_USER = os.getenv("SERVICENOW_USER")
 SNOW_PASS = os.getenv("SERVICENOW_PASSWORD")
 RAG_URL = os.getenv("RAG_SERVICE_URL", "http://rag-service:8000")
+INGEST_BATCH_SIZE = int(os.getenv("RAG_INGEST_BATCH_SIZE", "100"))
 
 class ServiceNowSync:
     def __init__(self):
@@ -103,49 +104,83 @@ class ServiceNowSync:
                 return []
 
     async def ingest_to_rag(self, items, doc_type):
-        """Ingest items into RAG service"""
+        """Ingest items into RAG service in batches (one embedding batch + pipelined write each)"""
         if not items:
             logger.info(f"No {doc_type} items to ingest.")
             return
+        
+        payloads = []
+        for item in items:
+            doc_id = item.get("number")
+            if not doc_id:
+                logger.warning(f"Skipping {doc_type} record without a number (sys_id {item.get('sys_id', 'unknown')})")
+                continue
+            title = item.get("short_description") or doc_id
+            
+            if doc_type == "ticket":
+                # Combine description and resolution
+                content = f"Description:\n{item.get('description') or ''}\n\nResolution:\n{item.get('close_notes') or ''}"
+                metadata = {
+                    "incident_number": doc_id,
+                    "closed_at": item.get("closed_at"),
+                    "resolution_code": item.get("resolution_code")
+                }
+            else: # KB
+                content = item.get("text") or ""
+                metadata = {
+                    "kb_number": doc_id,
+                    "category": item.get("category"),
+                    "topic": item.get("topic"),
+                    "updated_on": item.get("sys_updated_on")
+                }
             
+            payloads.append({
+                "document_type": doc_type,
+                "document_id": doc_id,
+                "title": title,
+                "content": content,
+                "metadata": metadata
+            })
+        
         async with httpx.AsyncClient() as client:
-            for item in items:
+            for start in range(0, len(payloads), INGEST_BATCH_SIZE):
+                batch = payloads[start:start + INGEST_BATCH_SIZE]
                 try:
-                    if doc_type == "ticket":
-                        doc_id = item.get("number")
-                        title = item.get("short_description")
-                        # Combine description and resolution
-                        content = f"Description:\n{item.get('description', '')}\n\nResolution:\n{item.get('close_notes', '')}"
-                        metadata = {
-                            "incident_number": doc_id,
-                            "closed_at": item.get("closed_at"),
-                            "resolution_code": item.get("resolution_code")
-                        }
-                    else: # KB
-                        doc_id = item.get("number")
-                        title = item.get("short_description")
-                        content = item.get("text", "")
-                        metadata = {
-                            "kb_number": doc_id,
-                            "category": item.get("category"),
-                            "topic": item.get("topic"),
-                            "updated_on": item.get("sys_updated_on")
-                        }
-                    
-                    payload = {
-                        "document_type": doc_type,
-                        "document_id": doc_id,
-                        "title": title,
-                        "content": content,
-                        "metadata": metadata
-                    }
-                    
-                    logger.info(f"Ingesting {doc_type}: {doc_id}")
-                    resp = await client.post(f"{RAG_URL}/api/v1/ingest", json=payload, timeout=10.0)
+                    logger.info(f"Ingesting {doc_type} batch of {len(batch)} ({start + len(batch)}/{len(payloads)})")
+                    resp = await client.post(
+                        f"{RAG_URL}/api/v1/batch-ingest",
+                        params={"wait": "true"},
+                        json=batch,
+                        timeout=120.0
+                    )
                     resp.raise_for_status()
                     
+                    for result in resp.json().get("results", []):
+                        if not result["success"]:
+                            logger.error(f"Failed to ingest {result['document_id']}: {result['error']}")
+                
+                except httpx.HTTPStatusError as e:
+                    if not e.response.is_client_error:
+                        logger.error(f"Failed to ingest {doc_type} batch {self._batch_ids(batch)}: {e}")
+                        continue
+                    # One invalid record rejects the whole batch: retry one by one so it only costs itself
+                    logger.warning(f"{doc_type} batch {self._batch_ids(batch)} rejected ({e.response.status_code}), retrying per record")
+                    await self._ingest_each(client, batch)
                 except Exception as e:
-                    logger.error(f"Failed to ingest {item.get('number', 'unknown')}: {e}")
+                    logger.error(f"Failed to ingest {doc_type} batch {self._batch_ids(batch)}: {e}")
+    
+    async def _ingest_each(self, client, batch):
+        """Ingest records one request at a time"""
+        for payload in batch:
+            try:
+                resp = await client.post(f"{RAG_URL}/api/v1/ingest", json=payload, timeout=10.0)
+                resp.raise_for_status()
+            except Exception as e:
+                logger.error(f"Failed to ingest {payload['document_id']}: {e}")
+    
+    @staticmethod
+    def _batch_ids(batch):
+        return f"{batch[0]['document_id']}..{batch[-1]['document_id']}"
 
 async def run_sync():
     """Main sync execution"""